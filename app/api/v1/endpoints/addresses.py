@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
-from .... import crud, models, schemas, deps, database
+from typing import List, Optional
+from .... import crud, models, schemas, deps, database, services
 
 router = APIRouter()
 
@@ -9,7 +9,7 @@ router = APIRouter()
 def create_address(
     address_in: schemas.AddressCreate,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_user)
 ):
     """Добавить новый адрес."""
     return crud.create_user_address(db, address=address_in, user_id=current_user.id)
@@ -17,16 +17,34 @@ def create_address(
 @router.get("/", response_model=List[schemas.AddressPublic])
 def get_my_addresses(
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_user)
 ):
     """Получить список своих адресов."""
     return crud.get_user_addresses(db, user_id=current_user.id)
 
+@router.get("/delivery-check", response_model=List[schemas.AddressDeliveryCheck])
+def check_my_addresses_delivery(
+    restaurant_id: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_user)
+):
+    """
+    Проверить все свои адреса: входят ли они в зону доставки и, если указан ресторан,
+    расстояние до него и оценку стоимости доставки.
+    """
+    restaurant = None
+    if restaurant_id is not None:
+        restaurant = crud.get_restaurant_by_id(db, restaurant_id=restaurant_id)
+        if not restaurant:
+            raise HTTPException(status_code=404, detail="Ресторан не найден.")
+    addresses = crud.get_user_addresses(db, user_id=current_user.id)
+    return services.check_addresses_delivery(db, addresses, restaurant=restaurant)
+
 @router.delete("/{address_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_address(
     address_id: int,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_user)
 ):
     """Удалить адрес."""
     db_address = crud.get_address_by_id(db, address_id=address_id)
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Response, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 from datetime import date
-from .... import crud, models, schemas, deps, database, utils
+from .... import crud, models, schemas, deps, database, utils, security, services, webhook_queue, courier_feed, exports, outbox
 
 router = APIRouter()
 
@@ -11,36 +13,38 @@ router = APIRouter()
 # =================================================================
 
 @router.post("/users", response_model=schemas.UserPublic, status_code=status.HTTP_201_CREATED)
-def create_user_by_admin(
+async def create_user_by_admin(
     user_in: schemas.AdminUserCreate,
-    db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """
     Создать нового пользователя (ресторан или администратора).
     """
-    db_user = crud.get_user_by_phone(db, phone=user_in.phone)
+    # Короткие сессии: на время хеширования соединение возвращается в пул
+    async with database.AsyncSessionLocal() as db:
+        db_user = await db.run_sync(crud.get_user_by_phone, phone=user_in.phone)
     if db_user:
         raise HTTPException(status_code=400, detail="Пользователь с таким телефоном уже существует.")
-    return crud.create_user(db=db, user=user_in)
+    hashed_password = await security.password_service.hash(user_in.password)
+    async with database.AsyncSessionLocal() as db:
+        return await db.run_sync(crud.create_user, user=user_in, hashed_password=hashed_password)
 
-@router.get("/users", response_model=List[schemas.UserPublic])
+@router.get("/users", response_model=schemas.Page[schemas.UserPublic])
 def list_all_users(
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=100),
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
-    """Получить список всех пользователей системы."""
-    users = crud.get_all_users(db, skip=skip, limit=limit)
-    return users
+    """Получить список всех пользователей системы (курсорная пагинация)."""
+    return crud.get_all_users(db, limit=limit, cursor=cursor)
 
 @router.patch("/users/{user_id}/status", response_model=schemas.UserPublic)
 def update_user_active_status(
     user_id: int,
     status_in: schemas.UserStatusUpdate,
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Заблокировать или разблокировать пользователя."""
     db_user = crud.get_user_by_id(db, user_id=user_id)
@@ -54,20 +58,22 @@ def update_user_active_status(
 #                   Управление Ресторанами
 # =================================================================
 
-@router.get("/restaurants", response_model=List[schemas.RestaurantPublic])
+@router.get("/restaurants", response_model=schemas.Page[schemas.RestaurantPublic])
 def list_restaurants(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=100),
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
-    """Получение списка всех ресторанов."""
-    return crud.get_all_restaurants(db)
+    """Получение списка всех ресторанов (курсорная пагинация)."""
+    return crud.get_all_restaurants(db, limit=limit, cursor=cursor)
 
 @router.patch("/restaurants/{restaurant_id}/approve", response_model=schemas.RestaurantPublic)
 def approve_restaurant(
     restaurant_id: int,
     approval: schemas.RestaurantApprovalUpdate,
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Одобрить или отклонить регистрацию ресторана."""
     db_restaurant = crud.get_restaurant_by_id(db, restaurant_id=restaurant_id)
@@ -75,13 +81,21 @@ def approve_restaurant(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ресторан не найден.")
     return crud.update_restaurant_approval(db, db_restaurant, is_approved=approval.is_approved)
 
+@router.post("/restaurants/ratings/rebuild", response_model=schemas.RatingRebuildResult)
+def rebuild_restaurant_ratings(
+    db: Session = Depends(database.get_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    """Пересчитать рейтинги и гистограммы оценок всех ресторанов по отзывам (после ручных правок в БД)."""
+    return {"restaurants_updated": crud.rebuild_rating_aggregates(db)}
+
 # =================================================================
 #                   Управление Курьерами
 # =================================================================
 @router.get("/couriers/verification", response_model=List[schemas.CourierForAdmin])
 def get_couriers_awaiting_verification(
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Получить список курьеров, ожидающих верификации."""
     return crud.get_couriers_for_verification(db)
@@ -91,7 +105,7 @@ def verify_courier(
     courier_id: int,
     verification_in: schemas.AdminCourierVerificationUpdate,
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Одобрить или отклонить профиль курьера."""
     profile = db.query(models.CourierProfile).filter(models.CourierProfile.user_id == courier_id).first()
@@ -106,7 +120,7 @@ def verify_courier(
 @router.get("/settings", response_model=schemas.SystemSettingsPublic)
 def get_system_settings(
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Получение текущих общих настроек (тарифы, зона доставки)."""
     return crud.get_system_settings(db)
@@ -115,39 +129,102 @@ def get_system_settings(
 def update_system_settings(
     settings_in: schemas.SystemSettingsUpdate,
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Обновление общих настроек (тарифы, зона доставки)."""
     return crud.update_system_settings(db, settings_in)
 
+# =================================================================
+#                   Зоны Доставки
+# =================================================================
+
+@router.get("/delivery-zones", response_model=List[schemas.DeliveryZonePublic])
+def list_delivery_zones(
+    restaurant_id: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    """Зоны доставки (все или конкретного ресторана)."""
+    return crud.get_delivery_zones(db, restaurant_id=restaurant_id)
+
+@router.post("/delivery-zones", response_model=schemas.DeliveryZonePublic, status_code=status.HTTP_201_CREATED)
+def create_delivery_zone(
+    zone_in: schemas.DeliveryZoneCreate,
+    db: Session = Depends(database.get_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    """Создание зоны доставки. Без restaurant_id зона действует для ресторанов без собственных зон."""
+    if zone_in.restaurant_id is not None and not crud.get_restaurant_by_id(db, restaurant_id=zone_in.restaurant_id):
+        raise HTTPException(status_code=404, detail="Ресторан не найден.")
+    return crud.create_delivery_zone(db, zone_in)
+
+@router.put("/delivery-zones/{zone_id}", response_model=schemas.DeliveryZonePublic)
+def update_delivery_zone(
+    zone_id: int,
+    zone_in: schemas.DeliveryZoneCreate,
+    db: Session = Depends(database.get_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    db_zone = crud.get_delivery_zone_by_id(db, zone_id=zone_id)
+    if not db_zone:
+        raise HTTPException(status_code=404, detail="Зона доставки не найдена.")
+    if zone_in.restaurant_id is not None and not crud.get_restaurant_by_id(db, restaurant_id=zone_in.restaurant_id):
+        raise HTTPException(status_code=404, detail="Ресторан не найден.")
+    return crud.update_delivery_zone(db, db_zone, zone_in)
+
+@router.delete("/delivery-zones/{zone_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_delivery_zone(
+    zone_id: int,
+    db: Session = Depends(database.get_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    db_zone = crud.get_delivery_zone_by_id(db, zone_id=zone_id)
+    if not db_zone:
+        raise HTTPException(status_code=404, detail="Зона доставки не найдена.")
+    crud.delete_delivery_zone(db, db_zone)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.post("/delivery-zones/check", response_model=List[schemas.DeliveryZoneCheckResult])
+def check_delivery_zones(
+    check_in: schemas.DeliveryZoneCheckRequest,
+    db: Session = Depends(database.get_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    """Пакетная проверка до 10 000 точек по зонам доставки (например, при импорте адресов)."""
+    checks = services.check_points_delivery(
+        db, [(point.lat, point.lon) for point in check_in.points], restaurant_id=check_in.restaurant_id
+    )
+    return [
+        {"in_delivery_zone": in_zone, "zone_id": zone.id if zone is not None else None}
+        for in_zone, zone in checks
+    ]
+
 # =================================================================
 #                   Управление Баннерами (ИСПРАВЛЕНО)
 # =================================================================
 
 @router.post("/banners", response_model=schemas.BannerPublic, status_code=status.HTTP_201_CREATED)
-def create_new_banner(
+async def create_new_banner(
     title: str = Form(...),
     restaurant_id: Optional[int] = Form(None),
     image: Optional[UploadFile] = File(None), # <-- ИЗМЕНЕНИЕ: Сделали изображение необязательным
-    db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    db: AsyncSession = Depends(database.get_async_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """
     Создать новый рекламный баннер.
     """
-    image_url = None
-    if image:
-        image_url = utils.save_upload_file(image)
-        
-    banner_in = schemas.BannerCreate(title=title, restaurant_id=restaurant_id)
-    return crud.create_banner(db, banner=banner_in, image_url=image_url)
+    async with utils.delete_uploads_on_error() as save:
+        image_url = await save(image) if image else None
+        banner_in = schemas.BannerCreate(title=title, restaurant_id=restaurant_id)
+        return await db.run_sync(crud.create_banner, banner=banner_in, image_url=image_url)
 
 
 @router.delete("/banners/{banner_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_banner_by_id(
     banner_id: int,
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """
     Удалить баннер по ID.
@@ -163,53 +240,51 @@ def delete_banner_by_id(
     
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 @router.put("/banners/{banner_id}", response_model=schemas.BannerPublic)
-def update_existing_banner(
+async def update_existing_banner(
     banner_id: int,
     title: str = Form(...),
     restaurant_id: Optional[int] = Form(None),
     image: Optional[UploadFile] = File(None),
-    db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    db: AsyncSession = Depends(database.get_async_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Обновить существующий баннер."""
-    db_banner = crud.get_banner_by_id(db, banner_id=banner_id)
+    db_banner = await db.run_sync(crud.get_banner_by_id, banner_id=banner_id)
     if not db_banner:
         raise HTTPException(status_code=404, detail="Баннер не найден.")
     
-    image_url = utils.save_upload_file(image) if image else None
-    banner_in = schemas.BannerUpdate(title=title, restaurant_id=restaurant_id)
-    
-    return crud.update_banner(db, db_banner=db_banner, banner_in=banner_in, image_url=image_url)
+    async with utils.delete_uploads_on_error() as save:
+        image_url = await save(image) if image else None
+        banner_in = schemas.BannerUpdate(title=title, restaurant_id=restaurant_id)
+        return await db.run_sync(crud.update_banner, db_banner=db_banner, banner_in=banner_in, image_url=image_url)
 # =================================================================
 #                   Управление Глобальными Категориями (ИСПРАВЛЕНО)
 # =================================================================
 @router.get("/categories", response_model=List[schemas.CategoryPublic])
 def get_global_categories(
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Получить список всех глобальных категорий."""
     return crud.get_categories(db)
 @router.post("/categories", response_model=schemas.CategoryPublic, status_code=status.HTTP_201_CREATED)
-def create_global_category(
+async def create_global_category(
     name: str = Form(...),
     image: Optional[UploadFile] = File(None), # <-- ИЗМЕНЕНИЕ: Сделали изображение необязательным
-    db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    db: AsyncSession = Depends(database.get_async_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Создать новую глобальную категорию для еды."""
-    image_url = None
-    if image:
-        image_url = utils.save_upload_file(image)
-        
-    category_in = schemas.CategoryCreate(name=name)
-    return crud.create_category(db, category=category_in, image_url=image_url)
+    async with utils.delete_uploads_on_error() as save:
+        image_url = await save(image) if image else None
+        category_in = schemas.CategoryCreate(name=name)
+        return await db.run_sync(crud.create_category, category=category_in, image_url=image_url)
 
 @router.delete("/categories/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_global_category(
     category_id: int,
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Удалить глобальную категорию."""
     db_category = crud.get_category_by_id(db, category_id=category_id)
@@ -226,7 +301,7 @@ def delete_global_category(
 def create_new_promo_code(
     promo_code_in: schemas.PromoCodeCreate,
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Создать новый промокод."""
     existing_code = db.query(models.PromoCode).filter(models.PromoCode.code == promo_code_in.code).first()
@@ -237,7 +312,7 @@ def create_new_promo_code(
 @router.get("/promo-codes", response_model=List[schemas.PromoCodePublic])
 def get_all_promo_codes(
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Получить список всех промокодов."""
     return crud.get_all_promo_codes(db)
@@ -247,7 +322,7 @@ def update_existing_promo_code(
     promo_code_id: int,
     promo_code_in: schemas.PromoCodeUpdate,
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Обновить существующий промокод."""
     db_promo_code = crud.get_promo_code_by_id(db, promo_code_id=promo_code_id)
@@ -263,7 +338,7 @@ def update_existing_promo_code(
 def delete_existing_promo_code(
     promo_code_id: int,
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Удалить промокод."""
     db_promo_code = crud.get_promo_code_by_id(db, promo_code_id=promo_code_id)
@@ -280,8 +355,10 @@ def delete_existing_promo_code(
 def get_dashboard_statistics(
     start_date: date = Query(..., description="Дата начала периода (YYYY-MM-DD)"),
     end_date: date = Query(..., description="Дата окончания периода (YYYY-MM-DD)"),
-    db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    # Агрегаты допускают небольшое отставание, поэтому читаются с реплики
+    # без привязки к недавним записям (только с проверкой отставания).
+    db: Session = Depends(database.get_read_db_for()),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """
     Получить сводную статистику по работе сервиса за указанный период.
@@ -289,13 +366,38 @@ def get_dashboard_statistics(
     if start_date > end_date:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Дата начала не может быть позже даты окончания.")
     return crud.get_dashboard_stats(db, start_date=start_date, end_date=end_date)
+
+@router.get("/exports/{dataset}", response_class=StreamingResponse)
+def export_dataset(
+    dataset: Literal["orders", "order-items", "payouts", "splits"],
+    start_date: date = Query(..., description="Дата начала периода (YYYY-MM-DD)"),
+    end_date: date = Query(..., description="Дата окончания периода (YYYY-MM-DD)"),
+    format: Literal["csv", "ndjson", "parquet"] = Query("csv"),
+    gzip: bool = Query(False, description="Сжать CSV/NDJSON в gzip"),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    """
+    Выгрузка сырых данных для сверки финансов: заказы, позиции заказов, выплаты курьерам
+    и доли сплит-платежей за период. Строки отдаются потоком, по мере чтения из БД.
+    """
+    if start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Дата начала не может быть позже даты окончания.")
+    if format == exports.PARQUET and not exports.PARQUET_AVAILABLE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Выгрузка в Parquet недоступна: не установлен pyarrow.")
+    gzip = gzip and format != exports.PARQUET
+    filename = exports.filename(dataset, start_date, end_date, format, gzip=gzip)
+    return StreamingResponse(
+        exports.stream(dataset, start_date, end_date, fmt=format, gzip=gzip),
+        media_type="application/gzip" if gzip else exports.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 # =================================================================
 #                   Управление Выплатами Курьерам
 # =================================================================
 @router.get("/payouts/pending", response_model=List[schemas.PayoutRequestForAdmin])
 def get_pending_payouts(
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Получить список всех ожидающих запросов на выплату."""
     return crud.get_pending_payout_requests(db)
@@ -305,7 +407,7 @@ def process_payout_request(
     request_id: int,
     update_in: schemas.AdminPayoutUpdate,
     db: Session = Depends(database.get_db),
-    admin: models.User = Depends(deps.get_current_active_admin)
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
 ):
     """Одобрить или отклонить запрос на выплату."""
     db_request = crud.get_payout_request_by_id(db, request_id=request_id)
@@ -319,3 +421,71 @@ def process_payout_request(
         print(f"ИНИЦИИРОВАНА ВЫПЛАТА {db_request.amount} НА КАРТУ {db_request.card_number}")
         
     return crud.update_payout_request_status(db, db_request=db_request, status=update_in.status)
+
+# =================================================================
+#                   Мониторинг Базы Данных
+# =================================================================
+@router.get("/db/pool", response_model=schemas.DatabasePoolReport)
+def get_database_pool_stats(
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    """
+    Состояние пулов соединений воркера, обработавшего запрос:
+    занятые/свободные соединения, очередь ожидания и задержка выдачи соединения.
+    """
+    return database.get_pool_report()
+
+@router.get("/integrations/paylink", response_model=schemas.ExternalServiceStats)
+def get_paylink_stats(
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    """Задержка вызовов PayLink, число ошибок и состояние предохранителя в этом воркере."""
+    return services.paylink_client.stats()
+
+@router.get("/integrations/paylink/webhooks", response_model=schemas.WebhookQueueStats)
+def get_paylink_webhook_stats(
+    db: Session = Depends(database.get_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    """Очередь веб-хуков PayLink: глубина очереди и пропускная способность обработчика этого воркера."""
+    return webhook_queue.payment_event_consumer.stats(pending=webhook_queue.count_pending(db))
+
+@router.get("/integrations/paylink/outbox/unknown", response_model=schemas.Page[schemas.PaymentOutboxPublic])
+def list_unknown_payments(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=100),
+    db: Session = Depends(database.get_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    """
+    Платежи, по которым неизвестно, создал ли их PayLink (таймаут, 5xx, падение воркера).
+    Автоматически они не отправляются повторно, чтобы не создать второй платеж.
+    """
+    return crud.get_unknown_payment_outbox(db, limit=limit, cursor=cursor)
+
+@router.patch("/integrations/paylink/outbox/{entry_id}", response_model=schemas.PaymentOutboxPublic)
+def resolve_unknown_payment(
+    entry_id: int,
+    resolve_in: schemas.PaymentOutboxResolve,
+    db: Session = Depends(database.get_db),
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    """Закрыть платеж с неизвестным результатом после сверки с кабинетом PayLink."""
+    entry = crud.get_payment_outbox_by_id(db, entry_id=entry_id)
+    if not entry:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Запись не найдена.")
+    if entry.status != models.JobStatus.UNKNOWN:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Результат этого платежа уже известен.")
+    if resolve_in.status == models.JobStatus.DONE and not resolve_in.payment_url:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Укажите ссылку на найденный платеж.")
+    entry = crud.resolve_payment_outbox(db, entry=entry, status=resolve_in.status, payment_url=resolve_in.payment_url)
+    if entry.status == models.JobStatus.PENDING:
+        outbox.payment_dispatcher.notify()
+    return entry
+
+@router.get("/courier-feed", response_model=schemas.CourierFeedStats)
+def get_courier_feed_stats(
+    admin: schemas.UserPrincipal = Depends(deps.get_current_active_admin)
+):
+    """Подключения к ленте заказов курьеров и доставленные события в этом воркере."""
+    return courier_feed.hub.stats()
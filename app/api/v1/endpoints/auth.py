@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from jose import JWTError
 
 from .... import crud, schemas, security, database, models
 from ....config import settings
@@ -12,33 +13,42 @@ router = APIRouter()
 oauth2_scheme_refresh = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/refresh-token")
 
 @router.post("/register", response_model=schemas.UserPublic, status_code=status.HTTP_201_CREATED)
-def public_user_registration(
-    user_in: schemas.UserPublicRegister,
-    db: Session = Depends(database.get_db)
-):
+async def public_user_registration(user_in: schemas.UserPublicRegister):
     """
     Публичная регистрация для новых клиентов и курьеров.
+    Сессии БД короткие: пока запрос ждет очереди bcrypt, соединение из пула не занято.
     """
-    db_user = crud.get_user_by_phone(db, phone=user_in.phone)
+    async with database.AsyncSessionLocal() as db:
+        db_user = await db.run_sync(crud.get_user_by_phone, phone=user_in.phone)
     if db_user:
         raise HTTPException(status_code=400, detail="Телефон уже зарегистрирован.")
-    
-    return crud.create_user(db=db, user=user_in)
+
+    hashed_password = await security.password_service.hash(user_in.password)
+    async with database.AsyncSessionLocal() as db:
+        return await db.run_sync(crud.create_user, user=user_in, hashed_password=hashed_password)
 
 @router.post("/token", response_model=schemas.Token)
-def login_for_access_token(
-    db: Session = Depends(database.get_db), form_data: OAuth2PasswordRequestForm = Depends()
-):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Принимает телефон и пароль, возвращает access и refresh токены.
+    Сессии БД короткие: при всплеске входов запросы в очереди bcrypt не держат
+    соединения из пула, и остальные роуты воркера продолжают работать.
     """
-    user = crud.get_user_by_phone(db, phone=form_data.username)
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    async with database.AsyncSessionLocal() as db:
+        user = await db.run_sync(crud.get_user_by_phone, phone=form_data.username)
+    is_valid, new_hash = False, None
+    if user:
+        is_valid, new_hash = await security.password_service.verify_and_update(form_data.password, user.hashed_password)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неправильный номер телефона или пароль",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Параметры хеширования изменились (BCRYPT_ROUNDS) - тихо обновляем хеш
+        async with database.AsyncSessionLocal() as db:
+            await db.run_sync(crud.update_user_password_hash, user, hashed_password=new_hash)
     
     access_token = security.create_access_token(data={"sub": user.phone})
     refresh_token = security.create_refresh_token(data={"sub": user.phone})
@@ -63,7 +73,7 @@ def refresh_access_token(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(refresh_token, settings.REFRESH_SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = security.decode_refresh_token(refresh_token)
         phone: str = payload.get("sub")
         if phone is None:
             raise credentials_exception
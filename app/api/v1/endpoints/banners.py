@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .... import crud, schemas, database
 
 router = APIRouter()
 
+get_banners_db = database.get_async_read_db_for("banners")
+
 @router.get("/", response_model=List[schemas.BannerPublic])
-def get_active_banners(db: Session = Depends(database.get_db)):
+async def get_active_banners(db: AsyncSession = Depends(get_banners_db)):
     """
     Получить список активных баннеров для главной страницы приложения.
     """
-    return crud.get_active_banners(db)
+    return await db.run_sync(crud.get_active_banners)
@@ -1,21 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from .... import crud, schemas, database
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from .... import crud, schemas, database, menu_cache
+from ....config import settings
 
 router = APIRouter()
 
-@router.get("/", response_model=List[schemas.RestaurantForList])
-def list_restaurants(
-    db: Session = Depends(database.get_db), skip: int = 0, limit: int = 20
+# Каталог читается с реплики (если настроена)
+get_catalog_db = database.get_async_read_db_for("restaurants", "dishes", "categories")
+
+@router.get("/", response_model=schemas.Page[schemas.RestaurantForList])
+async def list_restaurants(
+    db: AsyncSession = Depends(get_catalog_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Широта клиента"),
+    lon: Optional[float] = Query(None, ge=-180, le=180, description="Долгота клиента"),
+    radius_km: float = Query(10, gt=0, le=settings.GEO_MAX_RADIUS_KM)
 ):
-    """Список активных и одобренных ресторанов для клиентов."""
-    return crud.get_active_restaurants(db, skip=skip, limit=limit)
+    """
+    Список активных и одобренных ресторанов для клиентов (курсорная пагинация).
+    С координатами lat/lon - рестораны в радиусе radius_km, от ближних к дальним;
+    next_cursor продолжает список с той же точки (другие lat/lon - с первой страницы).
+    """
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="Укажите обе координаты: lat и lon.")
+    if lat is not None:
+        return await db.run_sync(
+            crud.get_nearby_restaurants, lat=lat, lon=lon, radius_km=radius_km, limit=limit, cursor=cursor
+        )
+    return await db.run_sync(crud.get_active_restaurants, limit=limit, cursor=cursor)
+
+@router.get(
+    "/{restaurant_id}",
+    response_model=schemas.RestaurantPublicDetail,
+    responses={304: {"description": "Меню не изменилось (совпал If-None-Match)"}},
+)
+async def restaurant_details(restaurant_id: int, request: Request, db: AsyncSession = Depends(get_catalog_db)):
+    """
+    Детальная информация о ресторане с полным меню.
+    Ответ берется из кеша снимков меню; с заголовком If-None-Match вернет 304, если меню не менялось.
+    Раз в MENU_VERSION_CHECK_SECONDS снимок сверяется с restaurants.menu_version,
+    поэтому изменения из других воркеров видны без ожидания TTL.
+    """
+    snapshot = menu_cache.get_menu(restaurant_id)
+    if snapshot is not None and menu_cache.version_check_due(restaurant_id):
+        version = await db.run_sync(crud.get_menu_version, restaurant_id=restaurant_id)
+        snapshot = menu_cache.confirm_version(restaurant_id, version)
+    if snapshot is None:
+        db_restaurant = await db.run_sync(crud.get_restaurant_details, restaurant_id=restaurant_id)
+        if db_restaurant is None:
+            raise HTTPException(status_code=404, detail="Ресторан не найден.")
+        snapshot = menu_cache.store_menu(db_restaurant)
 
-@router.get("/{restaurant_id}", response_model=schemas.RestaurantPublicDetail)
-def restaurant_details(restaurant_id: int, db: Session = Depends(database.get_db)):
-    """Детальная информация о ресторане с полным меню."""
-    db_restaurant = crud.get_restaurant_details(db, restaurant_id=restaurant_id)
-    if db_restaurant is None:
-        raise HTTPException(status_code=404, detail="Ресторан не найден.")
-    return db_restaurant
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if menu_cache.etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from datetime import date
 from decimal import Decimal
-from .... import crud, models, schemas, deps, database, utils
+from .... import crud, models, schemas, deps, database, utils, courier_feed, pagination
+from ....config import settings
 
 router = APIRouter()
 
@@ -12,20 +16,20 @@ router = APIRouter()
 # =================================================================
 
 @router.get("/me", response_model=schemas.CourierProfilePublic)
-def get_my_profile(
-    db: Session = Depends(database.get_db),
-    current_courier: models.User = Depends(deps.get_current_active_courier)
+async def get_my_profile(
+    db: AsyncSession = Depends(database.get_async_db),
+    current_courier: schemas.UserPrincipal = Depends(deps.get_current_active_courier)
 ):
     """
     Получить информацию о своем профиле курьера.
     """
-    return crud.get_or_create_courier_profile(db, user_id=current_courier.id)
+    return await db.run_sync(crud.get_or_create_courier_profile, user_id=current_courier.id)
 
 @router.put("/me", response_model=schemas.CourierProfilePublic)
 def update_my_profile(
     profile_in: schemas.CourierProfileUpdate,
     db: Session = Depends(database.get_db),
-    current_courier: models.User = Depends(deps.get_current_active_courier)
+    current_courier: schemas.UserPrincipal = Depends(deps.get_current_active_courier)
 ):
     """
     Обновить информацию в своем профиле (например, номер карты).
@@ -34,74 +38,150 @@ def update_my_profile(
     return crud.update_courier_profile_info(db, profile=profile, profile_in=profile_in)
 
 @router.post("/me/id_card", response_model=schemas.CourierProfilePublic)
-def upload_id_card_image(
+async def upload_id_card_image(
     id_card: UploadFile = File(...),
-    db: Session = Depends(database.get_db),
-    current_courier: models.User = Depends(deps.get_current_active_courier)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_courier: schemas.UserPrincipal = Depends(deps.get_current_active_courier)
 ):
     """
     Загрузить фото удостоверения для верификации.
     """
-    profile = crud.get_or_create_courier_profile(db, user_id=current_courier.id)
-    image_url = utils.save_upload_file(id_card)
-    return crud.update_courier_id_card(db, profile=profile, image_url=image_url)
+    profile = await db.run_sync(crud.get_or_create_courier_profile, user_id=current_courier.id)
+    async with utils.delete_uploads_on_error() as save:
+        image_url = await save(id_card)
+        return await db.run_sync(crud.update_courier_id_card, profile=profile, image_url=image_url)
 
 @router.patch("/me/status", response_model=schemas.CourierProfilePublic)
-def update_my_online_status(
+async def update_my_online_status(
     status_in: schemas.CourierStatusUpdate,
-    db: Session = Depends(database.get_db),
-    current_courier: models.User = Depends(deps.get_current_active_courier)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_courier: schemas.UserPrincipal = Depends(deps.get_current_active_courier)
 ):
     """
     Изменить свой статус (онлайн/оффлайн).
     """
-    profile = crud.get_or_create_courier_profile(db, user_id=current_courier.id)
+    profile = await db.run_sync(crud.get_or_create_courier_profile, user_id=current_courier.id)
     if profile.verification_status != models.VerificationStatus.APPROVED:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Вы не можете выйти на линию, пока ваш профиль не будет одобрен администратором."
         )
-    return crud.update_courier_online_status(db, profile=profile, is_online=status_in.is_online)
+    return await db.run_sync(crud.update_courier_online_status, profile=profile, is_online=status_in.is_online)
 
 # =================================================================
 #                   Работа с Заказами
 # =================================================================
 
-@router.get("/orders/available", response_model=List[schemas.OrderExtendedPublic])
-def get_available_orders_for_pickup(
-    db: Session = Depends(database.get_db),
-    current_courier: models.User = Depends(deps.get_current_active_courier)
+@router.get("/orders/available", response_model=schemas.Page[schemas.OrderExtendedPublic])
+async def get_available_orders_for_pickup(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Широта курьера"),
+    lon: Optional[float] = Query(None, ge=-180, le=180, description="Долгота курьера"),
+    radius_km: float = Query(5, gt=0, le=settings.GEO_MAX_RADIUS_KM),
+    db: AsyncSession = Depends(database.get_async_db),
+    current_courier: schemas.UserPrincipal = Depends(deps.get_current_active_courier)
 ):
     """
-    Получение списка заказов, готовых к доставке.
+    Получение списка заказов, готовых к доставке (курсорная пагинация, от старых к новым).
+    С координатами lat/lon - заказы из ресторанов в радиусе radius_km, от ближних к дальним;
+    next_cursor продолжает список с той же точки (другие lat/lon - с первой страницы).
     """
-    profile = crud.get_or_create_courier_profile(db, user_id=current_courier.id)
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="Укажите обе координаты: lat и lon.")
+    profile = await db.run_sync(crud.get_or_create_courier_profile, user_id=current_courier.id)
     if not profile.is_online:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Вы не в сети. Чтобы видеть заказы, измените свой статус на 'онлайн'."
         )
-    return crud.get_available_orders_for_courier(db)
+    if lat is not None:
+        return await db.run_sync(
+            crud.get_available_orders_near, lat=lat, lon=lon, radius_km=radius_km, limit=limit, cursor=cursor
+        )
+    return await db.run_sync(crud.get_available_orders_for_courier, limit=limit, cursor=cursor)
 
+@router.get("/orders/feed", response_class=StreamingResponse)
+async def stream_available_orders(
+    request: Request,
+    current_courier: schemas.UserPrincipal = Depends(deps.get_current_active_courier)
+):
+    """
+    Лента доступных заказов (Server-Sent Events) вместо опроса /orders/available.
+    Первым приходит событие 'snapshot' с первой страницей доступных заказов,
+    затем 'order_added' / 'order_removed' по мере изменений.
+    Если клиент не успевает читать события, поток закрывается - нужно переподключиться.
 
-@router.post("/orders/{order_id}/accept", response_model=schemas.OrderExtendedPublic)
-def accept_order_for_delivery(
+    Соединение с БД нужно только для снимка: сессия закрывается до начала потока,
+    поэтому открытые ленты не занимают пул соединений.
+    """
+    async with database.AsyncSessionLocal() as db:
+        profile = await db.run_sync(crud.get_or_create_courier_profile, user_id=current_courier.id)
+        if not profile.is_online:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Вы не в сети. Чтобы видеть заказы, измените свой статус на 'онлайн'."
+            )
+
+        # Подписываемся до чтения снимка, чтобы не пропустить изменения между ними
+        subscription = courier_feed.hub.subscribe()
+        try:
+            page = await db.run_sync(crud.get_available_orders_for_courier, limit=pagination.MAX_PAGE_SIZE)
+            snapshot = courier_feed.sse_frame(
+                courier_feed.SNAPSHOT,
+                schemas.Page[schemas.OrderExtendedPublic].model_validate(page, from_attributes=True).model_dump(mode="json")
+            )
+        except BaseException:
+            courier_feed.hub.unsubscribe(subscription)
+            raise
+
+    async def event_stream():
+        try:
+            yield snapshot
+            while not subscription.overflowed:
+                try:
+                    yield await asyncio.wait_for(
+                        subscription.queue.get(), timeout=settings.COURIER_FEED_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+        finally:
+            courier_feed.hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/orders/{order_id}/accept",
+    response_model=schemas.OrderExtendedPublic,
+    responses={409: {"description": "Заказ уже взят другим курьером или недоступен"}},
+)
+async def accept_order_for_delivery(
     order_id: int,
-    db: Session = Depends(database.get_db),
-    current_courier: models.User = Depends(deps.get_current_active_courier)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_courier: schemas.UserPrincipal = Depends(deps.get_current_active_courier)
 ):
     """
     Курьер принимает заказ на доставку.
+    Назначение атомарное: при одновременных запросах заказ получает ровно один курьер,
+    остальные получают 409.
     """
-    profile = crud.get_or_create_courier_profile(db, user_id=current_courier.id)
+    profile = await db.run_sync(crud.get_or_create_courier_profile, user_id=current_courier.id)
     if not profile.is_online:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Вы не в сети.")
-        
-    db_order = crud.get_order_by_id(db, order_id=order_id)
-    if not db_order or db_order.status != models.OrderStatus.READY_FOR_PICKUP or db_order.courier_id is not None:
-        raise HTTPException(status_code=404, detail="Заказ не найден или уже взят другим курьером.")
-        
-    return crud.assign_order_to_courier(db, db_order, courier_id=current_courier.id)
+
+    if not await db.run_sync(crud.assign_order_to_courier, order_id=order_id, courier_id=current_courier.id):
+        if await db.run_sync(crud.get_order_by_id, order_id=order_id) is None:
+            raise HTTPException(status_code=404, detail="Заказ не найден.")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Заказ уже взят другим курьером или недоступен.")
+    # Подгружаем позиции и клиента внутри сессии, чтобы сериализация не делала ленивых запросов
+    return await db.run_sync(crud.get_order_details, order_id=order_id)
 
 
 # --- ОБНОВЛЕННЫЙ ЭНДПОИНТ ---
@@ -110,7 +190,7 @@ def update_courier_order_status(
     order_id: int,
     status_update: schemas.OrderStatusUpdate,
     db: Session = Depends(database.get_db),
-    current_courier: models.User = Depends(deps.get_current_active_courier)
+    current_courier: schemas.UserPrincipal = Depends(deps.get_current_active_courier)
 ):
     """Обновление статуса заказа курьером. При статусе 'delivered' начисляет деньги на баланс."""
     db_order = crud.get_order_by_id(db, order_id=order_id)
@@ -137,7 +217,7 @@ def update_courier_order_status(
 def request_payout(
     request_in: schemas.PayoutRequestCreate,
     db: Session = Depends(database.get_db),
-    current_courier: models.User = Depends(deps.get_current_active_courier)
+    current_courier: schemas.UserPrincipal = Depends(deps.get_current_active_courier)
 ):
     """Создать запрос на вывод средств с баланса."""
     profile = crud.get_or_create_courier_profile(db, user_id=current_courier.id)
@@ -149,7 +229,7 @@ def request_payout(
 @router.get("/me/payouts", response_model=List[schemas.PayoutRequestPublic])
 def get_my_payout_history(
     db: Session = Depends(database.get_db),
-    current_courier: models.User = Depends(deps.get_current_active_courier)
+    current_courier: schemas.UserPrincipal = Depends(deps.get_current_active_courier)
 ):
     """Получить историю своих запросов на выплату."""
     profile = crud.get_or_create_courier_profile(db, user_id=current_courier.id)
@@ -164,7 +244,7 @@ def get_my_delivery_history(
     start_date: date = Query(default=date.today(), description="Дата начала периода (YYYY-MM-DD)"),
     end_date: date = Query(default=date.today(), description="Дата окончания периода (YYYY-MM-DD)"),
     db: Session = Depends(database.get_db),
-    current_courier: models.User = Depends(deps.get_current_active_courier)
+    current_courier: schemas.UserPrincipal = Depends(deps.get_current_active_courier)
 ):
     """
     Получить историю выполненных заказов и заработок за период.
@@ -1,82 +1,92 @@
-import secrets
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from .... import models, schemas, crud, deps, services, database
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from .... import models, schemas, crud, deps, services, database, outbox, idempotency
 
 router = APIRouter()
 
-@router.post("/", response_model=schemas.CreateOrderResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    response_model=schemas.CreateOrderResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={409: {"description": "Ключ идемпотентности использован для другого запроса или запрос еще выполняется"}},
+)
 async def create_order_with_split_payment(
     order_in: schemas.OrderCreate,
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255)
 ):
     """
     Создание нового заказа с автоматическим разделением (сплитованием) платежа.
+    Платеж в PayLink создается в фоне: ссылку на оплату нужно получить
+    через GET /orders/{order_id}/payment.
+
+    С заголовком Idempotency-Key повтор того же запроса (например, после обрыва связи)
+    вернет ответ первого запроса, не создавая второй заказ.
     """
+    if not idempotency_key:
+        return await place_order(order_in, db, current_user)
+
+    # Ключи разных пользователей не пересекаются
+    key = f"{current_user.id}:{idempotency_key}"
+    fingerprint = idempotency.request_fingerprint(current_user.id, order_in.model_dump_json())
+    stored = await db.run_sync(idempotency.begin, idempotency.ORDER_CREATE_SCOPE, key, fingerprint)
+    if stored is not None:
+        return Response(content=stored.body, status_code=stored.status_code, media_type="application/json")
+    try:
+        result = await place_order(order_in, db, current_user)
+    except Exception:
+        await db.run_sync(idempotency.abandon, idempotency.ORDER_CREATE_SCOPE, key)
+        raise
+    body = schemas.CreateOrderResponse(**result).model_dump_json().encode()
+    await db.run_sync(idempotency.complete, idempotency.ORDER_CREATE_SCOPE, key, status.HTTP_202_ACCEPTED, body)
+    return result
+
+async def place_order(order_in: schemas.OrderCreate, db: AsyncSession, current_user: schemas.UserPrincipal) -> dict:
+    """Проверяет заказ, рассчитывает стоимость и сохраняет заказ вместе с запросом на оплату."""
     # 1. Проверяем ресторан и его платежные данные
-    restaurant = crud.get_restaurant_by_id(db, restaurant_id=order_in.restaurant_id)
+    restaurant = await db.run_sync(crud.get_restaurant_by_id, restaurant_id=order_in.restaurant_id)
     if not restaurant or not restaurant.is_active or not restaurant.is_approved:
         raise HTTPException(status_code=404, detail="Ресторан не найден или временно недоступен.")
     if not restaurant.paylink_account_id:
         raise HTTPException(status_code=400, detail="У ресторана не настроены платежные данные для приема оплаты.")
 
     # 2. Проверяем адрес и зону доставки
-    address = db.query(models.Address).filter(models.Address.id == order_in.address_id).first()
+    address = await db.run_sync(crud.get_address_by_id, address_id=order_in.address_id)
     if not address or address.user_id != current_user.id:
          raise HTTPException(status_code=404, detail="Адрес не найден.")
-    if not services.is_address_in_delivery_zone(db, address):
+    if not await db.run_sync(services.is_address_in_delivery_zone, address, restaurant.id):
         raise HTTPException(
-            status_code=400, 
+            status_code=400,
             detail="К сожалению, доставка по этому адресу невозможна."
         )
 
-    # 3. Рассчитываем стоимость
+    # 3. Оцениваем корзину (один запрос) и рассчитываем стоимость
     try:
-        costs = services.calculate_order_costs(db, order_in)
+        cart = await db.run_sync(services.price_cart, order_in)
+        costs = await db.run_sync(services.calculate_order_costs, order_in, cart, address, restaurant)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-         
-    # 4. Создаем заказ в базе данных
-    db_order = models.Order(
-        code=f"JET-{secrets.token_hex(4).upper()}",
-        user_id=current_user.id,
-        restaurant_id=order_in.restaurant_id,
-        address_text=f"{address.city}, {address.street}, {address.house_number}",
-        delivery_lat=address.latitude,
-        delivery_lon=address.longitude,
-        **costs
-    )
-    db.add(db_order)
-    db.commit()
-    
-    for item in order_in.items:
-        dish = db.query(models.Dish).get(item.dish_id)
-        if dish:
-            db_item = models.OrderItem(
-                order_id=db_order.id,
-                dish_id=item.dish_id,
-                quantity=item.quantity,
-                price_at_time_of_order=dish.price
-            )
-            db.add(db_item)
-    
-    db.commit()
-    db.refresh(db_order)
-    
-    # 5. Создаем сплит-платеж через PayLink
-    paylink_service = services.PayLinkService()
-    payment_url = await paylink_service.create_split_payment(
-        order=db_order,
-        restaurant_account_id=restaurant.paylink_account_id,
-        platform_account_id=services.settings.PLATFORM_PAYLINK_ACCOUNT_ID
+
+    # 4. Создаем заказ, его позиции и запрос на создание платежа в одной транзакции
+    db_order = await db.run_sync(
+        crud.create_order, cart=cart, user_id=current_user.id, address=address, costs=costs
     )
-    
-    if not payment_url:
-        # В продакшене здесь нужна логика отката создания заказа
-        raise HTTPException(status_code=502, detail="Не удалось создать ссылку на оплату. Попробуйте позже.")
-    
-    db_order.payment_invoice_id = payment_url.split('/')[-1]
-    db.commit()
-    
-    return {"order_id": db_order.id, "payment_url": payment_url}
+
+    # 5. Платеж в PayLink создаст фоновый диспетчер
+    outbox.payment_dispatcher.notify()
+
+    return {"order_id": db_order.id, "payment_status": models.PaymentStatus.PENDING, "payment_url": None}
+
+@router.get("/{order_id}/payment", response_model=schemas.CreateOrderResponse)
+async def get_order_payment(
+    order_id: int,
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_user)
+):
+    """Статус создания платежа и ссылка на оплату. Клиент опрашивает, пока статус 'pending'."""
+    payment = await db.run_sync(crud.get_order_payment_status, order_id=order_id)
+    if payment is None or payment["user_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Заказ не найден.")
+    return payment
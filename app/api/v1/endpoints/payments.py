@@ -1,21 +1,39 @@
-from fastapi import APIRouter, Request, Response, status, Depends
-from sqlalchemy.orm import Session
-from .... import crud, database
+import hashlib
+import hmac
+import json
+from fastapi import APIRouter, Request, Response, status, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from .... import database, webhook_queue
+from ....config import settings
 
 router = APIRouter()
 
+def verify_signature(body: bytes, signature: str | None) -> bool:
+    """Проверка HMAC-SHA256 подписи тела запроса (если задан PAYLINK_WEBHOOK_SECRET)."""
+    if not settings.PAYLINK_WEBHOOK_SECRET:
+        return True
+    expected = hmac.new(settings.PAYLINK_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return signature is not None and hmac.compare_digest(expected, signature)
+
 @router.post("/webhook/paylink", status_code=status.HTTP_200_OK, include_in_schema=False)
-async def paylink_webhook(request: Request, db: Session = Depends(database.get_db)):
+async def paylink_webhook(request: Request, db: AsyncSession = Depends(database.get_async_db)):
     """
     Обработка веб-хуков от PayLink.
-    ВАЖНО: В реальном проекте здесь нужна проверка IP-адреса или подписи запроса.
+    Событие только проверяется и сохраняется в очередь payment_events - статусы заказов
+    обновляет фоновый обработчик (webhook_queue.py) пачками. Повторная доставка события
+    с тем же ID игнорируется.
     """
-    data = await request.json()
-    
-    event_type = data.get("type")
-    if event_type == "payment.success":
-        order_id_str = data.get("data", {}).get("orderId")
-        if order_id_str and order_id_str.isdigit():
-            crud.mark_order_as_paid(db=db, order_id=int(order_id_str))
-            
+    body = await request.body()
+    if not verify_signature(body, request.headers.get("x-paylink-signature")):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверная подпись веб-хука.")
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректное тело веб-хука.")
+
+    try:
+        accepted = await db.run_sync(webhook_queue.enqueue_event, data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    webhook_queue.payment_event_consumer.notify(accepted)
     return Response(status_code=status.HTTP_200_OK)
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks, Form, Response
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Response, Query
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from decimal import Decimal
 from .... import crud, models, schemas, deps, database, utils, services
 
 router = APIRouter()
 
+def get_owned_restaurant(db: Session, current_user: schemas.UserPrincipal) -> Optional[models.Restaurant]:
+    """Ресторан текущего владельца по ID из закешированных данных пользователя."""
+    if current_user.restaurant_id is None:
+        return None
+    return crud.get_restaurant_by_id(db, restaurant_id=current_user.restaurant_id)
+
 # =================================================================
 #                   Управление Профилем Ресторана
 # =================================================================
@@ -13,7 +20,7 @@ router = APIRouter()
 def create_my_restaurant(
     restaurant_in: schemas.RestaurantCreate,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_restaurant_owner)
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_restaurant_owner)
 ):
     """Создание профиля ресторана."""
     existing_restaurant = crud.get_restaurant_by_owner_id(db, owner_id=current_user.id)
@@ -25,10 +32,10 @@ def create_my_restaurant(
 def update_my_restaurant_profile(
     restaurant_in: schemas.RestaurantUpdate,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_restaurant_owner)
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_restaurant_owner)
 ):
     """Обновить информацию о своем ресторане."""
-    db_restaurant = current_user.owned_restaurant
+    db_restaurant = get_owned_restaurant(db, current_user)
     if not db_restaurant:
         raise HTTPException(status_code=404, detail="Ресторан не найден.")
     return crud.update_restaurant_profile(db, db_restaurant=db_restaurant, restaurant_in=restaurant_in)
@@ -37,33 +44,34 @@ def update_my_restaurant_profile(
 def update_my_restaurant_status(
     status_in: schemas.RestaurantStatusUpdate,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_restaurant_owner)
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_restaurant_owner)
 ):
     """Открыть или закрыть ресторан для приема заказов."""
-    db_restaurant = current_user.owned_restaurant
+    db_restaurant = get_owned_restaurant(db, current_user)
     if not db_restaurant:
         raise HTTPException(status_code=404, detail="Ресторан не найден.")
     return crud.update_restaurant_status(db, db_restaurant=db_restaurant, is_active=status_in.is_active)
 
 @router.patch("/me/images", response_model=schemas.RestaurantPublic)
-def upload_restaurant_images(
+async def upload_restaurant_images(
     logo: Optional[UploadFile] = File(None),
     banner: Optional[UploadFile] = File(None),
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_restaurant_owner)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_restaurant_owner)
 ):
     """Загрузить логотип и/или баннер для своего ресторана."""
-    db_restaurant = current_user.owned_restaurant
+    db_restaurant = await db.run_sync(get_owned_restaurant, current_user)
     if not db_restaurant:
         raise HTTPException(status_code=404, detail="Сначала необходимо создать ресторан.")
 
-    logo_url = utils.save_upload_file(logo) if logo else None
-    banner_url = utils.save_upload_file(banner) if banner else None
-    
-    if not logo_url and not banner_url:
+    if not logo and not banner:
         raise HTTPException(status_code=400, detail="Необходимо загрузить хотя бы один файл.")
 
-    return crud.update_restaurant_images(db, db_restaurant, logo_url, banner_url)
+    # Если баннер не прошел проверку или не удалась запись в БД, уже сохраненный логотип удаляется
+    async with utils.delete_uploads_on_error() as save:
+        logo_url = await save(logo) if logo else None
+        banner_url = await save(banner) if banner else None
+        return await db.run_sync(crud.update_restaurant_images, db_restaurant, logo_url, banner_url)
 
 # =================================================================
 #                   Управление Меню (Категории и Блюда)
@@ -74,61 +82,59 @@ def list_global_categories(db: Session = Depends(database.get_db)):
     return crud.get_all_categories(db)
 
 @router.post("/menu/dishes", response_model=schemas.DishPublic, status_code=status.HTTP_201_CREATED)
-def create_dish(
+async def create_dish(
     name: str = Form(...),
     price: Decimal = Form(...),
     category_id: int = Form(...),
     description: Optional[str] = Form(None),
     image: Optional[UploadFile] = File(None),
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_restaurant_owner)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_restaurant_owner)
 ):
     """Добавить новое блюдо в меню своего ресторана."""
-    db_restaurant = current_user.owned_restaurant
+    db_restaurant = await db.run_sync(get_owned_restaurant, current_user)
     if not db_restaurant:
         raise HTTPException(status_code=404, detail="Сначала создайте ресторан.")
     
-    db_category = crud.get_category_by_id(db, category_id=category_id)
+    db_category = await db.run_sync(crud.get_category_by_id, category_id=category_id)
     if not db_category:
         raise HTTPException(status_code=404, detail="Категория не найдена.")
         
-    image_url = utils.save_upload_file(image) if image else None
-    dish_in = schemas.DishCreate(name=name, price=price, category_id=category_id, description=description)
-    
-    return crud.create_dish(db, dish=dish_in, restaurant_id=db_restaurant.id, image_url=image_url)
+    async with utils.delete_uploads_on_error() as save:
+        image_url = await save(image) if image else None
+        dish_in = schemas.DishCreate(name=name, price=price, category_id=category_id, description=description)
+        return await db.run_sync(crud.create_dish, dish=dish_in, restaurant_id=db_restaurant.id, image_url=image_url)
 
 @router.put("/menu/dishes/{dish_id}", response_model=schemas.DishPublic)
-def update_dish(
+async def update_dish(
     dish_id: int,
     name: str = Form(...),
     price: Decimal = Form(...),
     description: Optional[str] = Form(None),
     is_available: bool = Form(...),
     image: Optional[UploadFile] = File(None),
-    db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_restaurant_owner)
+    db: AsyncSession = Depends(database.get_async_db),
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_restaurant_owner)
 ):
     """Обновить информацию о блюде."""
-    db_restaurant = current_user.owned_restaurant
-    db_dish = crud.get_dish_by_id(db, dish_id=dish_id)
-    if not db_dish or db_dish.restaurant_id != db_restaurant.id:
+    db_dish = await db.run_sync(crud.get_dish_by_id, dish_id=dish_id)
+    if not db_dish or db_dish.restaurant_id != current_user.restaurant_id:
         raise HTTPException(status_code=404, detail="Блюдо не найдено.")
 
-    image_url = utils.save_upload_file(image) if image else None
-    dish_in = schemas.DishUpdate(name=name, price=price, description=description, is_available=is_available)
-    
-    return crud.update_dish(db, db_dish=db_dish, dish_in=dish_in, image_url=image_url)
+    async with utils.delete_uploads_on_error() as save:
+        image_url = await save(image) if image else None
+        dish_in = schemas.DishUpdate(name=name, price=price, description=description, is_available=is_available)
+        return await db.run_sync(crud.update_dish, db_dish=db_dish, dish_in=dish_in, image_url=image_url)
 
 @router.delete("/menu/dishes/{dish_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_dish(
     dish_id: int,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_restaurant_owner)
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_restaurant_owner)
 ):
     """Удалить блюдо из меню."""
-    db_restaurant = current_user.owned_restaurant
     db_dish = crud.get_dish_by_id(db, dish_id=dish_id)
-    if not db_dish or db_dish.restaurant_id != db_restaurant.id:
+    if not db_dish or db_dish.restaurant_id != current_user.restaurant_id:
         raise HTTPException(status_code=404, detail="Блюдо не найдено.")
     crud.delete_dish(db, db_dish=db_dish)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -136,58 +142,52 @@ def delete_dish(
 # =================================================================
 #                   Управление Заказами
 # =================================================================
-@router.get("/me/orders", response_model=List[schemas.OrderExtendedPublic])
+@router.get("/me/orders", response_model=schemas.Page[schemas.OrderExtendedPublic])
 def get_my_restaurant_orders(
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_restaurant_owner)
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_restaurant_owner)
 ):
-    """Получение всех заказов, принадлежащих ресторану текущего владельца."""
-    if not current_user.owned_restaurant:
+    """Заказы ресторана текущего владельца, от новых к старым (курсорная пагинация)."""
+    if current_user.restaurant_id is None:
         raise HTTPException(status_code=404, detail="Ресторан не найден.")
         
-    return crud.get_orders_by_restaurant(db, restaurant_id=current_user.owned_restaurant.id)
+    return crud.get_orders_by_restaurant(db, restaurant_id=current_user.restaurant_id, limit=limit, cursor=cursor)
 
 @router.post("/me/orders/{order_id}/accept", response_model=schemas.OrderExtendedPublic)
 def accept_order(
     order_id: int,
     accept_data: schemas.OrderAccept,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_restaurant_owner)
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_restaurant_owner)
 ):
     """Принять заказ, указав время приготовления и тип доставки."""
-    restaurant = current_user.owned_restaurant
-    if not restaurant:
+    if current_user.restaurant_id is None:
         raise HTTPException(status_code=404, detail="Ресторан не найден.")
         
     db_order = crud.get_order_by_id(db, order_id=order_id)
-    if not db_order or db_order.restaurant_id != restaurant.id:
+    if not db_order or db_order.restaurant_id != current_user.restaurant_id:
         raise HTTPException(status_code=404, detail="Заказ не найден.")
     
     if db_order.status != models.OrderStatus.PAID:
         raise HTTPException(status_code=400, detail="Можно принять только оплаченный заказ.")
 
-    updated_order = crud.accept_order(db, db_order=db_order, accept_data=accept_data)
-
-    if updated_order.delivery_type == models.DeliveryType.APP_COURIER:
-        background_tasks.add_task(services.trigger_courier_search, order_id=updated_order.id)
-        print(f"Задача по поиску курьера для заказа #{updated_order.id} добавлена в фон.")
-
-    return updated_order
+    # Для доставки курьером crud.accept_order сам планирует поиск курьера (scheduler.py)
+    return crud.accept_order(db, db_order=db_order, accept_data=accept_data)
 
 @router.post("/me/orders/{order_id}/cancel", response_model=schemas.OrderExtendedPublic)
 def cancel_order(
     order_id: int,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_restaurant_owner)
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_restaurant_owner)
 ):
     """Отменить заказ (доступно только до того, как его заберет курьер)."""
-    restaurant = current_user.owned_restaurant
-    if not restaurant:
+    if current_user.restaurant_id is None:
         raise HTTPException(status_code=404, detail="Ресторан не найден.")
         
     db_order = crud.get_order_by_id(db, order_id=order_id)
-    if not db_order or db_order.restaurant_id != restaurant.id:
+    if not db_order or db_order.restaurant_id != current_user.restaurant_id:
         raise HTTPException(status_code=404, detail="Заказ не найден.")
         
     cancellable_statuses = [
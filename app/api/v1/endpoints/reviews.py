@@ -9,7 +9,7 @@ def create_review_for_order(
     order_id: int,
     review_in: schemas.ReviewCreate,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(deps.get_current_active_user)
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_user)
 ):
     """Оставить отзыв на заказ."""
     order = crud.get_order_by_id(db, order_id=order_id)
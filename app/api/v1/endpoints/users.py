@@ -6,7 +6,7 @@ router = APIRouter()
 
 @router.get("/me", response_model=schemas.UserPublic)
 def get_current_user(
-    current_user: models.User = Depends(deps.get_current_active_user),
+    current_user: schemas.UserPrincipal = Depends(deps.get_current_active_user),
     db: Session = Depends(deps.get_db)
 ):
     """
@@ -1,8 +1,24 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     # База данных
     DATABASE_URL: str
+    # URL для асинхронного движка (asyncpg/aiosqlite). Если не задан, выводится из DATABASE_URL.
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    # Пул соединений (на каждый воркер и на каждый движок: sync и async)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0      # секунд ожидания свободного соединения
+    DB_POOL_RECYCLE: int = 1800        # секунд жизни соединения, -1 чтобы отключить
+    DB_POOL_PRE_PING: bool = True
+
+    # Реплика только для чтения (каталог и дашборд). Если не задана, все идет в DATABASE_URL.
+    DATABASE_REPLICA_URL: Optional[str] = None
+    REPLICA_MAX_LAG_SECONDS: float = 5.0             # при большем отставании читаем с основной БД
+    REPLICA_LAG_CHECK_INTERVAL_SECONDS: float = 2.0
+    REPLICA_READ_AFTER_WRITE_SECONDS: float = 5.0    # после записи в таблицу читаем ее с основной БД
 
     # Настройки JWT
     SECRET_KEY: str
@@ -13,10 +29,86 @@ class Settings(BaseSettings):
     REFRESH_SECRET_KEY: str
     REFRESH_TOKEN_EXPIRE_DAYS: int
 
+    # Хеширование паролей
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2         # потоков bcrypt на воркер
+    PASSWORD_HASH_MAX_PENDING: int = 32    # задач в работе и в очереди, сверх этого - 503
+
+    # Кеш авторизованного пользователя (deps.get_current_user)
+    USER_CACHE_TTL_SECONDS: float = 30.0   # максимальная задержка применения блокировки в других воркерах
+    USER_CACHE_MAX_SIZE: int = 10000
+    # Как часто воркер сверяет версию SystemSettings (тарифы, зона доставки)
+    SYSTEM_SETTINGS_REFRESH_SECONDS: float = 5.0
+    # Кеш меню ресторанов (GET /restaurants/{id})
+    MENU_CACHE_TTL_SECONDS: float = 60.0
+    MENU_CACHE_MAX_SIZE: int = 2000
+    MENU_VERSION_CHECK_SECONDS: float = 2.0  # как часто воркер сверяет версию закешированного меню с БД
+    # Кеш проверенных JWT (security.decode_access_token / decode_refresh_token)
+    JWT_CACHE_MAX_SIZE: int = 10000
+
     # PayLink API
     PAYLINK_API_KEY: str
     PAYLINK_API_URL: str
     PLATFORM_PAYLINK_ACCOUNT_ID: str
+    PAYLINK_TIMEOUT_SECONDS: float = 10.0
+    PAYLINK_CONNECT_TIMEOUT_SECONDS: float = 3.0
+    PAYLINK_MAX_CONNECTIONS: int = 50
+    PAYLINK_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    PAYLINK_HTTP2: bool = True                    # используется, если установлен пакет h2
+    PAYLINK_RETRIES: int = 2
+    PAYLINK_RETRY_BACKOFF_SECONDS: float = 0.2
+    PAYLINK_BREAKER_FAILURES: int = 5             # ошибок подряд до размыкания предохранителя
+    PAYLINK_BREAKER_RESET_SECONDS: float = 30.0
+    PAYLINK_WEBHOOK_SECRET: Optional[str] = None  # если задан, веб-хуки проверяются по HMAC-подписи
+
+    # Очередь веб-хуков PayLink (webhook_queue.py)
+    WEBHOOK_QUEUE_POLL_SECONDS: float = 1.0
+    WEBHOOK_QUEUE_BATCH_SIZE: int = 500
+
+    # Планировщик отложенных задач (scheduler.py)
+    SCHEDULER_POLL_SECONDS: float = 10.0        # как часто сверяться с таблицей scheduled_jobs
+    SCHEDULER_LOOKAHEAD_SECONDS: float = 60.0   # задачи ближе этого срока держатся в памяти
+    SCHEDULER_BATCH_SIZE: int = 100
+    SCHEDULER_MAX_ATTEMPTS: int = 5
+    SCHEDULER_RETRY_SECONDS: float = 30.0
+    SCHEDULER_STALE_SECONDS: float = 300.0      # задача "running" дольше этого считается брошенной
+
+    # Отправка платежей в PayLink через outbox (outbox.py)
+    PAYMENT_OUTBOX_POLL_SECONDS: float = 2.0
+    PAYMENT_OUTBOX_BATCH_SIZE: int = 50
+    PAYMENT_OUTBOX_CONCURRENCY: int = 10        # одновременных запросов к PayLink на воркер
+    PAYMENT_OUTBOX_MAX_ATTEMPTS: int = 5        # после этого заказ отменяется
+    PAYMENT_OUTBOX_RETRY_SECONDS: float = 10.0
+    PAYMENT_OUTBOX_STALE_SECONDS: float = 120.0
+
+    # Ключи идемпотентности (idempotency.py)
+    IDEMPOTENCY_TTL_SECONDS: int = 86400          # сколько хранится ответ на запрос с ключом
+    IDEMPOTENCY_LOCK_SECONDS: int = 60            # незавершенный запрос дольше этого считается брошенным
+    IDEMPOTENCY_CACHE_TTL_SECONDS: int = 300
+    IDEMPOTENCY_CACHE_MAX_SIZE: int = 10000
+    IDEMPOTENCY_PURGE_INTERVAL_SECONDS: int = 300
+
+    # Лента заказов для курьеров (courier_feed.py)
+    COURIER_FEED_REDIS_URL: Optional[str] = None  # без него события расходятся только внутри воркера
+    COURIER_FEED_CHANNEL: str = "courier_feed"
+    COURIER_FEED_QUEUE_SIZE: int = 100            # непрочитанных событий на курьера до отключения
+    COURIER_FEED_HEARTBEAT_SECONDS: float = 15.0
+
+    # Геопоиск (geo.py)
+    GEO_INDEX_REFRESH_SECONDS: float = 60.0     # как часто перестраивать индекс координат ресторанов
+    GEO_MAX_RADIUS_KM: float = 50.0
+
+    # Дашборд администратора (rollups.py): кешируются только периоды, закончившиеся до сегодня.
+    # Изменения прошлых дней в этом воркере сбрасывают кеш сразу, в других - через TTL.
+    DASHBOARD_CACHE_TTL_SECONDS: float = 3600.0
+    DASHBOARD_CACHE_MAX_SIZE: int = 256
+
+    # Выгрузки для финансов (exports.py)
+    EXPORT_BATCH_SIZE: int = 5000  # строк, читаемых серверным курсором за раз
+
+    # Загрузка изображений (utils.py)
+    UPLOAD_MAX_BYTES: int = 5 * 1024 * 1024            # на один файл
+    UPLOAD_MAX_REQUEST_BYTES: int = 11 * 1024 * 1024   # на multipart-запрос целиком (до двух файлов и поля формы)
 
     # Бизнес-логика
     RESTAURANT_COMMISSION_PERCENT: float
@@ -0,0 +1,167 @@
+import asyncio
+import json
+from typing import Callable, Optional, Set
+
+from .config import settings
+
+try:
+    from redis import asyncio as aioredis  # pip install redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Типы событий ленты курьеров
+ORDER_ADDED = "order_added"      # заказ готов к выдаче и ждет курьера
+ORDER_REMOVED = "order_removed"  # заказ взят другим курьером или отменен
+SNAPSHOT = "snapshot"            # список доступных заказов в момент подключения
+
+
+def sse_frame(event_type: str, data: dict) -> str:
+    """Кадр Server-Sent Events. Сериализуется один раз и рассылается всем подписчикам."""
+    return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class LocalBroker:
+    """Брокер в пределах одного процесса: события видят только подписчики этого воркера."""
+    async def start(self, deliver: Callable[[str], None]):
+        self._deliver = deliver
+
+    async def publish(self, message: str):
+        self._deliver(message)
+
+    async def stop(self):
+        pass
+
+
+class RedisBroker:
+    """Брокер через Redis pub/sub: событие из любого воркера доходит до подписчиков всех воркеров."""
+    def __init__(self, url: str, channel: str):
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._pubsub = None
+        self._task = None
+
+    async def start(self, deliver: Callable[[str], None]):
+        self._redis = aioredis.from_url(self.url, decode_responses=True)
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(deliver))
+
+    async def _listen(self, deliver: Callable[[str], None]):
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message.get("type") == "message":
+                        deliver(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ошибка подписки на ленту курьеров в Redis: {e}")
+                await asyncio.sleep(1)
+
+    async def publish(self, message: str):
+        await self._redis.publish(self.channel, message)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        if self._redis is not None:
+            await self._redis.close()
+
+
+class Subscription:
+    """Очередь событий одного подключенного курьера."""
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # Курьер не успевает читать события: поток закрывается, при переподключении
+        # клиент получит свежий снимок вместо потерянных событий
+        self.overflowed = False
+
+
+class CourierFeedHub:
+    """
+    Рассылка изменений списка доступных заказов подключенным курьерам.
+
+    crud публикует событие после commit (из любого потока); брокер доставляет его
+    во все воркеры, а хаб каждого воркера раскладывает готовый кадр по очередям
+    своих подписчиков - без запросов к БД на каждого курьера.
+    """
+    def __init__(self, broker, queue_size: int):
+        self.broker = broker
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.broker.start(self._deliver)
+
+    async def stop(self):
+        await self.broker.stop()
+        self._loop = None
+
+    def publish(self, event_type: str, data: dict):
+        """Публикует событие. Можно вызывать из любого потока; вне приложения (скрипты) ничего не делает."""
+        loop = self._loop
+        if loop is None:
+            return
+        message = sse_frame(event_type, data)
+        self.published += 1
+        loop.call_soon_threadsafe(self._schedule_publish, message)
+
+    def _schedule_publish(self, message: str):
+        task = asyncio.ensure_future(self.broker.publish(message))
+        task.add_done_callback(self._report_publish_error)
+
+    @staticmethod
+    def _report_publish_error(task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Не удалось опубликовать событие ленты курьеров: {task.exception()}")
+
+    def _deliver(self, message: str):
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(message)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+                self._subscribers.discard(subscription)
+                self.dropped_subscribers += 1
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+def create_broker():
+    if settings.COURIER_FEED_REDIS_URL:
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("Для COURIER_FEED_REDIS_URL нужен пакет redis: pip install redis")
+        return RedisBroker(settings.COURIER_FEED_REDIS_URL, settings.COURIER_FEED_CHANNEL)
+    return LocalBroker()
+
+
+hub = CourierFeedHub(broker=create_broker(), queue_size=settings.COURIER_FEED_QUEUE_SIZE)
@@ -1,8 +1,15 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, desc 
+import json
+import math
+import secrets
+from sqlalchemy.orm import Session, aliased, joinedload, selectinload
+from sqlalchemy import Numeric, and_, case, cast, or_, func, desc, select, update
 from datetime import date, datetime, timedelta, timezone
-from typing import List, Union, Optional
-from . import models, schemas, security, utils
+from typing import Dict, List, Union, Optional
+from . import models, schemas, security, utils, menu_cache, scheduler, courier_feed, geo, rollups
+from .config import settings
+from .settings_cache import SystemSettingsCache
+from .delivery_zones import DeliveryZoneCache, ZoneIndex
+from .pagination import paginate, paginate_by_distance, decode_distance_cursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 # =================================================================
 #                   Управление Пользователями
@@ -11,13 +18,37 @@ from . import models, schemas, security, utils
 def get_user_by_phone(db: Session, phone: str):
     return db.query(models.User).filter(models.User.phone == phone).first()
 
+def get_user_principal(db: Session, phone: str) -> schemas.UserPrincipal | None:
+    """Данные для авторизации одним запросом: пользователь и ID его ресторана (если есть)."""
+    row = db.query(
+        models.User.id,
+        models.User.phone,
+        models.User.first_name,
+        models.User.role,
+        models.User.is_active,
+        models.User.is_superuser,
+        models.Restaurant.id.label("restaurant_id")
+    ).outerjoin(models.Restaurant, models.Restaurant.owner_id == models.User.id).filter(
+        models.User.phone == phone
+    ).first()
+    if row is None:
+        return None
+    return schemas.UserPrincipal.model_validate(row, from_attributes=True)
+
 # --- ИСПРАВЛЕННАЯ ФУНКЦИЯ ---
-def create_user(db: Session, user: Union[schemas.UserPublicRegister, schemas.AdminUserCreate]):
+def create_user(
+    db: Session,
+    user: Union[schemas.UserPublicRegister, schemas.AdminUserCreate],
+    hashed_password: Optional[str] = None
+):
     """
     Создает нового пользователя.
     Если роль 'restaurant', автоматически создает для него профиль ресторана.
+    Эндпоинты передают hashed_password, посчитанный через security.password_service;
+    без него пароль хешируется синхронно (для скриптов).
     """
-    hashed_password = security.get_password_hash(user.password)
+    if hashed_password is None:
+        hashed_password = security.get_password_hash(user.password)
     db_user = models.User(
         phone=user.phone, 
         first_name=user.first_name, 
@@ -51,9 +82,16 @@ def get_user_by_id(db: Session, user_id: int):
     """Получить пользователя по ID."""
     return db.query(models.User).filter(models.User.id == user_id).first()
 
-def get_all_users(db: Session, skip: int = 0, limit: int = 100):
-    """Получить список всех пользователей."""
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_all_users(db: Session, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    """Получить страницу списка всех пользователей."""
+    return paginate(db.query(models.User), [models.User.id], limit=limit, cursor=cursor)
+
+def update_user_password_hash(db: Session, db_user: models.User, hashed_password: str):
+    # Пользователь мог быть загружен в другой, уже закрытой сессии
+    db.add(db_user)
+    db_user.hashed_password = hashed_password
+    db.commit()
+    return db_user
 
 def update_user_status(db: Session, db_user: models.User, is_active: bool):
     """Обновить статус активности пользователя (блокировка/разблокировка)."""
@@ -82,11 +120,45 @@ def delete_address(db: Session, db_address: models.Address):
     db.delete(db_address)
     db.commit()
 
-def get_active_restaurants(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Restaurant).filter(
+def get_active_restaurants(db: Session, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    query = db.query(models.Restaurant).filter(
         models.Restaurant.is_approved == True, 
         models.Restaurant.is_active == True
-    ).offset(skip).limit(limit).all()
+    )
+    return paginate(query, [models.Restaurant.id], limit=limit, cursor=cursor)
+
+# Координаты активных ресторанов в памяти воркера для поиска ближайших
+restaurant_locations = geo.RefreshingGeoIndex(refresh_seconds=settings.GEO_INDEX_REFRESH_SECONDS)
+
+def _load_restaurant_locations(db: Session):
+    return db.query(models.Restaurant.id, models.Restaurant.latitude, models.Restaurant.longitude).filter(
+        models.Restaurant.is_approved == True,
+        models.Restaurant.is_active == True,
+        models.Restaurant.latitude != None,
+        models.Restaurant.longitude != None
+    ).all()
+
+def get_nearby_restaurants(
+    db: Session, lat: float, lon: float, radius_km: float, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None
+):
+    """Активные рестораны в радиусе radius_km, от ближних к дальним (в формате schemas.Page, курсор по (расстоянию, id))."""
+    nearest = restaurant_locations.get(db, _load_restaurant_locations).nearby(lat, lon, radius_km)
+    page, next_cursor, has_more = paginate_by_distance(nearest, lat, lon, limit, cursor)
+    restaurants = {
+        restaurant.id: restaurant
+        for restaurant in db.query(models.Restaurant).filter(
+            models.Restaurant.id.in_([restaurant_id for restaurant_id, _ in page]),
+            models.Restaurant.is_approved == True,
+            models.Restaurant.is_active == True
+        )
+    }
+    items = []
+    for restaurant_id, distance in page:
+        restaurant = restaurants.get(restaurant_id)
+        if restaurant is not None:
+            restaurant.distance_km = round(distance, 2)
+            items.append(restaurant)
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
 
 def get_restaurant_details(db: Session, restaurant_id: int):
     return db.query(models.Restaurant).options(
@@ -97,25 +169,51 @@ def get_restaurant_details(db: Session, restaurant_id: int):
         models.Restaurant.is_active == True
     ).first()
 
+def get_menu_version(db: Session, restaurant_id: int) -> Optional[int]:
+    """Версия меню видимого клиентам ресторана (None, если ресторан скрыт или удален)."""
+    return db.query(models.Restaurant.menu_version).filter(
+        models.Restaurant.id == restaurant_id,
+        models.Restaurant.is_approved == True,
+        models.Restaurant.is_active == True
+    ).scalar()
+
+def _bump_menu_version(db: Session, restaurant_id: Optional[int] = None) -> Dict[int, int]:
+    """
+    Увеличивает версию меню ресторана (или всех ресторанов) в текущей транзакции.
+    Возвращает новые версии; после commit их получает menu_cache.invalidate_menus.
+    """
+    stmt = update(models.Restaurant).values(menu_version=models.Restaurant.menu_version + 1)
+    if restaurant_id is not None:
+        stmt = stmt.where(models.Restaurant.id == restaurant_id)
+    rows = db.execute(
+        stmt.returning(models.Restaurant.id, models.Restaurant.menu_version)
+        .execution_options(synchronize_session=False)
+    )
+    return {row.id: row.menu_version for row in rows}
+
 def create_restaurant(db: Session, restaurant: schemas.RestaurantCreate, owner_id: int):
     db_restaurant = models.Restaurant(**restaurant.model_dump(), owner_id=owner_id)
     db.add(db_restaurant)
     db.commit()
+    restaurant_locations.invalidate()
     db.refresh(db_restaurant)
     return db_restaurant
 
 def get_restaurant_by_owner_id(db: Session, owner_id: int):
     return db.query(models.Restaurant).filter(models.Restaurant.owner_id == owner_id).first()
 
-def get_all_restaurants(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Restaurant).offset(skip).limit(limit).all()
+def get_all_restaurants(db: Session, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    return paginate(db.query(models.Restaurant), [models.Restaurant.id], limit=limit, cursor=cursor)
 
 def get_restaurant_by_id(db: Session, restaurant_id: int):
     return db.query(models.Restaurant).filter(models.Restaurant.id == restaurant_id).first()
 
 def update_restaurant_approval(db: Session, db_restaurant: models.Restaurant, is_approved: bool):
     db_restaurant.is_approved = is_approved
+    versions = _bump_menu_version(db, db_restaurant.id)
     db.commit()
+    menu_cache.invalidate_menus(versions)
+    restaurant_locations.invalidate()
     db.refresh(db_restaurant)
     return db_restaurant
 
@@ -123,24 +221,36 @@ def update_restaurant_profile(db: Session, db_restaurant: models.Restaurant, res
     update_data = restaurant_in.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_restaurant, key, value)
+    versions = _bump_menu_version(db, db_restaurant.id)
     db.commit()
+    menu_cache.invalidate_menus(versions)
+    restaurant_locations.invalidate()
     db.refresh(db_restaurant)
     return db_restaurant
 
 def update_restaurant_status(db: Session, db_restaurant: models.Restaurant, is_active: bool):
     db_restaurant.is_active = is_active
+    versions = _bump_menu_version(db, db_restaurant.id)
     db.commit()
+    menu_cache.invalidate_menus(versions)
+    restaurant_locations.invalidate()
     db.refresh(db_restaurant)
     return db_restaurant
 
 def update_restaurant_images(db: Session, db_restaurant: models.Restaurant, logo_url: str | None, banner_url: str | None):
+    # Старые файлы удаляются только после commit: при ошибке записи ссылки на них остаются в БД
+    replaced = []
     if logo_url:
-        utils.delete_file(db_restaurant.logo)
+        replaced.append(db_restaurant.logo)
         db_restaurant.logo = logo_url
     if banner_url:
-        utils.delete_file(db_restaurant.banner)
+        replaced.append(db_restaurant.banner)
         db_restaurant.banner = banner_url
+    versions = _bump_menu_version(db, db_restaurant.id)
     db.commit()
+    for file_path in replaced:
+        utils.delete_file(file_path)
+    menu_cache.invalidate_menus(versions)
     db.refresh(db_restaurant)
     return db_restaurant
 
@@ -160,7 +270,9 @@ def get_category_by_id(db: Session, category_id: int):
 def delete_category(db: Session, db_category: models.Category):
     utils.delete_file(db_category.image_url)
     db.delete(db_category)
+    versions = _bump_menu_version(db)
     db.commit()
+    menu_cache.invalidate_menus(versions)
 
 def create_dish(db: Session, dish: schemas.DishCreate, restaurant_id: int, image_url: Optional[str] = None):
     db_dish = models.Dish(
@@ -169,7 +281,9 @@ def create_dish(db: Session, dish: schemas.DishCreate, restaurant_id: int, image
         image=image_url
     )
     db.add(db_dish)
+    versions = _bump_menu_version(db, restaurant_id)
     db.commit()
+    menu_cache.invalidate_menus(versions)
     db.refresh(db_dish)
     return db_dish
     
@@ -180,23 +294,116 @@ def update_dish(db: Session, db_dish: models.Dish, dish_in: schemas.DishUpdate,
     update_data = dish_in.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_dish, key, value)
+    old_image = None
     if image_url:
-        utils.delete_file(db_dish.image)
+        old_image = db_dish.image
         db_dish.image = image_url
+    versions = _bump_menu_version(db, db_dish.restaurant_id)
     db.commit()
+    utils.delete_file(old_image)
+    menu_cache.invalidate_menus(versions)
     db.refresh(db_dish)
     return db_dish
 
 def delete_dish(db: Session, db_dish: models.Dish):
     utils.delete_file(db_dish.image)
+    restaurant_id = db_dish.restaurant_id
     db.delete(db_dish)
+    versions = _bump_menu_version(db, restaurant_id)
     db.commit()
+    menu_cache.invalidate_menus(versions)
 
 def get_order_by_id(db: Session, order_id: int):
     return db.query(models.Order).filter(models.Order.id == order_id).first()
 
-def get_orders_by_restaurant(db: Session, restaurant_id: int):
-    return db.query(models.Order).filter(models.Order.restaurant_id == restaurant_id).order_by(models.Order.created_at.desc()).all()
+def get_order_details(db: Session, order_id: int):
+    """Заказ вместе с позициями и клиентом (для OrderExtendedPublic без ленивых загрузок)."""
+    return db.query(models.Order).options(
+        selectinload(models.Order.items),
+        joinedload(models.Order.user)
+    ).filter(models.Order.id == order_id).first()
+
+def create_order(db: Session, cart: schemas.PricedCart, user_id: int, address: models.Address, costs: dict) -> models.Order:
+    """Создает заказ и его позиции в одной транзакции по уже оцененной корзине."""
+    db_order = models.Order(
+        code=f"JET-{secrets.token_hex(4).upper()}",
+        user_id=user_id,
+        restaurant_id=cart.restaurant_id,
+        address_text=f"{address.city}, {address.street}, {address.house_number}",
+        delivery_lat=address.latitude,
+        delivery_lon=address.longitude,
+        **costs
+    )
+    for line in cart.lines:
+        db_order.items.append(models.OrderItem(
+            dish_id=line.dish_id,
+            quantity=line.quantity,
+            price_at_time_of_order=line.unit_price
+        ))
+    db.add(db_order)
+    # Запрос на создание платежа пишется в той же транзакции (transactional outbox):
+    # заказ без запроса на оплату или запрос без заказа невозможны
+    db.add(models.PaymentOutbox(order=db_order, next_attempt_at=datetime.now(timezone.utc)))
+    db.commit()
+    db.refresh(db_order)
+    return db_order
+
+def get_order_payment_status(db: Session, order_id: int) -> dict | None:
+    """Состояние создания платежа для опроса клиентом после POST /orders/."""
+    row = db.query(models.Order.id, models.Order.user_id, models.Order.payment_url, models.PaymentOutbox.status).outerjoin(
+        models.PaymentOutbox, models.PaymentOutbox.order_id == models.Order.id
+    ).filter(models.Order.id == order_id).first()
+    if row is None:
+        return None
+    if row.payment_url:
+        payment_status = models.PaymentStatus.READY
+    elif row.status == models.JobStatus.FAILED:
+        payment_status = models.PaymentStatus.FAILED
+    else:
+        payment_status = models.PaymentStatus.PENDING
+    return {"order_id": row.id, "user_id": row.user_id, "payment_status": payment_status, "payment_url": row.payment_url}
+
+def get_unknown_payment_outbox(db: Session, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    """Платежи, отправка которых в PayLink завершилась с неизвестным результатом (ждут сверки)."""
+    query = db.query(models.PaymentOutbox).filter(models.PaymentOutbox.status == models.JobStatus.UNKNOWN)
+    return paginate(query, [models.PaymentOutbox.id], limit=limit, cursor=cursor)
+
+def get_payment_outbox_by_id(db: Session, entry_id: int):
+    return db.query(models.PaymentOutbox).filter(models.PaymentOutbox.id == entry_id).first()
+
+def resolve_payment_outbox(db: Session, entry: models.PaymentOutbox, status: models.JobStatus, payment_url: str | None = None):
+    """
+    Закрывает запись unknown по результату сверки с PayLink:
+    PENDING - платежа в PayLink нет, диспетчер отправит запрос заново;
+    DONE - платеж найден, ссылка на оплату сохраняется в заказе;
+    FAILED - платеж не создан, неоплаченный заказ отменяется.
+    """
+    now = datetime.now(timezone.utc)
+    entry.status = status
+    if status == models.JobStatus.PENDING:
+        entry.next_attempt_at = now
+    else:
+        entry.processed_at = now
+        db_order = get_order_by_id(db, order_id=entry.order_id)
+        if status == models.JobStatus.DONE:
+            db_order.payment_url = payment_url
+            db_order.payment_invoice_id = payment_url.split('/')[-1]
+        elif db_order.status == models.OrderStatus.PENDING:
+            db_order.status = models.OrderStatus.CANCELLED
+    db.commit()
+    db.refresh(entry)
+    return entry
+
+def get_orders_by_restaurant(db: Session, restaurant_id: int, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    """Заказы ресторана, от новых к старым."""
+    query = db.query(models.Order).options(
+        selectinload(models.Order.items),
+        joinedload(models.Order.user)
+    ).filter(models.Order.restaurant_id == restaurant_id)
+    return paginate(query, [models.Order.created_at, models.Order.id], limit=limit, cursor=cursor, descending=True)
+
+# За сколько минут до готовности заказ становится виден курьерам
+COURIER_SEARCH_LEAD_MINUTES = 5
 
 def accept_order(db: Session, db_order: models.Order, accept_data: schemas.OrderAccept) -> models.Order:
     db_order.delivery_type = accept_data.delivery_type
@@ -204,11 +411,21 @@ def accept_order(db: Session, db_order: models.Order, accept_data: schemas.Order
     now_utc = datetime.now(timezone.utc)
     ready_by = now_utc + timedelta(minutes=accept_data.preparation_time_minutes)
     db_order.ready_by_timestamp = ready_by
+    job = None
     if accept_data.delivery_type == models.DeliveryType.APP_COURIER:
         db_order.status = models.OrderStatus.AWAITING_COURIER_SEARCH
+        # Поиск курьера планируется в той же транзакции, что и принятие заказа
+        job = scheduler.add_job(
+            db,
+            scheduler.COURIER_SEARCH_JOB,
+            run_at=ready_by - timedelta(minutes=COURIER_SEARCH_LEAD_MINUTES),
+            payload={"order_id": db_order.id}
+        )
     else:
         db_order.status = models.OrderStatus.PREPARING
     db.commit()
+    if job is not None:
+        scheduler.job_scheduler.notify(job.id, job.run_at)
     db.refresh(db_order)
     return db_order
 
@@ -217,15 +434,21 @@ def set_order_status_to_ready(db: Session, order_id: int) -> models.Order | None
     if db_order and db_order.status == models.OrderStatus.AWAITING_COURIER_SEARCH:
         db_order.status = models.OrderStatus.READY_FOR_PICKUP
         db.commit()
-        db.refresh(db_order)
         print(f"ЗАКАЗ #{db_order.id} ГОТОВ! НАЧИНАЕМ ПОИСК КУРЬЕРА.")
+        db_order = get_order_details(db, order_id)
+        courier_feed.hub.publish(courier_feed.ORDER_ADDED, {
+            "order": schemas.OrderExtendedPublic.model_validate(db_order, from_attributes=True).model_dump(mode="json")
+        })
         return db_order
     return None
 
 def cancel_order_by_restaurant(db: Session, db_order: models.Order) -> models.Order:
     print(f"ИНИЦИИРОВАН ВОЗВРАТ СРЕДСТВ ДЛЯ ЗАКАЗА #{db_order.id}")
+    was_available = db_order.status == models.OrderStatus.READY_FOR_PICKUP and db_order.courier_id is None
     db_order.status = models.OrderStatus.CANCELLED
     db.commit()
+    if was_available:
+        courier_feed.hub.publish(courier_feed.ORDER_REMOVED, {"order_id": db_order.id})
     db.refresh(db_order)
     return db_order
 
@@ -237,18 +460,132 @@ def mark_order_as_paid(db: Session, order_id: int):
         db.refresh(db_order)
     return db_order
 
-def get_available_orders_for_courier(db: Session):
-    return db.query(models.Order).filter(
+def update_order_status(db: Session, db_order: models.Order, new_status: models.OrderStatus) -> models.Order:
+    """Смена статуса через ORM: переход в DELIVERED попадает в дневные агрегаты (rollups.py) в той же транзакции."""
+    if db_order.status != new_status:
+        db_order.status = new_status
+        db.commit()
+    return get_order_details(db, db_order.id)
+
+def get_available_orders_for_courier(db: Session, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    """Заказы, ожидающие курьера, от старых к новым."""
+    query = db.query(models.Order).options(
+        selectinload(models.Order.items),
+        joinedload(models.Order.user)
+    ).filter(
         models.Order.status == models.OrderStatus.READY_FOR_PICKUP,
         models.Order.courier_id == None
-    ).order_by(models.Order.created_at.asc()).all()
+    )
+    return paginate(query, [models.Order.created_at, models.Order.id], limit=limit, cursor=cursor)
+
+# Кандидатов в SQL отбирается с запасом: плоское приближенное расстояние, по которому
+# они сортируются, немного расходится с точным расстоянием по сфере
+NEAR_CANDIDATES_FACTOR = 4
+# Для продолжения с курсора кандидаты берутся от 0.9 точного расстояния курсора:
+# в пределах GEO_MAX_RADIUS_KM плоское приближение ошибается на доли процента
+NEAR_CURSOR_SLACK = 0.9
+KM_PER_DEGREE = math.radians(1) * geo.EARTH_RADIUS_KM
+
+def get_available_orders_near(
+    db: Session, lat: float, lon: float, radius_km: float, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None
+):
+    """
+    Заказы, ожидающие курьера, с рестораном в радиусе radius_km, от ближних к дальним
+    (курсор по паре (расстояние, id)).
 
-def assign_order_to_courier(db: Session, db_order: models.Order, courier_id: int):
-    db_order.courier_id = courier_id
-    db_order.status = models.OrderStatus.ON_THE_WAY
+    Кандидаты отбираются в SQL без загрузки заказов: индекс restaurants.geohash (ячейки,
+    покрывающие круг) и описанный квадрат по широте/долготе, сортировка по приближенному
+    расстоянию и LIMIT. Точное расстояние считается только для них, а полностью
+    (с позициями и клиентом) загружаются лишь заказы итоговой страницы.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    cells = geo.covering_cells(lat, lon, radius_km)
+    min_lat, max_lat, min_lon, max_lon = geo.bounding_box(lat, lon, radius_km)
+    d_lat = models.Restaurant.latitude - lat
+    d_lon = (models.Restaurant.longitude - lon) * math.cos(math.radians(lat))
+    approx_distance = d_lat * d_lat + d_lon * d_lon
+    available = and_(
+        models.Order.status == models.OrderStatus.READY_FOR_PICKUP,
+        models.Order.courier_id == None
+    )
+    query = db.query(
+        models.Order.id, models.Restaurant.latitude, models.Restaurant.longitude, approx_distance
+    ).join(models.Order.restaurant).filter(
+        available,
+        or_(*[
+            and_(models.Restaurant.geohash >= cell, models.Restaurant.geohash < cell + geo.CELL_END)
+            for cell in cells
+        ]),
+        models.Restaurant.latitude.between(min_lat, max_lat),
+        models.Restaurant.longitude.between(min_lon, max_lon)
+    )
+    batch_size = (limit + 1) * NEAR_CANDIDATES_FACTOR
+    if not cursor:
+        candidates = query.order_by(approx_distance, models.Order.id).limit(batch_size).all()
+        nearest = geo.within_radius(lat, lon, radius_km, [row[:3] for row in candidates])
+    else:
+        after = decode_distance_cursor(cursor, lat, lon)
+        query = query.filter(approx_distance >= (after[0] * NEAR_CURSOR_SLACK / KM_PER_DEGREE) ** 2)
+        # Кандидаты до курсора (заказы того же ресторана, полоса запаса) не должны
+        # занять весь LIMIT: добираем пачками по (приближенное расстояние, id)
+        nearest, last = [], None
+        while len(nearest) <= limit:
+            batch_query = query
+            if last is not None:
+                batch_query = batch_query.filter(or_(
+                    approx_distance > last[3], and_(approx_distance == last[3], models.Order.id > last[0])
+                ))
+            candidates = batch_query.order_by(approx_distance, models.Order.id).limit(batch_size).all()
+            nearest.extend(
+                (order_id, distance)
+                for order_id, distance in geo.within_radius(lat, lon, radius_km, [row[:3] for row in candidates])
+                if (distance, order_id) > after
+            )
+            if len(candidates) < batch_size:
+                break
+            last = candidates[-1]
+        nearest.sort(key=lambda item: (item[1], item[0]))
+
+    page, next_cursor, has_more = paginate_by_distance(nearest, lat, lon, limit)
+    orders = {
+        order.id: order
+        for order in db.query(models.Order).options(
+            joinedload(models.Order.restaurant),
+            selectinload(models.Order.items),
+            joinedload(models.Order.user)
+        ).filter(models.Order.id.in_([order_id for order_id, _ in page]), available)
+    }
+    items = []
+    for order_id, distance in page:
+        order = orders.get(order_id)
+        if order is None:  # заказ взят другим курьером между запросами
+            continue
+        order.distance_km = round(distance, 2)
+        items.append(order)
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+def assign_order_to_courier(db: Session, order_id: int, courier_id: int) -> bool:
+    """
+    Назначает курьера одним условным UPDATE (compare-and-set): заказ достается тому,
+    чей запрос первым изменил строку, даже при гонке между воркерами.
+    Возвращает False, если заказ уже взят, отменен или еще не готов.
+    """
+    assigned_id = db.execute(
+        update(models.Order)
+        .where(
+            models.Order.id == order_id,
+            models.Order.status == models.OrderStatus.READY_FOR_PICKUP,
+            models.Order.courier_id.is_(None)
+        )
+        .values(courier_id=courier_id, status=models.OrderStatus.ON_THE_WAY)
+        .returning(models.Order.id)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
     db.commit()
-    db.refresh(db_order)
-    return db_order
+    if assigned_id is None:
+        return False
+    courier_feed.hub.publish(courier_feed.ORDER_REMOVED, {"order_id": order_id})
+    return True
 
 def get_courier_delivered_orders(db: Session, courier_id: int, start_date: date, end_date: date):
     end_datetime = datetime.combine(end_date, datetime.max.time())
@@ -275,11 +612,11 @@ def update_courier_profile_info(db: Session, profile: models.CourierProfile, pro
     return profile
 
 def update_courier_id_card(db: Session, profile: models.CourierProfile, image_url: str):
-    if profile.id_card_image_url:
-        utils.delete_file(profile.id_card_image_url)
+    old_image = profile.id_card_image_url
     profile.id_card_image_url = image_url
     profile.verification_status = models.VerificationStatus.ON_REVIEW
     db.commit()
+    utils.delete_file(old_image)
     db.refresh(profile)
     return profile
 
@@ -304,15 +641,83 @@ def update_courier_verification_status(db: Session, profile: models.CourierProfi
 def create_review(db: Session, review: schemas.ReviewCreate, order_id: int, user_id: int, restaurant_id: int):
     db_review = models.Review(**review.model_dump(), order_id=order_id, user_id=user_id, restaurant_id=restaurant_id)
     db.add(db_review)
-    restaurant = db.query(models.Restaurant).filter(models.Restaurant.id == restaurant_id).first()
-    new_rating = db.query(func.coalesce(func.avg(models.Review.rating), 0)).filter(models.Review.restaurant_id == restaurant_id).scalar()
-    new_count = db.query(func.count(models.Review.id)).filter(models.Review.restaurant_id == restaurant_id).scalar()
-    restaurant.average_rating = new_rating
-    restaurant.review_count = new_count
+    # Агрегаты обновляются одним атомарным UPDATE в той же транзакции, без пересчета по всем отзывам.
+    # Правые части UPDATE видят значения до изменения (стандарт SQL; PostgreSQL и SQLite).
+    # Число отзывов берется из гистограммы, а не из review_count: так среднее всегда
+    # согласовано с rating_sum, даже если review_count достался от старых данных.
+    rating_count_column = getattr(models.Restaurant, f"rating_{review.rating}_count")
+    review_count = sum(getattr(models.Restaurant, f"rating_{stars}_count") for stars in range(1, 6)) + 1
+    rows = db.execute(
+        update(models.Restaurant)
+        .where(models.Restaurant.id == restaurant_id)
+        .values({
+            models.Restaurant.rating_sum: models.Restaurant.rating_sum + review.rating,
+            models.Restaurant.review_count: review_count,
+            rating_count_column: rating_count_column + 1,
+            models.Restaurant.average_rating: func.round(
+                cast(models.Restaurant.rating_sum + review.rating, Numeric(10, 4)) / review_count, 2
+            ),
+            models.Restaurant.menu_version: models.Restaurant.menu_version + 1,
+        })
+        .returning(models.Restaurant.id, models.Restaurant.menu_version)
+        .execution_options(synchronize_session="fetch")
+    )
+    versions = {row.id: row.menu_version for row in rows}
     db.commit()
+    menu_cache.invalidate_menus(versions)
     db.refresh(db_review)
     return db_review
 
+def rebuild_rating_aggregates(db: Session) -> int:
+    """
+    Пересчитывает агрегаты отзывов всех ресторанов с нуля одним UPDATE ... FROM (SELECT ... GROUP BY).
+    Возвращает число обновленных ресторанов.
+
+    Строки ресторанов сначала блокируются (SELECT ... FOR UPDATE): create_review, начатый
+    до пересчета, успевает закоммитить свой UPDATE, и его отзыв попадает в GROUP BY;
+    начатый после - ждет блокировку и прибавляет свой отзыв к уже пересчитанным агрегатам.
+    """
+    db.query(models.Restaurant.id).with_for_update().all()
+    counted = aliased(models.Restaurant)
+    star_counts = {
+        stars: func.coalesce(func.sum(case((models.Review.rating == stars, 1), else_=0)), 0).label(f"rating_{stars}")
+        for stars in range(1, 6)
+    }
+    totals = (
+        select(
+            counted.id.label("restaurant_id"),
+            func.count(models.Review.id).label("review_count"),
+            func.coalesce(func.sum(models.Review.rating), 0).label("rating_sum"),
+            *star_counts.values(),
+        )
+        .select_from(counted)
+        .outerjoin(models.Review, models.Review.restaurant_id == counted.id)
+        .group_by(counted.id)
+        .subquery()
+    )
+    rows = db.execute(
+        update(models.Restaurant)
+        .where(models.Restaurant.id == totals.c.restaurant_id)
+        .values({
+            models.Restaurant.review_count: totals.c.review_count,
+            models.Restaurant.rating_sum: totals.c.rating_sum,
+            models.Restaurant.average_rating: func.coalesce(
+                func.round(cast(totals.c.rating_sum, Numeric(10, 4)) / func.nullif(totals.c.review_count, 0), 2), 0
+            ),
+            **{
+                getattr(models.Restaurant, f"rating_{stars}_count"): totals.c[f"rating_{stars}"]
+                for stars in range(1, 6)
+            },
+            models.Restaurant.menu_version: models.Restaurant.menu_version + 1,
+        })
+        .returning(models.Restaurant.id, models.Restaurant.menu_version)
+        .execution_options(synchronize_session=False)
+    )
+    versions = {row.id: row.menu_version for row in rows}
+    db.commit()
+    menu_cache.invalidate_menus(versions)
+    return len(versions)
+
 def get_valid_promo_code(db: Session, code: str):
     today = date.today()
     return db.query(models.PromoCode).filter(
@@ -376,92 +781,92 @@ def get_system_settings(db: Session) -> models.SystemSettings:
         db.refresh(db_settings)
     return db_settings
 
+system_settings_cache = SystemSettingsCache(refresh_seconds=settings.SYSTEM_SETTINGS_REFRESH_SECONDS)
+
+def get_system_settings_snapshot(db: Session) -> schemas.SystemSettingsSnapshot:
+    """Настройки для горячих путей (расчет заказа, зона доставки) без запроса к БД на каждый вызов."""
+    return system_settings_cache.get(db, load=get_system_settings)
+
 def update_system_settings(db: Session, settings_in: schemas.SystemSettingsUpdate) -> models.SystemSettings:
     db_settings = get_system_settings(db)
     for key, value in settings_in.model_dump().items():
         setattr(db_settings, key, value)
+    # Атомарно увеличиваем версию: по ней остальные воркеры обновят свой кеш
+    db_settings.version = models.SystemSettings.version + 1
     db.commit()
     db.refresh(db_settings)
+    system_settings_cache.invalidate()
     return db_settings
 
-def get_dashboard_stats(db: Session, start_date: date, end_date: date):
-    end_datetime = datetime.combine(end_date, datetime.max.time())
-
-    delivered_orders_query = db.query(models.Order).filter(
-        models.Order.status == models.OrderStatus.DELIVERED,
-        models.Order.created_at >= start_date,
-        models.Order.created_at <= end_datetime
-    )
-    
-    total_revenue = delivered_orders_query.with_entities(func.sum(models.Order.total_price)).scalar() or 0
-    total_orders = delivered_orders_query.count()
-    
-    new_users = db.query(models.User).filter(
-        models.User.date_joined >= start_date,
-        models.User.date_joined <= end_datetime
-    ).count()
-
-    general_stats = schemas.GeneralStats(
-        total_revenue=total_revenue,
-        total_orders=total_orders,
-        new_users=new_users
-    )
+# =================================================================
+#                   Зоны доставки
+# =================================================================
 
-    top_restaurants_query = db.query(
-        models.Restaurant.id,
-        models.Restaurant.name,
-        func.count(models.Order.id).label("order_count"),
-        func.sum(models.Order.total_price).label("total_revenue")
-    ).join(models.Order, models.Restaurant.id == models.Order.restaurant_id).filter(
-        models.Order.status == models.OrderStatus.DELIVERED,
-        models.Order.created_at >= start_date,
-        models.Order.created_at <= end_datetime
-    ).group_by(models.Restaurant.id).order_by(desc("total_revenue")).limit(5).all()
-    
-    top_restaurants = [schemas.TopRestaurant.model_validate(r, from_attributes=True) for r in top_restaurants_query]
+delivery_zone_cache = DeliveryZoneCache()
 
-    top_couriers_query = db.query(
-        models.User.id,
-        models.User.first_name,
-        func.count(models.Order.id).label("deliveries_count"),
-        func.sum(models.Order.delivery_fee).label("total_earnings")
-    ).join(models.Order, models.User.id == models.Order.courier_id).filter(
-        models.Order.status == models.OrderStatus.DELIVERED,
-        models.Order.created_at >= start_date,
-        models.Order.created_at <= end_datetime
-    ).group_by(models.User.id).order_by(desc("total_earnings")).limit(5).all()
+def get_delivery_zone_index(db: Session) -> ZoneIndex:
+    """Индекс зон из памяти воркера; перестраивается, когда меняется версия настроек."""
+    return delivery_zone_cache.get(db, version=get_system_settings_snapshot(db).version)
 
-    top_couriers = [schemas.TopCourier.model_validate(c, from_attributes=True) for c in top_couriers_query]
+def _bump_settings_version(db: Session):
+    """Изменение зон увеличивает версию настроек, чтобы все воркеры перестроили индекс зон."""
+    db_settings = get_system_settings(db)
+    db_settings.version = models.SystemSettings.version + 1
+
+def _after_zones_changed():
+    system_settings_cache.invalidate()
+    delivery_zone_cache.invalidate()
+
+def get_delivery_zones(db: Session, restaurant_id: Optional[int] = None) -> List[models.DeliveryZone]:
+    query = db.query(models.DeliveryZone)
+    if restaurant_id is not None:
+        query = query.filter(models.DeliveryZone.restaurant_id == restaurant_id)
+    return query.order_by(models.DeliveryZone.id).all()
+
+def get_delivery_zone_by_id(db: Session, zone_id: int) -> models.DeliveryZone | None:
+    return db.query(models.DeliveryZone).filter(models.DeliveryZone.id == zone_id).first()
+
+def create_delivery_zone(db: Session, zone_in: schemas.DeliveryZoneCreate) -> models.DeliveryZone:
+    data = zone_in.model_dump(exclude={"polygon"})
+    db_zone = models.DeliveryZone(**data, polygon_json=json.dumps([list(point) for point in zone_in.polygon]))
+    db.add(db_zone)
+    _bump_settings_version(db)
+    db.commit()
+    _after_zones_changed()
+    db.refresh(db_zone)
+    return db_zone
+
+def update_delivery_zone(db: Session, db_zone: models.DeliveryZone, zone_in: schemas.DeliveryZoneCreate) -> models.DeliveryZone:
+    for key, value in zone_in.model_dump(exclude={"polygon"}).items():
+        setattr(db_zone, key, value)
+    db_zone.polygon_json = json.dumps([list(point) for point in zone_in.polygon])
+    _bump_settings_version(db)
+    db.commit()
+    _after_zones_changed()
+    db.refresh(db_zone)
+    return db_zone
 
-    top_clients_query = db.query(
-        models.User.id,
-        models.User.first_name,
-        models.User.phone,
-        func.count(models.Order.id).label("orders_count"),
-        func.sum(models.Order.total_price).label("total_spent")
-    ).join(models.Order, models.User.id == models.Order.user_id).filter(
-        models.Order.status == models.OrderStatus.DELIVERED,
-        models.Order.created_at >= start_date,
-        models.Order.created_at <= end_datetime
-    ).group_by(models.User.id).order_by(desc("total_spent")).limit(5).all()
+def delete_delivery_zone(db: Session, db_zone: models.DeliveryZone):
+    db.delete(db_zone)
+    _bump_settings_version(db)
+    db.commit()
+    _after_zones_changed()
 
-    top_clients = [schemas.TopClient.model_validate(c, from_attributes=True) for c in top_clients_query]
+def get_dashboard_stats(db: Session, start_date: date, end_date: date):
+    """Закрытые дни берутся из дневных агрегатов (rollups.py), текущий день считается по заказам."""
+    return rollups.dashboard_stats(db, start_date=start_date, end_date=end_date)
 
-    return schemas.DashboardData(
-        general_stats=general_stats,
-        top_restaurants=top_restaurants,
-        top_couriers=top_couriers,
-        top_clients=top_clients
-    )
 def get_categories(db: Session) -> List[models.Category]:
     return db.query(models.Category).all()
 def update_banner(db: Session, db_banner: models.Banner, banner_in: schemas.BannerUpdate, image_url: Optional[str] = None):
     db_banner.title = banner_in.title
     db_banner.restaurant_id = banner_in.restaurant_id
+    old_image = None
     if image_url:
-        utils.delete_file(db_banner.image_url)
+        old_image = db_banner.image_url
         db_banner.image_url = image_url
     db.commit()
+    utils.delete_file(old_image)
     db.refresh(db_banner)
     return 
 def get_pending_payout_requests(db: Session):
@@ -1,17 +1,254 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import os
+import threading
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from .config import settings  # <--- ИЗМЕНЕНИЕ: импортируем из config.py
+from . import metrics
 
 # Удаляем старый класс Settings отсюда
 
-engine = create_engine(settings.DATABASE_URL) # <--- ИЗМЕНЕНИЕ: используем импортированный settings
+def get_pool_options(database_url: str, poolclass) -> dict:
+    """
+    Параметры пула соединений из настроек.
+    Для SQLite в памяти оставляем пул по умолчанию: база живет в одном соединении,
+    размер пула и overflow к нему неприменимы. Файловая SQLite работает через QueuePool,
+    как и PostgreSQL, поэтому метрики пула есть и там.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+engine = create_engine(
+    settings.DATABASE_URL,
+    **get_pool_options(settings.DATABASE_URL, metrics.InstrumentedQueuePool)
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Асинхронные драйверы для синхронных URL из DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url() -> str:
+    """
+    Возвращает URL для асинхронного движка.
+    Если ASYNC_DATABASE_URL не задан, выводит его из DATABASE_URL,
+    подменяя синхронный драйвер на асинхронный (asyncpg / aiosqlite).
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    return to_async_url(settings.DATABASE_URL)
+
+def to_async_url(database_url: str) -> str:
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Нет асинхронного драйвера для базы данных '{backend}'.")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+# Асинхронный движок для горячих эндпоинтов.
+# Синхронный SessionLocal остается для скриптов, фоновых задач и остальных роутов.
+ASYNC_DATABASE_URL = get_async_database_url()
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **get_pool_options(ASYNC_DATABASE_URL, metrics.InstrumentedAsyncAdaptedQueuePool)
+)
+# expire_on_commit=False: объекты остаются читаемыми после commit,
+# иначе сериализация ответа вызвала бы ленивую загрузку вне event loop.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 # Зависимость для получения сессии БД в эндпоинтах
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Асинхронная зависимость. Существующие CRUD-функции вызываются через
+# `await db.run_sync(crud.some_function, ...)` и не блокируют event loop.
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_pool_report() -> dict:
+    """Состояние пулов соединений текущего воркера (процесса)."""
+    pools = [
+        metrics.pool_stats("sync", engine.pool),
+        metrics.pool_stats("async", async_engine.pool),
+    ]
+    if replica_engine is not None:
+        pools += [
+            metrics.pool_stats("replica_sync", replica_engine.pool),
+            metrics.pool_stats("replica_async", async_replica_engine.pool),
+        ]
+    return {"worker_pid": os.getpid(), "pools": pools}
+
+# =================================================================
+#                   Реплика для чтения
+# =================================================================
+# Каталог (рестораны, меню, баннеры) и агрегаты дашборда читаются с реплики,
+# если она задана в DATABASE_REPLICA_URL. Запись всегда идет в основную БД.
+
+replica_engine = None
+ReplicaSessionLocal = None
+async_replica_engine = None
+AsyncReplicaSessionLocal = None
+
+if settings.DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        settings.DATABASE_REPLICA_URL,
+        **get_pool_options(settings.DATABASE_REPLICA_URL, metrics.InstrumentedQueuePool)
+    )
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+    ASYNC_DATABASE_REPLICA_URL = to_async_url(settings.DATABASE_REPLICA_URL)
+    async_replica_engine = create_async_engine(
+        ASYNC_DATABASE_REPLICA_URL,
+        **get_pool_options(ASYNC_DATABASE_REPLICA_URL, metrics.InstrumentedAsyncAdaptedQueuePool)
+    )
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        bind=async_replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
+# Отставание реплики (PostgreSQL). Если реплика применила весь полученный WAL,
+# отставания нет, даже когда на основной БД давно не было записей.
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class ReplicaRouter:
+    """
+    Решает, можно ли отправить чтение на реплику.
+
+    - Защита от устаревших данных: отставание реплики периодически измеряется,
+      и если оно больше REPLICA_MAX_LAG_SECONDS (или реплика недоступна),
+      чтение идет в основную БД.
+    - Чтение после записи: если этот воркер недавно писал в таблицы,
+      которые читает запрос, чтение тоже идет в основную БД.
+    """
+    def __init__(self, max_lag_seconds: float, check_interval_seconds: float, read_after_write_seconds: float):
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self.read_after_write_seconds = read_after_write_seconds
+        self._last_writes: dict[str, float] = {}
+        self._lag_seconds: float | None = None
+        self._lag_checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def record_writes(self, tables):
+        now = time.monotonic()
+        with self._lock:
+            for table in tables:
+                self._last_writes[table] = now
+
+    def recently_written(self, tables) -> bool:
+        deadline = time.monotonic() - self.read_after_write_seconds
+        return any(self._last_writes.get(table, 0.0) > deadline for table in tables)
+
+    def lag_check_due(self) -> bool:
+        return time.monotonic() - self._lag_checked_at >= self.check_interval_seconds
+
+    def measure_lag(self, replica_db: Session):
+        """Обновляет закешированное отставание реплики (вызывается не чаще check_interval)."""
+        try:
+            if replica_db.get_bind().dialect.name == "postgresql":
+                lag = float(replica_db.execute(REPLICA_LAG_SQL).scalar() or 0)
+            else:
+                lag = 0.0
+        except Exception as e:
+            print(f"Реплика недоступна, чтение переключено на основную БД: {e}")
+            replica_db.rollback()
+            lag = None
+        self._lag_seconds = lag
+        self._lag_checked_at = time.monotonic()
+
+    def replica_is_fresh(self) -> bool:
+        return self._lag_seconds is not None and self._lag_seconds <= self.max_lag_seconds
+
+replica_router = ReplicaRouter(
+    max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+    check_interval_seconds=settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS,
+    read_after_write_seconds=settings.REPLICA_READ_AFTER_WRITE_SECONDS,
+)
+
+@event.listens_for(Session, "after_flush")
+def _record_primary_writes(session, flush_context):
+    if replica_engine is None:
+        return
+    tables = {
+        obj.__table__.name
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if hasattr(obj, "__table__")
+    }
+    replica_router.record_writes(tables)
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_writes(orm_execute_state):
+    # update()/delete()/insert() через session.execute не проходят через flush
+    # (CAS-назначение курьера, пакетные UPDATE веб-хуков, пересчет рейтинга)
+    if replica_engine is None:
+        return
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is not None:
+        replica_router.record_writes([table.name])
+
+def get_read_db_for(*tables: str):
+    """
+    Фабрика зависимостей для эндпоинтов только на чтение.
+    `tables` - таблицы, которые читает эндпоинт: после записи в них
+    этим воркером чтение некоторое время идет в основную БД.
+    """
+    def get_read_db():
+        db = None
+        if ReplicaSessionLocal is not None and not replica_router.recently_written(tables):
+            db = ReplicaSessionLocal()
+            if replica_router.lag_check_due():
+                replica_router.measure_lag(db)
+            if not replica_router.replica_is_fresh():
+                db.close()
+                db = None
+        if db is None:
+            db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    return get_read_db
+
+def get_async_read_db_for(*tables: str):
+    """Асинхронный вариант get_read_db_for."""
+    async def get_async_read_db():
+        db = None
+        if AsyncReplicaSessionLocal is not None and not replica_router.recently_written(tables):
+            db = AsyncReplicaSessionLocal()
+            if replica_router.lag_check_due():
+                await db.run_sync(replica_router.measure_lag)
+            if not replica_router.replica_is_fresh():
+                await db.close()
+                db = None
+        if db is None:
+            db = AsyncSessionLocal()
+        try:
+            yield db
+        finally:
+            await db.close()
+    return get_async_read_db
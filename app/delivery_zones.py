@@ -0,0 +1,122 @@
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+# Сетка индекса: общий охват зон делится на GRID_SIZE x GRID_SIZE ячеек
+GRID_SIZE = 128
+
+TARIFF_FIELDS = ("day_base_rate", "day_rate_per_km", "night_base_rate", "night_rate_per_km")
+
+
+class PreparedZone:
+    """Полигон зоны доставки, подготовленный для быстрой проверки точки."""
+    def __init__(self, zone: models.DeliveryZone):
+        self.id = zone.id
+        self.name = zone.name
+        self.restaurant_id = zone.restaurant_id
+        self.tariff_overrides = {
+            field: getattr(zone, field) for field in TARIFF_FIELDS if getattr(zone, field) is not None
+        }
+        points = [(float(lat), float(lon)) for lat, lon in zone.polygon]
+        # Ребра храним готовыми парами вершин, чтобы не собирать их при каждой проверке
+        self.edges = list(zip(points, points[1:] + points[:1]))
+        lats = [lat for lat, _ in points]
+        lons = [lon for _, lon in points]
+        self.min_lat, self.max_lat = min(lats), max(lats)
+        self.min_lon, self.max_lon = min(lons), max(lons)
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Ray casting: луч вдоль параллели пересекает границу нечетное число раз - точка внутри."""
+        if not (self.min_lat <= lat <= self.max_lat and self.min_lon <= lon <= self.max_lon):
+            return False
+        inside = False
+        for (lat1, lon1), (lat2, lon2) in self.edges:
+            if (lat1 > lat) != (lat2 > lat):
+                crossing_lon = lon1 + (lat - lat1) * (lon2 - lon1) / (lat2 - lat1)
+                if lon < crossing_lon:
+                    inside = not inside
+        return inside
+
+    def tariffs(self, base: schemas.SystemSettingsSnapshot) -> schemas.SystemSettingsSnapshot:
+        """Тарифы с переопределениями зоны поверх общих настроек."""
+        return base.model_copy(update=self.tariff_overrides) if self.tariff_overrides else base
+
+
+class ZoneIndex:
+    """
+    Неизменяемый индекс зон: сетка по общему охвату, в каждой ячейке - зоны, чьи
+    bounding box ее пересекают. Проверка точки - поиск ячейки и ray casting
+    только по зонам-кандидатам.
+    """
+    def __init__(self, zones: Sequence[PreparedZone], version: Optional[int]):
+        self.version = version
+        self.zones = list(zones)
+        self.restaurants_with_zones = {zone.restaurant_id for zone in self.zones if zone.restaurant_id is not None}
+        self.has_global_zones = any(zone.restaurant_id is None for zone in self.zones)
+        self._grid: Dict[Tuple[int, int], List[PreparedZone]] = {}
+        if not self.zones:
+            return
+        self.min_lat = min(zone.min_lat for zone in self.zones)
+        self.min_lon = min(zone.min_lon for zone in self.zones)
+        span = max(
+            max(zone.max_lat for zone in self.zones) - self.min_lat,
+            max(zone.max_lon for zone in self.zones) - self.min_lon
+        )
+        self.cell_size = max(span / GRID_SIZE, 1e-6)
+        for zone in self.zones:
+            row_from, col_from = self._cell(zone.min_lat, zone.min_lon)
+            row_to, col_to = self._cell(zone.max_lat, zone.max_lon)
+            for row in range(row_from, row_to + 1):
+                for col in range(col_from, col_to + 1):
+                    self._grid.setdefault((row, col), []).append(zone)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int((lat - self.min_lat) // self.cell_size), int((lon - self.min_lon) // self.cell_size)
+
+    def applies(self, restaurant_id: Optional[int]) -> bool:
+        """Есть ли зоны для этого ресторана (собственные или общие). Иначе действует радиус из настроек."""
+        return restaurant_id in self.restaurants_with_zones or self.has_global_zones
+
+    def find(self, lat: float, lon: float, restaurant_id: Optional[int] = None) -> Optional[PreparedZone]:
+        """
+        Зона, содержащая точку. Если у ресторана есть собственные зоны, действуют только они,
+        иначе - общие зоны (restaurant_id = NULL).
+        """
+        own_zones = restaurant_id is not None and restaurant_id in self.restaurants_with_zones
+        for zone in self._grid.get(self._cell(lat, lon), ()) if self.zones else ():
+            if own_zones and zone.restaurant_id != restaurant_id:
+                continue
+            if not own_zones and zone.restaurant_id is not None:
+                continue
+            if zone.contains(lat, lon):
+                return zone
+        return None
+
+
+class DeliveryZoneCache:
+    """
+    Индекс зон в памяти воркера. Любое изменение зон увеличивает SystemSettings.version,
+    поэтому индекс перестраивается вместе с обновлением кеша настроек (settings_cache).
+    """
+    def __init__(self):
+        self._index: Optional[ZoneIndex] = None
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, version: int) -> ZoneIndex:
+        index = self._index
+        if index is not None and index.version == version:
+            return index
+        with self._lock:
+            if self._index is None or self._index.version != version:
+                zones = db.query(models.DeliveryZone).filter(
+                    models.DeliveryZone.is_active == True
+                ).order_by(models.DeliveryZone.id).all()
+                self._index = ZoneIndex([PreparedZone(zone) for zone in zones], version=version)
+            return self._index
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
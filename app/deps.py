@@ -1,69 +1,115 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose import JWTError
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
 from . import crud, models, security
-from .database import get_db
+from .cache import TTLCache
+from .database import AsyncSessionLocal, get_db
 from .config import settings
 from . import schemas
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> models.User:
+# Кеш данных пользователя по subject токена (телефону).
+# Блокировка или смена роли в другом воркере вступает в силу не позже, чем через USER_CACHE_TTL_SECONDS.
+user_principal_cache = TTLCache(maxsize=settings.USER_CACHE_MAX_SIZE, ttl_seconds=settings.USER_CACHE_TTL_SECONDS)
+
+# Поля, изменение которых делает закешированные данные пользователя неактуальными
+PRINCIPAL_FIELDS = ("phone", "first_name", "role", "is_active", "is_superuser")
+
+# Ключ в session.info: кого сбросить из кеша после commit
+_PENDING_INVALIDATIONS = "pending_principal_invalidations"
+
+def _pending(session) -> dict:
+    return session.info.setdefault(_PENDING_INVALIDATIONS, {"users": set(), "restaurants": set()})
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_principals(session, flush_context):
+    """
+    Запоминает пользователей, чьи данные для авторизации меняет запись:
+    блокировка (crud.update_user_status), смена роли, удаление, создание ресторана для владельца.
+    Кеш сбрасывается только после commit: если сбросить его сразу после flush, параллельный
+    запрос до commit прочитает старую строку и снова закеширует ее на весь TTL.
+    """
+    pending = _pending(session)
+    for obj in session.dirty:
+        if isinstance(obj, models.User):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in PRINCIPAL_FIELDS):
+                pending["users"].add(obj.id)
+        elif isinstance(obj, models.Restaurant) and inspect(obj).attrs.owner_id.history.has_changes():
+            pending["restaurants"].add(obj.id)
+            pending["users"].add(obj.owner_id)
+    for obj in session.new:
+        if isinstance(obj, models.Restaurant):
+            pending["users"].add(obj.owner_id)
+    for obj in session.deleted:
+        if isinstance(obj, models.User):
+            pending["users"].add(obj.id)
+        elif isinstance(obj, models.Restaurant):
+            pending["users"].add(obj.owner_id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_principals(session):
+    pending = session.info.pop(_PENDING_INVALIDATIONS, None)
+    if not pending:
+        return
+    restaurant_ids = pending["restaurants"]
+    if restaurant_ids:
+        user_principal_cache.pop_where(lambda principal: principal.restaurant_id in restaurant_ids)
+    user_ids = pending["users"]
+    if user_ids:
+        user_principal_cache.pop_where(lambda principal: principal.id in user_ids)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_principals(session):
+    session.info.pop(_PENDING_INVALIDATIONS, None)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> schemas.UserPrincipal:
+    """
+    Асинхронная зависимость: выполняется в event loop, без пула потоков.
+    Сессия БД открывается только при промахе кеша и закрывается сразу после
+    чтения пользователя, поэтому эндпоинт (в том числе долгий поток SSE)
+    не держит соединение из пула ради авторизации.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Не удалось проверить учетные данные",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, security.settings.SECRET_KEY, algorithms=[security.settings.ALGORITHM])
+        payload = security.decode_access_token(token)
         phone: str = payload.get("sub")
         if phone is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = crud.get_user_by_phone(db, phone=phone)
+
+    user = user_principal_cache.get(phone)
     if user is None:
-        raise credentials_exception
+        async with AsyncSessionLocal() as db:
+            user = await db.run_sync(crud.get_user_principal, phone=phone)
+        if user is None:
+            raise credentials_exception
+        user_principal_cache.set(phone, user)
     return user
 
-def get_current_active_user(current_user: models.User = Depends(get_current_user)) -> models.User:
+async def get_current_active_user(current_user: schemas.UserPrincipal = Depends(get_current_user)) -> schemas.UserPrincipal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Неактивный пользователь.")
     return current_user
 
-def get_current_active_restaurant_owner(current_user: models.User = Depends(get_current_active_user)) -> models.User:
+async def get_current_active_restaurant_owner(current_user: schemas.UserPrincipal = Depends(get_current_active_user)) -> schemas.UserPrincipal:
     if current_user.role != models.UserRole.RESTAURANT:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Доступ разрешен только для ресторанов.")
     return current_user
 
-def get_current_active_courier(current_user: models.User = Depends(get_current_active_user)) -> models.User:
+async def get_current_active_courier(current_user: schemas.UserPrincipal = Depends(get_current_active_user)) -> schemas.UserPrincipal:
     if current_user.role != models.UserRole.COURIER:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Доступ разрешен только для курьеров.")
     return current_user
 
-def get_current_active_admin(current_user: models.User = Depends(get_current_active_user)) -> models.User:
+async def get_current_active_admin(current_user: schemas.UserPrincipal = Depends(get_current_active_user)) -> schemas.UserPrincipal:
     if not current_user.is_superuser:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Доступ разрешен только для администраторов.")
     return current_user
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> models.User:
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        phone: str = payload.get("sub")
-        if phone is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = crud.get_user_by_phone(db, phone=phone)
-    if user is None:
-        raise credentials_exception
-    return user
-
-def get_current_active_user(current_user: models.User = Depends(get_current_user)):
-    if not current_user.is_active:
-        raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user
\ No newline at end of file
@@ -0,0 +1,294 @@
+"""
+Потоковая выгрузка сырых данных для сверки финансов: заказы, позиции заказов,
+выплаты курьерам и доли сплит-платежей за период.
+
+Строки читаются серверным курсором (yield_per) пачками по EXPORT_BATCH_SIZE и
+сразу отдаются клиенту, поэтому память воркера не зависит от размера выгрузки.
+"""
+import csv
+import enum
+import io
+import json
+import zlib
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Iterator, List, NamedTuple, Sequence, Tuple
+
+from sqlalchemy import select
+
+from . import models, services
+from .config import settings
+from .database import SessionLocal
+
+try:
+    import pyarrow as pa  # выгрузка в Parquet: pip install pyarrow
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Форматы выгрузки
+CSV = "csv"
+NDJSON = "ndjson"
+PARQUET = "parquet"
+
+MEDIA_TYPES = {
+    CSV: "text/csv; charset=utf-8",
+    NDJSON: "application/x-ndjson",
+    PARQUET: "application/vnd.apache.parquet",
+}
+
+# Типы колонок: определяют схему Parquet, в CSV/NDJSON значения пишутся как есть
+INT = "int"
+MONEY = "money"
+TEXT = "text"
+TIMESTAMP = "timestamp"
+
+
+class Dataset(NamedTuple):
+    columns: Sequence[Tuple[str, str]]                   # (имя, тип)
+    query: Callable[[datetime, datetime], object]         # select строк за [start, end)
+    transform: Callable[[object], list] = None            # строка запроса -> значения колонок
+
+
+# =================================================================
+#                   Наборы данных
+# =================================================================
+
+def _orders_query(start: datetime, end: datetime):
+    return select(
+        models.Order.id,
+        models.Order.code,
+        models.Order.created_at,
+        models.Order.status,
+        models.Order.user_id,
+        models.Order.restaurant_id,
+        models.Order.courier_id,
+        models.Order.delivery_type,
+        models.Order.items_total_price,
+        models.Order.delivery_fee,
+        models.Order.service_fee,
+        models.Order.discount,
+        models.Order.total_price,
+        models.Order.payment_invoice_id,
+    ).where(models.Order.created_at >= start, models.Order.created_at < end).order_by(models.Order.id)
+
+
+def _order_items_query(start: datetime, end: datetime):
+    return select(
+        models.OrderItem.id,
+        models.OrderItem.order_id,
+        models.Order.created_at,
+        models.OrderItem.dish_id,
+        models.Dish.name,
+        models.OrderItem.quantity,
+        models.OrderItem.price_at_time_of_order,
+    ).join(models.Order, models.Order.id == models.OrderItem.order_id).outerjoin(
+        models.Dish, models.Dish.id == models.OrderItem.dish_id
+    ).where(models.Order.created_at >= start, models.Order.created_at < end).order_by(models.OrderItem.id)
+
+
+def _payouts_query(start: datetime, end: datetime):
+    return select(
+        models.PayoutRequest.id,
+        models.PayoutRequest.courier_profile_id,
+        models.CourierProfile.user_id,
+        models.PayoutRequest.amount,
+        models.PayoutRequest.status,
+        models.PayoutRequest.card_number,
+        models.PayoutRequest.created_at,
+        models.PayoutRequest.processed_at,
+    ).outerjoin(
+        models.CourierProfile, models.CourierProfile.id == models.PayoutRequest.courier_profile_id
+    ).where(
+        models.PayoutRequest.created_at >= start, models.PayoutRequest.created_at < end
+    ).order_by(models.PayoutRequest.id)
+
+
+def _payout_row(row) -> list:
+    values = list(row)
+    # Полный номер карты в выгрузку не попадает
+    card_number = row.card_number or ""
+    values[5] = f"*{card_number[-4:]}" if card_number else None
+    return values
+
+
+def _splits_query(start: datetime, end: datetime):
+    return select(
+        models.Order.id,
+        models.Order.code,
+        models.Order.created_at,
+        models.Order.status,
+        models.Order.restaurant_id,
+        models.Order.delivery_type,
+        models.Order.items_total_price,
+        models.Order.delivery_fee,
+        models.Order.service_fee,
+        models.Order.discount,
+        models.Order.total_price,
+    ).where(models.Order.created_at >= start, models.Order.created_at < end).order_by(models.Order.id)
+
+
+def _split_row(row) -> list:
+    restaurant_share, platform_share = services.calculate_split_shares(row)
+    return [
+        row.id, row.code, row.created_at, row.status, row.restaurant_id,
+        row.total_price, restaurant_share, platform_share,
+    ]
+
+
+DATASETS = {
+    "orders": Dataset(
+        columns=[
+            ("id", INT), ("code", TEXT), ("created_at", TIMESTAMP), ("status", TEXT),
+            ("user_id", INT), ("restaurant_id", INT), ("courier_id", INT), ("delivery_type", TEXT),
+            ("items_total_price", MONEY), ("delivery_fee", MONEY), ("service_fee", MONEY),
+            ("discount", MONEY), ("total_price", MONEY), ("payment_invoice_id", TEXT),
+        ],
+        query=_orders_query,
+    ),
+    "order-items": Dataset(
+        columns=[
+            ("id", INT), ("order_id", INT), ("order_created_at", TIMESTAMP), ("dish_id", INT),
+            ("dish_name", TEXT), ("quantity", INT), ("price_at_time_of_order", MONEY),
+        ],
+        query=_order_items_query,
+    ),
+    "payouts": Dataset(
+        columns=[
+            ("id", INT), ("courier_profile_id", INT), ("courier_user_id", INT), ("amount", MONEY),
+            ("status", TEXT), ("card_last4", TEXT), ("created_at", TIMESTAMP), ("processed_at", TIMESTAMP),
+        ],
+        query=_payouts_query,
+        transform=_payout_row,
+    ),
+    "splits": Dataset(
+        columns=[
+            ("order_id", INT), ("code", TEXT), ("created_at", TIMESTAMP), ("status", TEXT),
+            ("restaurant_id", INT), ("total_price", MONEY), ("restaurant_share", MONEY), ("platform_share", MONEY),
+        ],
+        query=_splits_query,
+        transform=_split_row,
+    ),
+}
+
+
+# =================================================================
+#                   Чтение и сериализация
+# =================================================================
+
+def _plain(value):
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def iter_batches(dataset: Dataset, start_date: date, end_date: date) -> Iterator[List[list]]:
+    """
+    Пачки строк за дни [start_date, end_date] (по UTC). Сессия своя: генератор дочитывается
+    уже после выхода из эндпоинта, когда сессия запроса закрыта.
+    """
+    # Границы дней по UTC, как и в дашборде (rollups.day_start): наивные datetime
+    # PostgreSQL сравнивал бы с timestamptz в часовом поясе сессии
+    start = datetime.combine(start_date, time.min, tzinfo=timezone.utc)
+    end = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=timezone.utc)
+    with SessionLocal() as db:
+        result = db.execute(dataset.query(start, end).execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+        for partition in result.partitions():
+            rows = [dataset.transform(row) if dataset.transform else list(row) for row in partition]
+            yield [[_plain(value) for value in values] for values in rows]
+
+
+def _csv_chunks(dataset: Dataset, batches: Iterator[List[list]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in dataset.columns])
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _ndjson_chunks(dataset: Dataset, batches: Iterator[List[list]]) -> Iterator[bytes]:
+    names = [name for name, _ in dataset.columns]
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(names, values)), ensure_ascii=False, default=str) + "\n" for values in batch
+        ).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Файл для ParquetWriter, который копит записанные байты до следующей выдачи клиенту."""
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema(dataset: Dataset):
+    types = {
+        INT: pa.int64(),
+        MONEY: pa.decimal128(14, 2),
+        TEXT: pa.string(),
+        TIMESTAMP: pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in dataset.columns])
+
+
+def _parquet_chunks(dataset: Dataset, batches: Iterator[List[list]]) -> Iterator[bytes]:
+    """Каждая пачка - отдельная группа строк Parquet; метаданные файла уходят последним куском."""
+    schema = _arrow_schema(dataset)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # 31 - формат gzip
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream(name: str, start_date: date, end_date: date, fmt: str = CSV, gzip: bool = False) -> Iterator[bytes]:
+    """Байты выгрузки набора name в формате fmt."""
+    dataset = DATASETS[name]
+    batches = iter_batches(dataset, start_date, end_date)
+    if fmt == PARQUET:
+        # Parquet сжимается сам, gzip поверх не нужен
+        return _parquet_chunks(dataset, batches)
+    chunks = _csv_chunks(dataset, batches) if fmt == CSV else _ndjson_chunks(dataset, batches)
+    return _gzip(chunks) if gzip else chunks
+
+
+def filename(name: str, start_date: date, end_date: date, fmt: str, gzip: bool = False) -> str:
+    suffix = ".gz" if gzip and fmt != PARQUET else ""
+    return f"{name}_{start_date.isoformat()}_{end_date.isoformat()}.{fmt}{suffix}"
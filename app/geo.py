@@ -0,0 +1,201 @@
+import math
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np  # ускоряет пакетный расчет расстояний: pip install numpy
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+EARTH_RADIUS_KM = 6371.0088
+
+# С меньшим числом точек накладные расходы NumPy больше выигрыша
+NUMPY_MIN_BATCH = 16
+
+# Точность geohash, хранимого в БД (~4.8 x 4.8 м): из него получается ячейка любой меньшей точности
+STORED_PRECISION = 9
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Символ, следующий за последним символом алфавита: ячейка c = диапазон [c, c + CELL_END)
+CELL_END = "{"
+
+
+def encode_geohash(lat: float, lon: float, precision: int = STORED_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def cell_size_degrees(precision: int) -> Tuple[float, float]:
+    """Высота и ширина ячейки geohash данной точности в градусах."""
+    lon_bits = math.ceil(5 * precision / 2)
+    lat_bits = 5 * precision - lon_bits
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def haversine_km_many(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]) -> List[float]:
+    """Расстояния от одной точки до многих; при наличии NumPy - одним векторным вычислением."""
+    if NUMPY_AVAILABLE and len(lats) >= NUMPY_MIN_BATCH:
+        phi1 = np.radians(lat)
+        phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+        d_phi = phi2 - phi1
+        d_lambda = np.radians(np.asarray(lons, dtype=np.float64) - lon)
+        a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+        return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).tolist()
+    return [haversine_km(lat, lon, point_lat, point_lon) for point_lat, point_lon in zip(lats, lons)]
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lon, max_lon) квадрата, описанного вокруг круга радиусом radius_km."""
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    d_lon = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+    return max(lat - d_lat, -90.0), min(lat + d_lat, 90.0), max(lon - d_lon, -180.0), min(lon + d_lon, 180.0)
+
+
+def covering_cells(lat: float, lon: float, radius_km: float, precision: Optional[int] = None, max_cells: int = 16) -> Set[str]:
+    """
+    Ячейки geohash, покрывающие круг радиусом radius_km.
+    Без явной точности выбирается самая мелкая, при которой ячеек не больше max_cells.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    if precision is None:
+        precision = 1
+        for candidate in range(STORED_PRECISION, 0, -1):
+            height, width = cell_size_degrees(candidate)
+            estimate = (math.floor((max_lat - min_lat) / height) + 2) * (math.floor((max_lon - min_lon) / width) + 2)
+            if estimate <= max_cells:
+                precision = candidate
+                break
+
+    height, width = cell_size_degrees(precision)
+    cells = set()
+    cell_lat = min_lat
+    while True:
+        cell_lon = min_lon
+        while True:
+            cells.add(encode_geohash(cell_lat, cell_lon, precision))
+            if cell_lon >= max_lon:
+                break
+            cell_lon = min(cell_lon + width, max_lon)
+        if cell_lat >= max_lat:
+            break
+        cell_lat = min(cell_lat + height, max_lat)
+    return cells
+
+
+def within_radius(
+    lat: float, lon: float, radius_km: float, points: Iterable[Tuple[Hashable, float, float]]
+) -> List[Tuple[Hashable, float]]:
+    """Точные расстояния для кандидатов: [(ключ, км)] в пределах радиуса, от ближних к дальним (затем по ключу)."""
+    points = list(points)
+    distances = haversine_km_many(lat, lon, [point[1] for point in points], [point[2] for point in points])
+    result = [(point[0], distance) for point, distance in zip(points, distances) if distance <= radius_km]
+    # При равном расстоянии - по ключу: порядок (расстояние, id) нужен курсорной пагинации
+    result.sort(key=lambda item: (item[1], item[0]))
+    return result
+
+
+class GeoCellIndex:
+    """
+    Точки в памяти, разложенные по ячейкам geohash фиксированной точности.
+    Поиск в радиусе просматривает только ячейки, покрывающие круг, а не все точки.
+    """
+    def __init__(self, precision: int = 5):
+        self.precision = precision
+        self._cells: Dict[str, Dict[Hashable, Tuple[float, float]]] = {}
+        self._cell_of: Dict[Hashable, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: Hashable, lat: float, lon: float):
+        cell = encode_geohash(lat, lon, self.precision)
+        with self._lock:
+            self._remove_locked(key)
+            self._cells.setdefault(cell, {})[key] = (lat, lon)
+            self._cell_of[key] = cell
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            self._remove_locked(key)
+
+    def _remove_locked(self, key: Hashable):
+        cell = self._cell_of.pop(key, None)
+        if cell is not None:
+            bucket = self._cells[cell]
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def nearby(self, lat: float, lon: float, radius_km: float, limit: Optional[int] = None) -> List[Tuple[Hashable, float]]:
+        cells = covering_cells(lat, lon, radius_km, precision=self.precision, max_cells=10**6)
+        with self._lock:
+            candidates = [
+                (key, point[0], point[1])
+                for cell in cells
+                for key, point in self._cells.get(cell, {}).items()
+            ]
+        result = within_radius(lat, lon, radius_km, candidates)
+        return result[:limit] if limit is not None else result
+
+    def __len__(self) -> int:
+        return len(self._cell_of)
+
+
+class RefreshingGeoIndex:
+    """
+    GeoCellIndex, который перестраивается из БД раз в refresh_seconds.
+    `load(db)` возвращает точки [(ключ, широта, долгота)] - один легкий запрос без JOIN.
+    Изменения в этом воркере сбрасывают индекс сразу через invalidate().
+    """
+    def __init__(self, refresh_seconds: float, precision: int = 5):
+        self.refresh_seconds = refresh_seconds
+        self.precision = precision
+        self._index: Optional[GeoCellIndex] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db, load: Callable[..., Iterable[Tuple[Hashable, float, float]]]) -> GeoCellIndex:
+        index = self._index
+        if index is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return index
+        with self._lock:
+            if self._index is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+                index = GeoCellIndex(self.precision)
+                for key, lat, lon in load(db):
+                    index.add(key, lat, lon)
+                self._index = index
+                self._loaded_at = time.monotonic()
+            return self._index
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
@@ -0,0 +1,138 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .cache import TTLCache
+from .config import settings
+
+# Области действия ключей
+ORDER_CREATE_SCOPE = "orders.create"
+
+
+class IdempotencyConflict(Exception):
+    """Ключ уже использован для другого запроса или запрос с этим ключом еще выполняется."""
+    pass
+
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    body: bytes
+
+
+# Завершенные ответы по (scope, key) -> (fingerprint, StoredResponse).
+# Повтор, попавший в тот же воркер, отвечается без обращения к БД.
+completed_responses = TTLCache(maxsize=settings.IDEMPOTENCY_CACHE_MAX_SIZE, ttl_seconds=settings.IDEMPOTENCY_CACHE_TTL_SECONDS)
+
+_purge_lock = threading.Lock()
+_last_purge = 0.0
+
+
+def request_fingerprint(*parts) -> str:
+    """Хеш частей запроса (пользователь, тело). Один ключ с другим запросом - ошибка клиента."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def begin(db: Session, scope: str, key: str, fingerprint: str) -> Optional[StoredResponse]:
+    """
+    Начинает обработку запроса с ключом.
+    Возвращает сохраненный ответ, если такой запрос уже выполнялся, иначе резервирует ключ
+    и возвращает None - тогда вызывающий код обязан вызвать complete() или abandon().
+    """
+    cached = completed_responses.get((scope, key))
+    if cached is not None:
+        cached_fingerprint, response = cached
+        if cached_fingerprint != fingerprint:
+            raise IdempotencyConflict("Ключ идемпотентности уже использован для другого запроса.")
+        return response
+
+    _maybe_purge(db)
+    now = datetime.now(timezone.utc)
+    # Просроченный ответ или брошенный (упавшим воркером) запрос не блокируют ключ
+    db.query(models.IdempotencyRecord).filter(
+        models.IdempotencyRecord.scope == scope,
+        models.IdempotencyRecord.key == key,
+        or_(
+            models.IdempotencyRecord.expires_at <= now,
+            and_(
+                models.IdempotencyRecord.status_code.is_(None),
+                models.IdempotencyRecord.created_at <= now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+            )
+        )
+    ).delete(synchronize_session=False)
+
+    record = db.query(models.IdempotencyRecord).filter(
+        models.IdempotencyRecord.scope == scope,
+        models.IdempotencyRecord.key == key
+    ).first()
+    if record is not None:
+        db.commit()
+        if record.fingerprint != fingerprint:
+            raise IdempotencyConflict("Ключ идемпотентности уже использован для другого запроса.")
+        if record.status_code is None:
+            raise IdempotencyConflict("Запрос с этим ключом идемпотентности еще выполняется.")
+        response = StoredResponse(status_code=record.status_code, body=record.response_body or b"")
+        completed_responses.set((scope, key), (fingerprint, response))
+        return response
+
+    db.add(models.IdempotencyRecord(
+        scope=scope,
+        key=key,
+        fingerprint=fingerprint,
+        created_at=now,
+        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Параллельный запрос с тем же ключом успел зарезервировать его первым
+        db.rollback()
+        raise IdempotencyConflict("Запрос с этим ключом идемпотентности еще выполняется.")
+    return None
+
+
+def complete(db: Session, scope: str, key: str, status_code: int, body: bytes = b""):
+    """Сохраняет ответ: повторы с тем же ключом получат его без повторного выполнения."""
+    record = db.query(models.IdempotencyRecord).filter(
+        models.IdempotencyRecord.scope == scope,
+        models.IdempotencyRecord.key == key
+    ).first()
+    if record is None:
+        return
+    record.status_code = status_code
+    record.response_body = body
+    db.commit()
+    completed_responses.set((scope, key), (record.fingerprint, StoredResponse(status_code=status_code, body=body)))
+
+
+def abandon(db: Session, scope: str, key: str):
+    """Освобождает ключ после ошибки, чтобы клиент мог повторить запрос."""
+    db.rollback()
+    db.query(models.IdempotencyRecord).filter(
+        models.IdempotencyRecord.scope == scope,
+        models.IdempotencyRecord.key == key,
+        models.IdempotencyRecord.status_code.is_(None)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def _maybe_purge(db: Session):
+    """Удаляет просроченные записи не чаще раза в IDEMPOTENCY_PURGE_INTERVAL_SECONDS на воркер."""
+    global _last_purge
+    with _purge_lock:
+        if time.monotonic() - _last_purge < settings.IDEMPOTENCY_PURGE_INTERVAL_SECONDS:
+            return
+        _last_purge = time.monotonic()
+    db.query(models.IdempotencyRecord).filter(
+        models.IdempotencyRecord.expires_at <= datetime.now(timezone.utc)
+    ).delete(synchronize_session=False)
@@ -1,17 +1,65 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from .database import Base, engine
 from .api.v1.api import api_router
+from .config import settings
+from . import security, pagination, scheduler, services, outbox, idempotency, webhook_queue, courier_feed, utils
 
 # Создает все таблицы в БД при первом запуске.
 # В продакшене лучше использовать системы миграций, такие как Alembic.
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Фоновые сервисы воркера: запускаются при старте и останавливаются при завершении
+    await courier_feed.hub.start()
+    await scheduler.job_scheduler.start()
+    await outbox.payment_dispatcher.start()
+    await webhook_queue.payment_event_consumer.start()
+    yield
+    await webhook_queue.payment_event_consumer.stop()
+    await outbox.payment_dispatcher.stop()
+    await scheduler.job_scheduler.stop()
+    await courier_feed.hub.stop()
+    await services.paylink_client.close()
+    security.password_service.shutdown()
+
 app = FastAPI(
     title="JetFood API",
     description="Бэкенд для сервиса доставки еды JetFood.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Слишком большие загрузки отклоняются до чтения тела запроса
+app.add_middleware(utils.UploadSizeLimitMiddleware, max_body_bytes=settings.UPLOAD_MAX_REQUEST_BYTES)
+
+@app.exception_handler(security.PasswordServiceBusy)
+async def password_service_busy_handler(request: Request, exc: security.PasswordServiceBusy):
+    """Пул хеширования паролей перегружен: просим клиента повторить позже."""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Сервис временно перегружен. Повторите попытку через несколько секунд."},
+        headers={"Retry-After": "2"},
+    )
+
+@app.exception_handler(pagination.InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: pagination.InvalidCursor):
+    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": str(exc)})
+
+@app.exception_handler(idempotency.IdempotencyConflict)
+async def idempotency_conflict_handler(request: Request, exc: idempotency.IdempotencyConflict):
+    return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"detail": str(exc)})
+
+@app.exception_handler(utils.UploadTooLarge)
+async def upload_too_large_handler(request: Request, exc: utils.UploadTooLarge):
+    return JSONResponse(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, content={"detail": str(exc)})
+
+@app.exception_handler(utils.InvalidUpload)
+async def invalid_upload_handler(request: Request, exc: utils.InvalidUpload):
+    return JSONResponse(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, content={"detail": str(exc)})
+
 # Подключаем все роутеры версии v1
 app.include_router(api_router, prefix="/api/v1")
 
@@ -0,0 +1,45 @@
+"""
+Служебные команды для обслуживания данных.
+
+    python -m app.maintenance rebuild-ratings
+    python -m app.maintenance backfill-rollups --start 2024-01-01 --end 2024-12-31
+"""
+import argparse
+from datetime import date
+
+from . import crud, rollups
+from .database import SessionLocal
+
+
+def rebuild_ratings(args):
+    with SessionLocal() as db:
+        updated = crud.rebuild_rating_aggregates(db)
+    print(f"Агрегаты отзывов пересчитаны для {updated} ресторанов.")
+
+
+def backfill_rollups(args):
+    end_date = args.end or rollups.utc_today()
+    start_date = args.start or end_date
+    with SessionLocal() as db:
+        days = rollups.backfill(db, start_date, end_date, chunk_days=args.chunk_days)
+    print(f"Дневные агрегаты дашборда пересчитаны за {days} дн.")
+
+
+COMMANDS = {
+    "rebuild-ratings": rebuild_ratings,
+    "backfill-rollups": backfill_rollups,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Служебные команды JetFood.")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--start", type=date.fromisoformat, help="backfill-rollups: первый день (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="backfill-rollups: последний день, по умолчанию сегодня (UTC)")
+    parser.add_argument("--chunk-days", type=int, default=31, help="backfill-rollups: дней в одной транзакции")
+    args = parser.parse_args()
+    COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+from . import models, schemas
+from .cache import TTLCache
+from .config import settings
+
+
+class MenuSnapshot(NamedTuple):
+    """Готовый JSON ответа GET /restaurants/{id}, его ETag и версия меню, из которой он собран."""
+    body: bytes
+    etag: str
+    version: int
+
+
+# Снимки меню по ID ресторана: (снимок, время последней сверки версии с БД).
+# Любое изменение меню увеличивает restaurants.menu_version в той же транзакции.
+# Этот воркер сбрасывает снимок сразу после commit, остальные сверяют версию
+# одним коротким запросом не чаще раза в MENU_VERSION_CHECK_SECONDS.
+menu_snapshots = TTLCache(maxsize=settings.MENU_CACHE_MAX_SIZE, ttl_seconds=settings.MENU_CACHE_TTL_SECONDS)
+
+# Самая новая известная этому воркеру версия меню каждого ресторана.
+# Снимок, собранный из более старой версии, в кеш не попадает.
+_latest_versions: Dict[int, int] = {}
+_lock = threading.Lock()
+
+
+def get_menu(restaurant_id: int) -> Optional[MenuSnapshot]:
+    entry = menu_snapshots.get(restaurant_id)
+    return entry[0] if entry else None
+
+
+def version_check_due(restaurant_id: int) -> bool:
+    entry = menu_snapshots.get(restaurant_id)
+    return entry is None or time.monotonic() - entry[1] >= settings.MENU_VERSION_CHECK_SECONDS
+
+
+def confirm_version(restaurant_id: int, version: Optional[int]) -> Optional[MenuSnapshot]:
+    """
+    Сверяет снимок с версией меню из БД (None - ресторан скрыт или удален).
+    Возвращает снимок, если он актуален; устаревший снимок удаляется.
+    """
+    with _lock:
+        latest = _latest_versions.get(restaurant_id, 0)
+        if version is not None and version > latest:
+            _latest_versions[restaurant_id] = latest = version
+        snapshot = get_menu(restaurant_id)
+        if snapshot is None or version is None or snapshot.version != version or latest > version:
+            menu_snapshots.pop(restaurant_id)
+            return None
+        menu_snapshots.set(restaurant_id, (snapshot, time.monotonic()))
+        return snapshot
+
+
+def store_menu(db_restaurant: models.Restaurant) -> MenuSnapshot:
+    """
+    Сериализует ресторан с меню один раз и кладет результат в кеш.
+    Если за время чтения меню уже изменилось (известна более новая версия),
+    снимок отдается только этому запросу и не кешируется.
+    """
+    body = schemas.RestaurantPublicDetail.model_validate(db_restaurant, from_attributes=True).model_dump_json().encode()
+    # ETag считается по содержимому, поэтому совпадает во всех воркерах
+    snapshot = MenuSnapshot(
+        body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"', version=db_restaurant.menu_version
+    )
+    with _lock:
+        if _latest_versions.get(db_restaurant.id, 0) > snapshot.version:
+            return snapshot
+        _latest_versions[db_restaurant.id] = snapshot.version
+        menu_snapshots.set(db_restaurant.id, (snapshot, time.monotonic()))
+    return snapshot
+
+
+def invalidate_menus(versions: Dict[int, int]):
+    """Вызывается после commit с новыми версиями меню: {restaurant_id: menu_version}."""
+    with _lock:
+        for restaurant_id, version in versions.items():
+            if version > _latest_versions.get(restaurant_id, 0):
+                _latest_versions[restaurant_id] = version
+            menu_snapshots.pop(restaurant_id)
+
+
+def clear():
+    with _lock:
+        _latest_versions.clear()
+        menu_snapshots.clear()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class LatencyStats:
+    """
+    Статистика задержек по скользящему окну последних замеров.
+    Хранится в памяти процесса, то есть отдельно для каждого воркера.
+    """
+    def __init__(self, window: int = 1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            count, max_seconds = self.count, self.max_seconds
+
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+        return {
+            "count": count,
+            "avg_ms": (sum(samples) / len(samples) * 1000) if samples else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": max_seconds * 1000,
+        }
+
+
+# =================================================================
+#                   Метрики пула соединений БД
+# =================================================================
+
+class PoolMetrics:
+    """
+    Счетчики одного пула: задержка выдачи соединения (включая создание нового),
+    число запросов, ждущих освобождения соединения, таймауты.
+    """
+    def __init__(self):
+        self.checkout_latency = LatencyStats()
+        self.timeouts = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    def measure_checkout(self, do_get):
+        start = time.perf_counter()
+        try:
+            return do_get()
+        except exc.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        finally:
+            self.checkout_latency.observe(time.perf_counter() - start)
+
+    def measure_wait(self, queue_get):
+        """
+        Оборачивает get() внутренней очереди пула. QueuePool блокируется на ней
+        (block=True) только когда пул и overflow исчерпаны, поэтому в waiting
+        попадают лишь запросы, реально ждущие освобождения соединения.
+        """
+        def get(block=True, timeout=None):
+            if not block:
+                return queue_get(block, timeout)
+            with self._lock:
+                self._waiting += 1
+            try:
+                return queue_get(block, timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+        return get
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, который замеряет выдачу соединений и очередь ожидания."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+        self._pool.get = self.metrics.measure_wait(self._pool.get)
+
+    def _do_get(self):
+        return self.metrics.measure_checkout(super()._do_get)
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """То же самое для асинхронного движка."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+        self._pool.get = self.metrics.measure_wait(self._pool.get)
+
+    def _do_get(self):
+        return self.metrics.measure_checkout(super()._do_get)
+
+
+def pool_stats(name: str, pool) -> dict:
+    """Снимок состояния пула для админского эндпоинта."""
+    stats = {
+        "engine": name,
+        "pool_class": type(pool).__name__,
+        "pool_size": None,
+        "checked_out": None,
+        "idle": None,
+        "overflow": None,
+        "waiting": None,
+        "timeouts": None,
+        "checkout_latency": None,
+    }
+    if isinstance(pool, QueuePool):
+        stats.update(
+            pool_size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        stats.update(
+            waiting=metrics.waiting,
+            timeouts=metrics.timeouts,
+            checkout_latency=metrics.checkout_latency.snapshot(),
+        )
+    return stats
@@ -1,11 +1,14 @@
 import enum
+import json
 from sqlalchemy import (
     Boolean, Column, ForeignKey, Integer, String, DateTime,
-    Enum, Numeric, Text, Float, Date
+    Enum, Numeric, Text, Float, Date, Index, UniqueConstraint, LargeBinary
 )
+from sqlalchemy import event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
+from . import geo
 
 # --- Enum типы (без изменений) ---
 class UserRole(str, enum.Enum):
@@ -43,6 +46,18 @@ class PayoutStatus(str, enum.Enum):
     PENDING = "pending"
     APPROVED = "approved"
     REJECTED = "rejected"
+
+class JobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    UNKNOWN = "unknown"   # запрос во внешний сервис мог дойти, результат неизвестен (payment_outbox)
+
+class PaymentStatus(str, enum.Enum):
+    PENDING = "pending"   # платеж еще создается в PayLink
+    READY = "ready"       # ссылка на оплату готова
+    FAILED = "failed"     # PayLink не создал платеж, заказ отменен
 # --- Модели ---
 class User(Base):
     # ... (без изменений) ...
@@ -73,6 +88,7 @@ class Address(Base):
     house_number = Column(String, nullable=False)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    geohash = Column(String(12), nullable=True, index=True)  # заполняется автоматически из координат
     user = relationship("User", back_populates="addresses")
 
 class Restaurant(Base):
@@ -86,10 +102,20 @@ class Restaurant(Base):
     address = Column(String)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    geohash = Column(String(12), nullable=True, index=True)  # заполняется автоматически из координат
     is_approved = Column(Boolean, default=False)
     is_active = Column(Boolean, default=True)
     average_rating = Column(Numeric(3, 2), default=0.00)
     review_count = Column(Integer, default=0)
+    # Накопительные агрегаты отзывов: обновляются одним UPDATE в crud.create_review
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_1_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_2_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_3_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_4_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_5_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Версия меню (GET /restaurants/{id}): растет при каждом изменении ресторана, блюд и отзывов
+    menu_version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # --- ИЗМЕНЕНИЯ ---
     # Убираем balance, добавляем paylink_account_id
@@ -100,6 +126,34 @@ class Restaurant(Base):
     orders = relationship("Order", back_populates="restaurant")
     reviews = relationship("Review", back_populates="restaurant")
 
+    @property
+    def rating_histogram(self):
+        """Число отзывов по каждой оценке 1-5 (для RestaurantPublicDetail)."""
+        return {stars: getattr(self, f"rating_{stars}_count") or 0 for stars in range(1, 6)}
+
+    @property
+    def menu_categories(self):
+        """Блюда ресторана, сгруппированные по глобальным категориям (для RestaurantPublicDetail)."""
+        categories = {}
+        for dish in sorted(self.dishes, key=lambda d: d.id):
+            category = categories.setdefault(
+                dish.category_id,
+                {"id": dish.category.id, "name": dish.category.name, "dishes": []}
+            )
+            category["dishes"].append(dish)
+        return list(categories.values())
+
+@event.listens_for(Address, "before_insert")
+@event.listens_for(Address, "before_update")
+@event.listens_for(Restaurant, "before_insert")
+@event.listens_for(Restaurant, "before_update")
+def _set_geohash(mapper, connection, target):
+    """Поддерживает индексируемую колонку geohash в соответствии с координатами."""
+    if target.latitude is None or target.longitude is None:
+        target.geohash = None
+    else:
+        target.geohash = geo.encode_geohash(target.latitude, target.longitude)
+
 # --- ИЗМЕНЕННАЯ МОДЕЛЬ ---
 class Category(Base):
     """Глобальная модель категорий, управляемая админом."""
@@ -136,6 +190,8 @@ class Order(Base):
     restaurant_id = Column(Integer, ForeignKey("restaurants.id"))
     courier_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     address_text = Column(Text)
+    delivery_lat = Column(Float, nullable=True)
+    delivery_lon = Column(Float, nullable=True)
     items_total_price = Column(Numeric(10, 2))
     delivery_fee = Column(Numeric(10, 2))
     service_fee = Column(Numeric(10, 2))
@@ -144,6 +200,7 @@ class Order(Base):
     status = Column(Enum(OrderStatus), default=OrderStatus.PENDING)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     payment_invoice_id = Column(String, nullable=True, index=True)
+    payment_url = Column(String, nullable=True)  # заполняется диспетчером outbox.py
     delivery_type = Column(Enum(DeliveryType), nullable=True)
     preparation_time_minutes = Column(Integer, nullable=True)
     ready_by_timestamp = Column(DateTime(timezone=True), nullable=True)
@@ -154,6 +211,12 @@ class Order(Base):
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
     review = relationship("Review", back_populates="order", uselist=False, cascade="all, delete-orphan")
 
+    # Индексы под курсорную пагинацию (сортировка по created_at, id)
+    __table_args__ = (
+        Index("ix_orders_restaurant_created", "restaurant_id", "created_at", "id"),
+        Index("ix_orders_status_created", "status", "created_at", "id"),
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
     id = Column(Integer, primary_key=True, index=True)
@@ -243,3 +306,132 @@ class SystemSettings(Base):
     city_center_lon = Column(Float, default=52.8667)
     # Радиус доставки в километрах
     delivery_radius_km = Column(Float, default=10.0)
+
+    # Увеличивается при каждом изменении; по ней воркеры обновляют кеш настроек
+    version = Column(Integer, nullable=False, default=1)
+
+class DeliveryZone(Base):
+    """
+    Зона доставки - многоугольник. Зоны с restaurant_id действуют только для этого ресторана,
+    без него - для ресторанов без собственных зон. Пустые тарифы берутся из SystemSettings.
+    """
+    __tablename__ = "delivery_zones"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=True, index=True)
+    polygon_json = Column(Text, nullable=False)  # JSON: [[lat, lon], ...]
+    is_active = Column(Boolean, default=True)
+    day_base_rate = Column(Numeric(10, 2), nullable=True)
+    day_rate_per_km = Column(Numeric(10, 2), nullable=True)
+    night_base_rate = Column(Numeric(10, 2), nullable=True)
+    night_rate_per_km = Column(Numeric(10, 2), nullable=True)
+
+    @property
+    def polygon(self):
+        return json.loads(self.polygon_json)
+
+class ScheduledJob(Base):
+    """Отложенная задача планировщика (scheduler.py). Переживает перезапуск воркеров."""
+    __tablename__ = "scheduled_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=True)  # JSON с параметрами задачи
+    run_at = Column(DateTime(timezone=True), nullable=False)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    locked_by = Column(String, nullable=True)  # воркер, захвативший задачу
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_scheduled_jobs_status_run_at", "status", "run_at"),
+    )
+
+class PaymentOutbox(Base):
+    """
+    Запрос на создание платежа в PayLink. Пишется в одной транзакции с заказом,
+    отправляется диспетчером outbox.py.
+    """
+    __tablename__ = "payment_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, unique=True)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    order = relationship("Order")
+
+    __table_args__ = (
+        Index("ix_payment_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+class IdempotencyRecord(Base):
+    """Сохраненный ответ на запрос с ключом идемпотентности (idempotency.py)."""
+    __tablename__ = "idempotency_records"
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String, nullable=False)        # эндпоинт, например "orders.create"
+    key = Column(String, nullable=False)          # Idempotency-Key клиента
+    fingerprint = Column(String, nullable=False)  # хеш пользователя и тела запроса
+    status_code = Column(Integer, nullable=True)  # пусто, пока запрос выполняется
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("scope", "key", name="uq_idempotency_scope_key"),
+        Index("ix_idempotency_expires_at", "expires_at"),
+    )
+
+class PaymentEvent(Base):
+    """Принятое веб-хук событие PayLink, ожидающее применения (webhook_queue.py)."""
+    __tablename__ = "payment_events"
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(String, nullable=True, unique=True)  # ID события PayLink: повторная доставка не создает дубль
+    event_type = Column(String, nullable=False)
+    order_id = Column(Integer, nullable=True)
+    payload = Column(Text, nullable=False)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.PENDING)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_payment_events_status_id", "status", "id"),
+    )
+
+# --- Дневные агрегаты для дашборда (rollups.py) ---
+# Заказ попадает в день своего created_at; учитываются только доставленные заказы.
+
+class DailyStats(Base):
+    __tablename__ = "daily_stats"
+    day = Column(Date, primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0, server_default="0")
+    revenue = Column(Numeric(14, 2), nullable=False, default=0, server_default="0")
+    new_users = Column(Integer, nullable=False, default=0, server_default="0")
+
+class DailyRestaurantStats(Base):
+    __tablename__ = "daily_restaurant_stats"
+    day = Column(Date, primary_key=True)
+    restaurant_id = Column(Integer, ForeignKey("restaurants.id", ondelete="CASCADE"), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_revenue = Column(Numeric(14, 2), nullable=False, default=0, server_default="0")
+
+class DailyCourierStats(Base):
+    __tablename__ = "daily_courier_stats"
+    day = Column(Date, primary_key=True)
+    courier_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    deliveries_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_earnings = Column(Numeric(14, 2), nullable=False, default=0, server_default="0")
+
+class DailyClientStats(Base):
+    __tablename__ = "daily_client_stats"
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_spent = Column(Numeric(14, 2), nullable=False, default=0, server_default="0")
@@ -0,0 +1,243 @@
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
+
+from . import models, services
+from .config import settings
+from .database import SessionLocal
+
+
+class PaymentOutboxDispatcher:
+    """
+    Отправляет в PayLink запросы на создание платежей из таблицы payment_outbox.
+
+    - Запись в outbox делается в одной транзакции с заказом (crud.create_order),
+      поэтому POST /orders/ не ждет PayLink и не оставляет заказов без платежа.
+    - Пачка записей захватывается условным UPDATE ... WHERE status='pending' RETURNING,
+      поэтому при нескольких воркерах каждую запись обработает ровно один.
+    - Вызовы PayLink внутри пачки идут параллельно, не более concurrency одновременно.
+    - Создание платежа неидемпотентно, поэтому повторяется только запрос, который
+      гарантированно не дошел до PayLink (services.PaymentNotSent); после max_attempts
+      таких попыток заказ отменяется. Отказ по существу (services.PaymentRejected)
+      не повторяется и сразу отменяет заказ.
+    - Если запрос мог дойти (таймаут, 5xx) или воркер не завершил обработку за
+      stale_seconds, запись получает статус unknown и больше не отправляется
+      автоматически. Ее закрывает веб-хук об оплате заказа (webhook_queue.py)
+      или администратор после сверки с кабинетом PayLink.
+    - Результат записывается, только пока запись захвачена этим воркером (locked_by).
+    """
+    def __init__(
+        self,
+        poll_seconds: float,
+        batch_size: int,
+        concurrency: int,
+        max_attempts: int,
+        retry_seconds: float,
+        stale_seconds: float,
+    ):
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.stale_seconds = stale_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self._semaphore = None
+
+    # --- Публичный интерфейс ---
+
+    def notify(self):
+        """Будит диспетчер после commit нового заказа. Можно вызывать из любого потока."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # --- Основной цикл ---
+
+    async def _run(self):
+        next_recovery = 0.0
+        while True:
+            try:
+                self._wakeup.clear()
+                if time.time() >= next_recovery:
+                    await asyncio.to_thread(self._release_stale)
+                    next_recovery = time.time() + self.stale_seconds / 2
+
+                entries = await asyncio.to_thread(self._claim_batch)
+                if entries:
+                    await asyncio.gather(*(self._dispatch(entry) for entry in entries))
+                    # Полная пачка - в очереди, скорее всего, есть еще
+                    if len(entries) == self.batch_size:
+                        continue
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ошибка диспетчера платежей: {e}")
+                await asyncio.sleep(self.poll_seconds)
+
+    def _release_stale(self):
+        """
+        Записи, захваченные воркером, который не завершил их обработку, переводятся в unknown:
+        запрос в PayLink мог уйти до падения воркера, поэтому повторять его автоматически нельзя.
+        """
+        now = datetime.now(timezone.utc)
+        with SessionLocal() as db:
+            released = db.execute(
+                update(models.PaymentOutbox)
+                .where(
+                    models.PaymentOutbox.status == models.JobStatus.RUNNING,
+                    models.PaymentOutbox.locked_at < now - timedelta(seconds=self.stale_seconds)
+                )
+                .values(
+                    status=models.JobStatus.UNKNOWN,
+                    locked_by=None,
+                    locked_at=None,
+                    last_error="Воркер не завершил отправку, результат запроса к PayLink неизвестен."
+                )
+                .returning(models.PaymentOutbox.order_id)
+            ).scalars().all()
+            db.commit()
+        for order_id in released:
+            print(f"Платеж для заказа #{order_id} требует сверки с PayLink: обработка не завершена.")
+
+    def _claim_batch(self) -> List[dict]:
+        """Захватывает пачку готовых к отправке записей и загружает данные для PayLink."""
+        now = datetime.now(timezone.utc)
+        with SessionLocal() as db:
+            due_ids = select(models.PaymentOutbox.id).where(
+                models.PaymentOutbox.status == models.JobStatus.PENDING,
+                models.PaymentOutbox.next_attempt_at <= now
+            ).order_by(models.PaymentOutbox.next_attempt_at).limit(self.batch_size)
+            claimed = db.execute(
+                update(models.PaymentOutbox)
+                .where(
+                    models.PaymentOutbox.id.in_(due_ids),
+                    models.PaymentOutbox.status == models.JobStatus.PENDING
+                )
+                .values(
+                    status=models.JobStatus.RUNNING,
+                    locked_by=self.worker_id,
+                    locked_at=now,
+                    attempts=models.PaymentOutbox.attempts + 1
+                )
+                .returning(models.PaymentOutbox.id)
+            ).scalars().all()
+            db.commit()
+            if not claimed:
+                return []
+            entries = db.query(models.PaymentOutbox).options(
+                joinedload(models.PaymentOutbox.order).joinedload(models.Order.restaurant)
+            ).filter(models.PaymentOutbox.id.in_(claimed)).all()
+            # Заказы отсоединяются от сессии: PayLinkService читает только их колонки
+            db.expunge_all()
+        return [
+            {
+                "id": entry.id,
+                "attempts": entry.attempts,
+                "order": entry.order,
+                "restaurant_account_id": entry.order.restaurant.paylink_account_id,
+            }
+            for entry in entries
+        ]
+
+    async def _dispatch(self, entry: dict):
+        payment_url = None
+        async with self._semaphore:
+            try:
+                if not entry["restaurant_account_id"]:
+                    raise services.PaymentRejected("У ресторана не указан счет PayLink.")
+                payment_url = await services.PayLinkService().create_split_payment(
+                    order=entry["order"],
+                    restaurant_account_id=entry["restaurant_account_id"],
+                    platform_account_id=settings.PLATFORM_PAYLINK_ACCOUNT_ID
+                )
+                status, error = models.JobStatus.DONE, None
+            except services.PaymentRejected as e:
+                status, error = models.JobStatus.FAILED, str(e)
+            except services.PaymentNotSent as e:
+                status, error = models.JobStatus.PENDING, str(e)
+            except services.PaymentOutcomeUnknown as e:
+                status, error = models.JobStatus.UNKNOWN, str(e)
+        await asyncio.to_thread(self._record_result, entry, status, payment_url, error)
+
+    def _record_result(self, entry: dict, status: models.JobStatus, payment_url: str | None = None, error: str | None = None):
+        """
+        Записывает результат отправки. status - DONE, FAILED, PENDING (повторить) или UNKNOWN.
+        """
+        now = datetime.now(timezone.utc)
+        with SessionLocal() as db:
+            outbox_entry = db.get(models.PaymentOutbox, entry["id"], with_for_update=True)
+            leased = outbox_entry.status == models.JobStatus.RUNNING and outbox_entry.locked_by == self.worker_id
+            # Ссылку на созданный платеж сохраняем, даже если запись уже признана брошенной
+            if not leased and not (payment_url and outbox_entry.status == models.JobStatus.UNKNOWN):
+                print(
+                    f"Запись outbox #{outbox_entry.id} больше не захвачена воркером {self.worker_id} "
+                    f"(статус {outbox_entry.status.value}), результат отправки не записан."
+                )
+                return
+
+            if status == models.JobStatus.PENDING and outbox_entry.attempts >= self.max_attempts:
+                status = models.JobStatus.FAILED
+            outbox_entry.status = status
+            outbox_entry.last_error = error
+            if status == models.JobStatus.DONE:
+                db_order = db.get(models.Order, outbox_entry.order_id)
+                db_order.payment_url = payment_url
+                db_order.payment_invoice_id = payment_url.split('/')[-1]
+                outbox_entry.processed_at = now
+            elif status == models.JobStatus.FAILED:
+                outbox_entry.processed_at = now
+                db_order = db.get(models.Order, outbox_entry.order_id)
+                if db_order.status == models.OrderStatus.PENDING:
+                    db_order.status = models.OrderStatus.CANCELLED
+                    print(f"Не удалось создать платеж для заказа #{db_order.id}, заказ отменен: {error}")
+                else:
+                    print(
+                        f"Не удалось создать платеж для заказа #{db_order.id}: {error}. "
+                        f"Заказ не отменен, его статус уже {db_order.status.value}."
+                    )
+            elif status == models.JobStatus.PENDING:
+                outbox_entry.next_attempt_at = now + timedelta(seconds=self.retry_seconds * outbox_entry.attempts)
+            else:
+                print(f"Платеж для заказа #{outbox_entry.order_id} требует сверки с PayLink: {error}")
+            outbox_entry.locked_by = None
+            outbox_entry.locked_at = None
+            db.commit()
+
+payment_dispatcher = PaymentOutboxDispatcher(
+    poll_seconds=settings.PAYMENT_OUTBOX_POLL_SECONDS,
+    batch_size=settings.PAYMENT_OUTBOX_BATCH_SIZE,
+    concurrency=settings.PAYMENT_OUTBOX_CONCURRENCY,
+    max_attempts=settings.PAYMENT_OUTBOX_MAX_ATTEMPTS,
+    retry_seconds=settings.PAYMENT_OUTBOX_RETRY_SECONDS,
+    stale_seconds=settings.PAYMENT_OUTBOX_STALE_SECONDS,
+)
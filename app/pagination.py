@@ -0,0 +1,114 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Курсор поврежден или относится к другому списку."""
+    pass
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: list) -> list:
+    """Разбирает курсор и приводит значения к типам колонок сортировки."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise InvalidCursor("Некорректный курсор пагинации.")
+        return [
+            datetime.fromisoformat(value) if column.type.python_type is datetime else column.type.python_type(value)
+            for value, column in zip(values, columns)
+        ]
+    except InvalidCursor:
+        raise
+    except (ValueError, TypeError):
+        raise InvalidCursor("Некорректный курсор пагинации.")
+
+
+def _after(columns: list, values: list, descending: bool):
+    """
+    Условие "строго после (values)" для сортировки по нескольким колонкам:
+    a >= x AND ((a > x) OR (a = x AND b > y) ...). Развернуто вручную, т.к. сравнение
+    кортежей поддерживается не всеми СУБД. Отдельная граница a >= x нужна планировщику:
+    по одному OR он не начинает чтение индекса с курсора, а проходит все предыдущие строки.
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        cmp = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*[columns[j] == values[j] for j in range(i)], cmp))
+    if len(columns) == 1:
+        return clauses[0]
+    bound = columns[0] <= values[0] if descending else columns[0] >= values[0]
+    return and_(bound, or_(*clauses))
+
+
+def paginate(query: Query, order_by: list, limit: int, cursor: Optional[str] = None, descending: bool = False) -> dict:
+    """
+    Keyset-пагинация: вместо OFFSET продолжаем с последней выданной записи,
+    поэтому стоимость страницы не зависит от ее номера.
+
+    `order_by` - колонки сортировки, последняя должна быть уникальной (обычно id),
+    чтобы порядок был стабильным. Возвращает словарь в формате schemas.Page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        query = query.filter(_after(order_by, decode_cursor(cursor, order_by), descending))
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in order_by])
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in order_by])
+    return {"items": items, "next_cursor": next_cursor, "has_more": has_more}
+
+
+def encode_distance_cursor(lat: float, lon: float, distance_km: float, key: int) -> str:
+    """Курсор списка "от ближних к дальним": точка поиска и последняя выданная пара (расстояние, id)."""
+    return encode_cursor([lat, lon, distance_km, key])
+
+
+def decode_distance_cursor(cursor: str, lat: float, lon: float) -> tuple:
+    """Возвращает (расстояние, id) из курсора; курсор от поиска из другой точки не принимается."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != 4:
+            raise InvalidCursor("Некорректный курсор пагинации.")
+        cursor_lat, cursor_lon, distance_km, key = float(values[0]), float(values[1]), float(values[2]), int(values[3])
+    except InvalidCursor:
+        raise
+    except (ValueError, TypeError):
+        raise InvalidCursor("Некорректный курсор пагинации.")
+    if (cursor_lat, cursor_lon) != (lat, lon):
+        raise InvalidCursor("Курсор относится к поиску из другой точки; начните с первой страницы.")
+    return distance_km, key
+
+
+def paginate_by_distance(nearest: list, lat: float, lon: float, limit: int, cursor: Optional[str] = None) -> tuple:
+    """
+    Страница из списка [(id, расстояние)], упорядоченного по (расстоянию, id).
+    Возвращает (страница, next_cursor, has_more).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        after = decode_distance_cursor(cursor, lat, lon)
+        nearest = [(key, distance) for key, distance in nearest if (distance, key) > after]
+    page = nearest[:limit]
+    has_more = len(nearest) > limit
+    next_cursor = encode_distance_cursor(lat, lon, page[-1][1], page[-1][0]) if has_more else None
+    return page, next_cursor, has_more
@@ -0,0 +1,404 @@
+"""
+Дневные агрегаты для дашборда администратора.
+
+Таблицы daily_* хранят итоги доставленных заказов по дням: общие, по ресторанам,
+курьерам и клиентам. Они обновляются в той же транзакции, в которой заказ
+переходит в DELIVERED (или выходит из него), и пересчитываются кусками командой
+`python -m app.maintenance backfill-rollups`. Дашборд читает закрытые дни из
+агрегатов, а текущий день считает по заказам - объем чтения не растет с историей.
+
+Границы дней везде в UTC: created_at и date_joined заполняются func.now() в UTC,
+поэтому и "сегодня", и день заказа, и периоды пересчета считаются в UTC.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from sqlalchemy import (
+    Integer, Numeric, String, delete, desc, event, func, insert, inspect, literal, select, union_all, update
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .cache import TTLCache
+from .config import settings
+
+TOP_LIMIT = 5
+
+# Сводки за закрытые периоды: (start_date, end_date) -> (start_date, end_date, DashboardData)
+dashboard_cache = TTLCache(maxsize=settings.DASHBOARD_CACHE_MAX_SIZE, ttl_seconds=settings.DASHBOARD_CACHE_TTL_SECONDS)
+
+
+class Rollup(NamedTuple):
+    model: type
+    entity: Optional[str]  # поле с ID сущности (одинаковое в заказе и в агрегате)
+    count_field: str
+    amount_field: str
+    amount_source: str     # поле заказа, которое суммируется
+
+
+DAY_ROLLUP = Rollup(models.DailyStats, None, "orders_count", "revenue", "total_price")
+RESTAURANT_ROLLUP = Rollup(models.DailyRestaurantStats, "restaurant_id", "order_count", "total_revenue", "total_price")
+COURIER_ROLLUP = Rollup(models.DailyCourierStats, "courier_id", "deliveries_count", "total_earnings", "delivery_fee")
+CLIENT_ROLLUP = Rollup(models.DailyClientStats, "user_id", "orders_count", "total_spent", "total_price")
+
+ROLLUPS = (DAY_ROLLUP, RESTAURANT_ROLLUP, COURIER_ROLLUP, CLIENT_ROLLUP)
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def utc_day(value: datetime) -> date:
+    """День по UTC. SQLite возвращает datetime без часового пояса - это уже UTC."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+
+def day_start(day: date) -> datetime:
+    """Начало дня по UTC."""
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+# =================================================================
+#                   Инкрементальное обновление
+# =================================================================
+
+@event.listens_for(Session, "before_flush")
+def _load_deleted_order_days(session, flush_context, instances):
+    """После flush строки удаленного заказа уже нет - его created_at (день агрегата) загружаем заранее."""
+    for obj in session.deleted:
+        if isinstance(obj, models.Order) and "created_at" not in inspect(obj).dict:
+            session.refresh(obj, attribute_names=["created_at"])
+
+
+@event.listens_for(Session, "after_flush")
+def _update_rollups(session, flush_context):
+    """
+    Переносит в агрегаты заказы, сменившие статус на DELIVERED (+1) или с DELIVERED (-1),
+    и новых пользователей. Записи идут через соединение сессии - в той же транзакции.
+    Массовые UPDATE в обход ORM сюда не попадают: их итоги исправляет backfill.
+    """
+    order_deltas = []
+    new_users = 0
+    for obj in session.new:
+        if isinstance(obj, models.Order) and obj.status == models.OrderStatus.DELIVERED:
+            order_deltas.append((obj, 1))
+        elif isinstance(obj, models.User):
+            new_users += 1
+    for obj in session.dirty:
+        if not isinstance(obj, models.Order):
+            continue
+        history = inspect(obj).attrs.status.history
+        if not history.has_changes():
+            continue
+        was_delivered = models.OrderStatus.DELIVERED in history.deleted
+        is_delivered = obj.status == models.OrderStatus.DELIVERED
+        if was_delivered != is_delivered:
+            order_deltas.append((obj, 1 if is_delivered else -1))
+    for obj in session.deleted:
+        if isinstance(obj, models.Order) and obj.status == models.OrderStatus.DELIVERED:
+            order_deltas.append((obj, -1))
+
+    if not order_deltas and not new_users:
+        return
+
+    connection = session.connection()
+    # created_at только что вставленного (server_default) или expired заказа в объекте нет:
+    # читаем его через соединение сессии, не вызывая загрузку атрибута внутри flush
+    missing = [order.id for order, _ in order_deltas if inspect(order).dict.get("created_at") is None]
+    created = dict(connection.execute(
+        select(models.Order.id, models.Order.created_at).where(models.Order.id.in_(missing))
+    ).all()) if missing else {}
+
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+    for order, sign in order_deltas:
+        created_at = inspect(order).dict.get("created_at") or created[order.id]
+        day = utc_day(created_at)
+        for rollup in ROLLUPS:
+            entity_id = getattr(order, rollup.entity) if rollup.entity else None
+            if rollup.entity and entity_id is None:
+                continue
+            delta = deltas[(rollup, day, entity_id)]
+            delta[0] += sign
+            delta[1] += sign * (getattr(order, rollup.amount_source) or 0)
+
+    today = utc_today()
+    for day in {day for _, day, _ in deltas}:
+        if day < today:
+            invalidate_dashboard(day, day)
+
+    for (rollup, day, entity_id), (count, amount) in deltas.items():
+        keys = {"day": day}
+        if rollup.entity:
+            keys[rollup.entity] = entity_id
+        increment(connection, rollup.model, keys, {rollup.count_field: count, rollup.amount_field: amount})
+    if new_users:
+        increment(connection, models.DailyStats, {"day": utc_today()}, {"new_users": new_users})
+
+
+def increment(connection, model, keys: dict, counters: dict):
+    """Прибавляет counters к строке агрегата с ключом keys, создавая ее при необходимости."""
+    table = model.__table__
+    dialect_insert = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}.get(connection.dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(table).values(**keys, **counters)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + stmt.excluded[name] for name in counters}
+        ))
+        return
+    result = connection.execute(
+        update(table)
+        .where(*(table.c[name] == value for name, value in keys.items()))
+        .values({name: table.c[name] + value for name, value in counters.items()})
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(**keys, **counters))
+
+
+# =================================================================
+#                   Пересчет (backfill)
+# =================================================================
+
+def _as_date(value) -> date:
+    # SQLite возвращает date() строкой
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def _utc_date(db: Session, column):
+    """Выражение "день по UTC" для колонки с датой-временем."""
+    if db.get_bind().dialect.name == "postgresql":
+        # date() от timestamptz берет часовой пояс сессии
+        return func.date(func.timezone("UTC", column))
+    return func.date(column)
+
+
+def _delivered_between(start: datetime, end: datetime):
+    return (
+        models.Order.status == models.OrderStatus.DELIVERED,
+        models.Order.created_at >= start,
+        models.Order.created_at < end,
+    )
+
+
+def rebuild_range(db: Session, start_date: date, end_date: date):
+    """Пересчитывает агрегаты за дни [start_date, end_date] по заказам. Не коммитит."""
+    range_start = day_start(start_date)
+    range_end = day_start(end_date + timedelta(days=1))
+    order_day = _utc_date(db, models.Order.created_at)
+
+    for rollup in ROLLUPS:
+        model = rollup.model
+        db.execute(delete(model).where(model.day >= start_date, model.day <= end_date))
+        entity = getattr(models.Order, rollup.entity) if rollup.entity else None
+        group = [order_day] + ([entity] if entity is not None else [])
+        filters = _delivered_between(range_start, range_end)
+        if entity is not None:
+            filters += (entity.isnot(None),)
+        query = select(
+            *group,
+            func.count(models.Order.id),
+            func.coalesce(func.sum(getattr(models.Order, rollup.amount_source)), 0)
+        ).where(*filters).group_by(*group)
+        columns = ["day"] + ([rollup.entity] if rollup.entity else []) + [rollup.count_field, rollup.amount_field]
+        db.execute(insert(model.__table__).from_select(columns, query))
+
+    joined_day = _utc_date(db, models.User.date_joined)
+    new_users = db.execute(
+        select(joined_day, func.count(models.User.id))
+        .where(models.User.date_joined >= range_start, models.User.date_joined < range_end)
+        .group_by(joined_day)
+    ).all()
+    connection = db.connection()
+    for day, count in new_users:
+        increment(connection, models.DailyStats, {"day": _as_date(day)}, {"new_users": count})
+
+
+def backfill(db: Session, start_date: date, end_date: date, chunk_days: int = 31) -> int:
+    """
+    Пересчитывает агрегаты за период кусками по chunk_days дней, каждый кусок -
+    отдельная короткая транзакция. Возвращает число пересчитанных дней.
+    """
+    days = 0
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        rebuild_range(db, chunk_start, chunk_end)
+        db.commit()
+        invalidate_dashboard(chunk_start, chunk_end)
+        days += (chunk_end - chunk_start).days + 1
+        chunk_start = chunk_end + timedelta(days=1)
+    return days
+
+
+# =================================================================
+#                   Дашборд
+# =================================================================
+
+def _live_orders(live_start: datetime, live_end: datetime):
+    """CTE доставленных заказов текущего дня: фильтр по статусу и дате применяется один раз на все части."""
+    return select(
+        models.Order.id,
+        models.Order.restaurant_id,
+        models.Order.courier_id,
+        models.Order.user_id,
+        models.Order.total_price,
+        models.Order.delivery_fee
+    ).where(*_delivered_between(live_start, live_end)).cte("live_orders")
+
+
+def _top_totals(rollup: Rollup, start_date: date, rollup_end: date, live):
+    """
+    Подзапрос (entity_id, cnt, amount) с топом сущностей за период: закрытые дни из агрегата,
+    текущий день - группировкой CTE live_orders.
+    """
+    parts = []
+    if start_date <= rollup_end:
+        model = rollup.model
+        parts.append(select(
+            getattr(model, rollup.entity).label("entity_id"),
+            getattr(model, rollup.count_field).label("cnt"),
+            getattr(model, rollup.amount_field).label("amount")
+        ).where(model.day >= start_date, model.day <= rollup_end))
+    if live is not None:
+        entity = live.c[rollup.entity]
+        parts.append(select(
+            entity.label("entity_id"),
+            func.count(live.c.id).label("cnt"),
+            func.sum(live.c[rollup.amount_source]).label("amount")
+        ).where(entity.isnot(None)).group_by(entity))
+    combined = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery()
+    return select(
+        combined.c.entity_id,
+        func.sum(combined.c.cnt).label("cnt"),
+        func.sum(combined.c.amount).label("amount")
+    ).group_by(combined.c.entity_id).order_by(desc("amount")).limit(TOP_LIMIT).subquery()
+
+
+def _row(kind: str, entity_id=None, name=None, phone=None, cnt=None, amount=None, new_users=None):
+    """Колонки строки общего запроса дашборда: у всех частей UNION ALL одинаковый набор."""
+    def column(value, name, type_):
+        return (value if value is not None else literal(None, type_)).label(name)
+
+    return (
+        literal(kind).label("kind"),
+        column(entity_id, "id", Integer),
+        column(name, "name", String),
+        column(phone, "phone", String),
+        column(cnt, "cnt", Integer),
+        column(amount, "amount", Numeric),
+        column(new_users, "new_users", Integer),
+    )
+
+
+def _dashboard_query(start_date: date, rollup_end: date, live_start: Optional[datetime], live_end: datetime):
+    """
+    Весь дашборд одним запросом: UNION ALL строк "general" (итоги) и трех топов.
+    Заказы текущего дня читаются один раз через CTE live_orders.
+    """
+    live = _live_orders(live_start, live_end) if live_start is not None else None
+    parts = []
+
+    if start_date <= rollup_end:
+        daily = models.DailyStats
+        parts.append(select(*_row(
+            "general",
+            cnt=func.sum(daily.orders_count),
+            amount=func.sum(daily.revenue),
+            new_users=func.sum(daily.new_users)
+        )).where(daily.day >= start_date, daily.day <= rollup_end))
+    if live is not None:
+        live_users = select(func.count(models.User.id)).where(
+            models.User.date_joined >= live_start,
+            models.User.date_joined < live_end
+        ).scalar_subquery()
+        parts.append(select(*_row(
+            "general",
+            cnt=func.count(live.c.id),
+            amount=func.sum(live.c.total_price),
+            new_users=live_users
+        )).select_from(live))
+
+    restaurants = _top_totals(RESTAURANT_ROLLUP, start_date, rollup_end, live)
+    parts.append(select(*_row(
+        "restaurant", models.Restaurant.id, models.Restaurant.name, cnt=restaurants.c.cnt, amount=restaurants.c.amount
+    )).join(restaurants, models.Restaurant.id == restaurants.c.entity_id))
+
+    couriers = _top_totals(COURIER_ROLLUP, start_date, rollup_end, live)
+    parts.append(select(*_row(
+        "courier", models.User.id, models.User.first_name, cnt=couriers.c.cnt, amount=couriers.c.amount
+    )).join(couriers, models.User.id == couriers.c.entity_id))
+
+    clients = _top_totals(CLIENT_ROLLUP, start_date, rollup_end, live)
+    parts.append(select(*_row(
+        "client", models.User.id, models.User.first_name, models.User.phone, cnt=clients.c.cnt, amount=clients.c.amount
+    )).join(clients, models.User.id == clients.c.entity_id))
+
+    return union_all(*parts)
+
+
+def _empty_dashboard() -> schemas.DashboardData:
+    return schemas.DashboardData(
+        general_stats=schemas.GeneralStats(total_revenue=0, total_orders=0, new_users=0),
+        top_restaurants=[], top_couriers=[], top_clients=[]
+    )
+
+
+def dashboard_stats(db: Session, start_date: date, end_date: date, today: Optional[date] = None) -> schemas.DashboardData:
+    """
+    Сводка за период (дни по UTC). Период, закончившийся до сегодня, целиком берется
+    из агрегатов и кешируется по (start_date, end_date); с текущим днем - всегда считается заново.
+    """
+    today = today or utc_today()
+    closed = end_date < today
+    if closed:
+        cached = dashboard_cache.get((start_date, end_date))
+        if cached is not None:
+            return cached[2]
+
+    rollup_end = min(end_date, today - timedelta(days=1))
+    live_start = day_start(max(start_date, today)) if end_date >= today else None
+    live_end = day_start(end_date + timedelta(days=1))
+    if start_date > rollup_end and live_start is None:
+        return _empty_dashboard()
+
+    total_orders, total_revenue, new_users = 0, Decimal(0), 0
+    tops = {"restaurant": [], "courier": [], "client": []}
+    for row in db.execute(_dashboard_query(start_date, rollup_end, live_start, live_end)):
+        if row.kind == "general":
+            total_orders += row.cnt or 0
+            total_revenue += row.amount or 0
+            new_users += row.new_users or 0
+        else:
+            tops[row.kind].append(row)
+    for rows in tops.values():
+        rows.sort(key=lambda row: row.amount or 0, reverse=True)
+
+    result = schemas.DashboardData(
+        general_stats=schemas.GeneralStats(total_revenue=total_revenue, total_orders=total_orders, new_users=new_users),
+        top_restaurants=[
+            schemas.TopRestaurant(id=r.id, name=r.name, order_count=r.cnt, total_revenue=r.amount)
+            for r in tops["restaurant"]
+        ],
+        top_couriers=[
+            schemas.TopCourier(id=c.id, first_name=c.name, deliveries_count=c.cnt, total_earnings=c.amount)
+            for c in tops["courier"]
+        ],
+        top_clients=[
+            schemas.TopClient(id=c.id, first_name=c.name, phone=c.phone, orders_count=c.cnt, total_spent=c.amount)
+            for c in tops["client"]
+        ],
+    )
+    if closed:
+        dashboard_cache.set((start_date, end_date), (start_date, end_date, result))
+    return result
+
+
+def invalidate_dashboard(start_date: date, end_date: date):
+    """Сбрасывает закешированные сводки, чей период пересекается с [start_date, end_date]."""
+    dashboard_cache.pop_where(lambda entry: entry[0] <= end_date and start_date <= entry[1])
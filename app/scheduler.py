@@ -0,0 +1,253 @@
+import asyncio
+import heapq
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+from sqlalchemy import case, literal, update
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .database import SessionLocal
+
+# Типы задач
+COURIER_SEARCH_JOB = "courier_search"
+
+# kind -> обработчик(db, payload). Обработчики должны быть идемпотентны:
+# после падения воркера задача может выполниться повторно.
+JOB_HANDLERS: Dict[str, Callable[[Session, dict], None]] = {}
+
+
+def job_handler(kind: str):
+    """Регистрирует функцию как обработчик задач данного типа."""
+    def decorator(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def add_job(db: Session, kind: str, run_at: datetime, payload: dict) -> models.ScheduledJob:
+    """
+    Добавляет задачу в текущую транзакцию. Commit делает вызывающий код,
+    поэтому задача сохраняется атомарно вместе с изменением, которое ее породило.
+    """
+    job = models.ScheduledJob(kind=kind, run_at=run_at, payload=json.dumps(payload))
+    db.add(job)
+    db.flush()
+    return job
+
+
+def _timestamp(dt: datetime) -> float:
+    # SQLite возвращает datetime без часового пояса; храним всегда UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class JobScheduler:
+    """
+    Планировщик отложенных задач на основе таблицы scheduled_jobs.
+
+    - Источник истины - БД: задачи переживают перезапуск, просроченные задачи
+      подхватываются при старте.
+    - Каждый воркер держит в куче (heapq, O(log n)) только задачи, которые наступят
+      в ближайшие lookahead_seconds; остальные ждут в БД и подгружаются опросом.
+    - Перед выполнением задача захватывается условным UPDATE ... WHERE status='pending'
+      RETURNING, поэтому при нескольких воркерах ее выполнит ровно один.
+    - Задачи, захваченные упавшим воркером, через stale_seconds возвращаются в очередь
+      (или помечаются FAILED, если попытки исчерпаны).
+    """
+    def __init__(
+        self,
+        poll_seconds: float,
+        lookahead_seconds: float,
+        batch_size: int,
+        max_attempts: int,
+        retry_seconds: float,
+        stale_seconds: float,
+    ):
+        self.poll_seconds = poll_seconds
+        self.lookahead_seconds = lookahead_seconds
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.stale_seconds = stale_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        self._heap: List[tuple] = []  # (run_at timestamp, job_id)
+        self._known = set()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    # --- Публичный интерфейс ---
+
+    def notify(self, job_id: int, run_at: datetime):
+        """
+        Сообщает о новой задаче после commit. Можно вызывать из любого потока.
+        Далекие задачи не кладутся в кучу: их подгрузит опрос БД.
+        """
+        run_at_ts = _timestamp(run_at)
+        if run_at_ts > time.time() + self.lookahead_seconds:
+            return
+        self._push(job_id, run_at_ts)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # --- Куча ---
+
+    def _push(self, job_id: int, run_at_ts: float):
+        with self._lock:
+            if job_id in self._known:
+                return
+            self._known.add(job_id)
+            heapq.heappush(self._heap, (run_at_ts, job_id))
+
+    def _pop_due(self, now_ts: float) -> List[int]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now_ts and len(due) < self.batch_size:
+                _, job_id = heapq.heappop(self._heap)
+                self._known.discard(job_id)
+                due.append(job_id)
+        return due
+
+    def _next_run_at(self) -> float:
+        with self._lock:
+            return self._heap[0][0] if self._heap else float("inf")
+
+    # --- Основной цикл ---
+
+    async def _run(self):
+        next_poll = 0.0
+        while True:
+            try:
+                # Сбрасываем событие до проверки кучи, чтобы не потерять notify()
+                self._wakeup.clear()
+                if time.time() >= next_poll:
+                    await asyncio.to_thread(self._poll)
+                    next_poll = time.time() + self.poll_seconds
+
+                due = self._pop_due(time.time())
+                if due:
+                    await asyncio.to_thread(self._run_due, due)
+                    continue
+
+                timeout = min(next_poll, self._next_run_at()) - time.time()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ошибка планировщика задач: {e}")
+                await asyncio.sleep(self.poll_seconds)
+
+    def _poll(self):
+        """Возвращает в очередь зависшие задачи и подгружает ближайшие (включая просроченные)."""
+        now = datetime.now(timezone.utc)
+        status_type = models.ScheduledJob.status.type
+        with SessionLocal() as db:
+            db.execute(
+                update(models.ScheduledJob)
+                .where(
+                    models.ScheduledJob.status == models.JobStatus.RUNNING,
+                    models.ScheduledJob.locked_at < now - timedelta(seconds=self.stale_seconds)
+                )
+                .values(
+                    # Попытка уже учтена при захвате (attempts + 1), поэтому задача,
+                    # роняющая воркер, не крутится бесконечно: после max_attempts - FAILED
+                    status=case(
+                        (models.ScheduledJob.attempts >= self.max_attempts, literal(models.JobStatus.FAILED, status_type)),
+                        else_=literal(models.JobStatus.PENDING, status_type),
+                    ),
+                    last_error="Воркер не завершил задачу за отведенное время.",
+                    locked_by=None,
+                    locked_at=None,
+                )
+            )
+            db.commit()
+            upcoming = db.query(models.ScheduledJob.id, models.ScheduledJob.run_at).filter(
+                models.ScheduledJob.status == models.JobStatus.PENDING,
+                models.ScheduledJob.run_at <= now + timedelta(seconds=self.lookahead_seconds)
+            ).all()
+        for job_id, run_at in upcoming:
+            self._push(job_id, _timestamp(run_at))
+
+    def _run_due(self, job_ids: List[int]):
+        now = datetime.now(timezone.utc)
+        with SessionLocal() as db:
+            claimed = db.execute(
+                update(models.ScheduledJob)
+                .where(
+                    models.ScheduledJob.id.in_(job_ids),
+                    models.ScheduledJob.status == models.JobStatus.PENDING,
+                    models.ScheduledJob.run_at <= now
+                )
+                .values(
+                    status=models.JobStatus.RUNNING,
+                    locked_by=self.worker_id,
+                    locked_at=now,
+                    attempts=models.ScheduledJob.attempts + 1
+                )
+                .returning(models.ScheduledJob.id)
+            ).scalars().all()
+            db.commit()
+        for job_id in claimed:
+            self._execute(job_id)
+
+    def _execute(self, job_id: int):
+        with SessionLocal() as db:
+            job = db.get(models.ScheduledJob, job_id)
+            try:
+                handler = JOB_HANDLERS.get(job.kind)
+                if handler is None:
+                    raise LookupError(f"Нет обработчика для задачи типа '{job.kind}'.")
+                handler(db, json.loads(job.payload or "{}"))
+                job = db.get(models.ScheduledJob, job_id)
+                job.status = models.JobStatus.DONE
+                job.finished_at = datetime.now(timezone.utc)
+            except Exception as e:
+                db.rollback()
+                job = db.get(models.ScheduledJob, job_id)
+                job.last_error = str(e)
+                if job.attempts >= self.max_attempts:
+                    job.status = models.JobStatus.FAILED
+                else:
+                    job.status = models.JobStatus.PENDING
+                    job.run_at = datetime.now(timezone.utc) + timedelta(seconds=self.retry_seconds * job.attempts)
+                print(f"Задача #{job_id} ({job.kind}) завершилась ошибкой: {e}")
+            job.locked_by = None
+            job.locked_at = None
+            db.commit()
+
+
+job_scheduler = JobScheduler(
+    poll_seconds=settings.SCHEDULER_POLL_SECONDS,
+    lookahead_seconds=settings.SCHEDULER_LOOKAHEAD_SECONDS,
+    batch_size=settings.SCHEDULER_BATCH_SIZE,
+    max_attempts=settings.SCHEDULER_MAX_ATTEMPTS,
+    retry_seconds=settings.SCHEDULER_RETRY_SECONDS,
+    stale_seconds=settings.SCHEDULER_STALE_SECONDS,
+)
@@ -1,8 +1,8 @@
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from typing import Dict, Generic, List, Optional, Tuple, TypeVar
 from datetime import datetime, date
 from decimal import Decimal
-from .models import PayoutStatus, UserRole, OrderStatus, PromoCodeType, VerificationStatus,DeliveryType
+from .models import PayoutStatus, UserRole, OrderStatus, PromoCodeType, VerificationStatus,DeliveryType, PaymentStatus, JobStatus
 
 # ==================================
 #         Базовые схемы
@@ -10,6 +10,14 @@ from .models import PayoutStatus, UserRole, OrderStatus, PromoCodeType, Verifica
 class Message(BaseModel):
     message: str
 
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    """Страница списка с курсорной пагинацией. next_cursor передается в ?cursor= для следующей страницы."""
+    items: List[T]
+    next_cursor: Optional[str] = None
+    has_more: bool
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -73,6 +81,23 @@ class UserPublic(BaseModel):
     class Config:
         from_attributes = True
 
+class UserPrincipal(BaseModel):
+    """
+    Облегченные данные текущего пользователя для проверки доступа.
+    Не привязаны к сессии БД, поэтому их можно кешировать между запросами.
+    """
+    id: int
+    phone: str
+    first_name: Optional[str] = None
+    role: UserRole
+    is_active: bool
+    is_superuser: bool
+    restaurant_id: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
 class AddressBase(BaseModel):
     city: str = Field(default="Zhanaozen")
     street: str
@@ -87,6 +112,14 @@ class AddressPublic(AddressBase):
     id: int
     class Config:
         from_attributes = True
+
+class AddressDeliveryCheck(BaseModel):
+    address_id: int
+    in_delivery_zone: bool
+    zone_id: Optional[int] = None
+    distance_to_center_km: Optional[float] = None
+    distance_km: Optional[float] = Field(None, description="До ресторана, если передан restaurant_id")
+    delivery_fee: Optional[Decimal] = Field(None, description="Оценка стоимости доставки из ресторана")
         
 # ==================================
 #         Ресторан
@@ -125,6 +158,7 @@ class RestaurantForList(BaseModel):
     name: str
     logo: Optional[str] = None
     average_rating: Decimal
+    distance_km: Optional[float] = None  # только при поиске по координатам
     class Config:
         from_attributes = True
 class RestaurantProfileUpdate(BaseModel):
@@ -165,6 +199,7 @@ class RestaurantPublicDetail(RestaurantForList):
     description: Optional[str] = None
     address: Optional[str] = None
     review_count: int
+    rating_histogram: Dict[int, int] = Field(..., description="Число отзывов по оценкам 1-5")
     banner: Optional[str] = None
     menu_categories: List[MenuCategoryWithDishes]
     class Config:
@@ -224,6 +259,17 @@ class OrderCreate(BaseModel):
     items: List[OrderItemCreate]
     promo_code: Optional[str] = None
 
+class PricedCartLine(BaseModel):
+    dish_id: int
+    quantity: int
+    unit_price: Decimal
+
+class PricedCart(BaseModel):
+    """Корзина с ценами из БД (services.price_cart): используется и для расчета, и для создания позиций заказа."""
+    restaurant_id: int
+    lines: List[PricedCartLine]
+    items_total_price: Decimal
+
 class OrderItemPublic(BaseModel):
     quantity: int
     price_at_time_of_order: Decimal
@@ -255,6 +301,7 @@ class OrderExtendedPublic(BaseModel):
     created_at: datetime
     items: List[OrderItemPublic]
     user: UserInOrder
+    distance_km: Optional[float] = None  # до ресторана, только при поиске по координатам
     class Config:
         from_attributes = True
 
@@ -263,7 +310,8 @@ class OrderExtendedPublic(BaseModel):
 # ==================================
 class CreateOrderResponse(BaseModel):
     order_id: int
-    payment_url: str
+    payment_status: PaymentStatus
+    payment_url: Optional[str] = None
 
 # ==================================
 #         Админ и Статусы
@@ -295,6 +343,51 @@ class SystemSettingsPublic(SystemSettingsBase):
 class SystemSettingsUpdate(SystemSettingsBase):
     pass
 
+class SystemSettingsSnapshot(SystemSettingsPublic):
+    """Неизменяемая копия настроек для кеша в памяти (settings_cache)."""
+    version: int
+    class Config:
+        from_attributes = True
+        frozen = True
+
+class DeliveryZoneBase(BaseModel):
+    name: str
+    restaurant_id: Optional[int] = None
+    polygon: List[Tuple[float, float]] = Field(..., min_length=3, description="Вершины [широта, долгота]")
+    is_active: bool = True
+    # Переопределения тарифов; пустые берутся из общих настроек
+    day_base_rate: Optional[Decimal] = None
+    day_rate_per_km: Optional[Decimal] = None
+    night_base_rate: Optional[Decimal] = None
+    night_rate_per_km: Optional[Decimal] = None
+
+    @validator("polygon")
+    def check_coordinates(cls, polygon):
+        for lat, lon in polygon:
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError("Координаты вершин вне допустимого диапазона.")
+        return polygon
+
+class DeliveryZoneCreate(DeliveryZoneBase):
+    pass
+
+class DeliveryZonePublic(DeliveryZoneBase):
+    id: int
+    class Config:
+        from_attributes = True
+
+class GeoPoint(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+
+class DeliveryZoneCheckRequest(BaseModel):
+    restaurant_id: Optional[int] = None
+    points: List[GeoPoint] = Field(..., max_length=10000)
+
+class DeliveryZoneCheckResult(BaseModel):
+    in_delivery_zone: bool
+    zone_id: Optional[int] = None
+
 # ==================================
 #         Схемы для Категорий и Блюд
 # ==================================
@@ -468,4 +561,78 @@ class DashboardData(BaseModel):
 class Token(BaseModel):
     access_token: str
     refresh_token: str # <-- ДОБАВЛЕНО
-    token_type: str = "bearer"
\ No newline at end of file
+    token_type: str = "bearer"
+# ==================================
+#         Схемы для мониторинга БД
+# ==================================
+class LatencyStatsPublic(BaseModel):
+    count: int
+    avg_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+class DatabasePoolStats(BaseModel):
+    engine: str
+    pool_class: str
+    pool_size: Optional[int] = None
+    checked_out: Optional[int] = Field(None, description="Соединений выдано (в работе)")
+    idle: Optional[int] = Field(None, description="Свободных соединений в пуле")
+    overflow: Optional[int] = None
+    waiting: Optional[int] = Field(None, description="Запросов, ждущих освобождения соединения (пул и overflow заняты)")
+    timeouts: Optional[int] = None
+    checkout_latency: Optional[LatencyStatsPublic] = None
+
+class DatabasePoolReport(BaseModel):
+    worker_pid: int
+    pools: List[DatabasePoolStats]
+
+class ExternalServiceStats(BaseModel):
+    circuit_state: str = Field(..., description="closed / open / half_open")
+    failures: int
+    rejected_by_breaker: int
+    latency: LatencyStatsPublic
+
+class PaymentOutboxPublic(BaseModel):
+    id: int
+    order_id: int
+    status: JobStatus
+    attempts: int
+    last_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    processed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class PaymentOutboxResolve(BaseModel):
+    """Решение по платежу с неизвестным результатом после сверки с кабинетом PayLink."""
+    status: JobStatus = Field(..., description="pending - отправить заново, done - платеж найден, failed - отменить заказ")
+    payment_url: Optional[str] = Field(None, description="Ссылка на найденный платеж (для done)")
+
+    @validator('status')
+    def status_must_be_valid(cls, v):
+        allowed_statuses = [JobStatus.PENDING, JobStatus.DONE, JobStatus.FAILED]
+        if v not in allowed_statuses:
+            raise ValueError(f'Статус должен быть одним из: {", ".join(s.value for s in allowed_statuses)}')
+        return v
+
+class WebhookQueueStats(BaseModel):
+    pending: Optional[int] = Field(None, description="Событий в очереди (по всем воркерам)")
+    received: int
+    duplicates: int
+    processed: int
+    orders_paid: int
+    batches: int
+    events_per_second: float
+    batch_latency: LatencyStatsPublic
+
+class CourierFeedStats(BaseModel):
+    subscribers: int = Field(..., description="Курьеров, подключенных к ленте в этом воркере")
+    published: int
+    delivered: int
+    dropped_subscribers: int
+
+class RatingRebuildResult(BaseModel):
+    restaurants_updated: int
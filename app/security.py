@@ -1,12 +1,19 @@
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+from .cache import TTLCache
 from .config import settings # <--- ИЗМЕНЕНИЕ: импортируем из config.py
 
 # Удаляем старый класс AuthSettings отсюда
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Хеши с другим числом раундов считаются устаревшими и перехешируются при входе
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -14,6 +21,62 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+class PasswordServiceBusy(Exception):
+    """Очередь на хеширование паролей заполнена; клиенту отвечаем 503."""
+    pass
+
+class PasswordService:
+    """
+    Асинхронная обертка над bcrypt.
+
+    Хеширование занимает сотни миллисекунд CPU, поэтому выполняется в отдельном
+    ограниченном пуле потоков (bcrypt отпускает GIL), а не в event loop или общем
+    пуле Starlette. Если задач в работе и в очереди больше max_pending,
+    новые запросы сразу получают PasswordServiceBusy.
+    """
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    async def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise PasswordServiceBusy()
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._job_done(None)
+            raise
+        # Счетчик уменьшается, когда bcrypt действительно закончил: отмена ожидающего
+        # запроса (клиент отключился) не останавливает уже запущенное хеширование
+        future.add_done_callback(self._job_done)
+        return await asyncio.wrap_future(future)
+
+    def _job_done(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """
+        Проверяет пароль. Вторым элементом возвращает новый хеш,
+        если сохраненный создан с устаревшими параметрами (например, другим BCRYPT_ROUNDS).
+        """
+        return await self._run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+password_service = PasswordService(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -32,3 +95,31 @@ def create_refresh_token(data: dict) -> str:
     # Используем другой секретный ключ для большей безопасности
     encoded_jwt = jwt.encode(to_encode, settings.REFRESH_SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
+
+# Кеш проверенных токенов: sha256(токен) -> claims.
+# Мобильные клиенты (особенно курьеры) опрашивают API с одним и тем же токеном,
+# поэтому проверку подписи достаточно сделать один раз. Запись живет до `exp` токена.
+verified_token_cache = TTLCache(
+    maxsize=settings.JWT_CACHE_MAX_SIZE,
+    ttl_seconds=timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS).total_seconds()
+)
+
+def _decode_token_cached(token: str, secret_key: str, kind: str) -> dict:
+    key = (kind, hashlib.sha256(token.encode()).digest())
+    claims = verified_token_cache.get(key)
+    if claims is not None:
+        return claims
+    # jwt.decode проверяет подпись и срок действия; при ошибке бросает JWTError
+    claims = jwt.decode(token, secret_key, algorithms=[settings.ALGORITHM])
+    exp = claims.get("exp")
+    if exp is not None:
+        verified_token_cache.set(key, claims, ttl_seconds=exp - time.time())
+    return claims
+
+def decode_access_token(token: str) -> dict:
+    """Проверяет access-токен и возвращает его claims (не изменяйте возвращаемый словарь)."""
+    return _decode_token_cached(token, settings.SECRET_KEY, "access")
+
+def decode_refresh_token(token: str) -> dict:
+    """Проверяет refresh-токен и возвращает его claims (не изменяйте возвращаемый словарь)."""
+    return _decode_token_cached(token, settings.REFRESH_SECRET_KEY, "refresh")
@@ -1,13 +1,194 @@
+import asyncio
+import random
+import time
 import httpx
 from decimal import Decimal
-from datetime import datetime, time, timedelta, timezone
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
-from geopy.distance import geodesic
 
-from .database import SessionLocal
-from . import models, schemas, crud, database
+from . import models, schemas, crud, database, scheduler, geo
 from .config import settings
+from .metrics import LatencyStats
+from .delivery_zones import PreparedZone
 
+try:
+    import h2  # noqa: F401  (HTTP/2 для httpx: pip install httpx[http2])
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class CircuitBreakerOpen(Exception):
+    """PayLink недавно отвечал ошибками; запрос не отправляется."""
+    pass
+
+class CircuitBreaker:
+    """
+    Простой предохранитель: после failure_threshold ошибок подряд размыкается
+    на reset_seconds, затем пропускает один пробный запрос.
+    Работает в event loop воркера, поэтому блокировки не нужны.
+    """
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            raise CircuitBreakerOpen()
+        if state == "half_open":
+            self._trial_in_flight = True
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Снимает отметку пробного запроса, если он завершился без результата (отмена, ошибка вне HTTP)."""
+        self._trial_in_flight = False
+
+
+# Ошибки, при которых запрос гарантированно не дошел до PayLink:
+# их можно повторять даже для неидемпотентного создания платежа.
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+RETRYABLE_STATUSES = {502, 503, 504}
+
+class PayLinkClient:
+    """
+    Общий на воркер HTTP-клиент PayLink: пул keep-alive соединений, таймауты,
+    повторы с джиттером и предохранитель. Открывается и закрывается в lifespan приложения.
+    """
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.PAYLINK_BREAKER_FAILURES,
+            reset_seconds=settings.PAYLINK_BREAKER_RESET_SECONDS
+        )
+        self.latency = LatencyStats()
+        self.failures = 0
+        self.rejected = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Ленивое создание - на случай использования вне приложения (скрипты)
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.PAYLINK_TIMEOUT_SECONDS, connect=settings.PAYLINK_CONNECT_TIMEOUT_SECONDS),
+                limits=httpx.Limits(
+                    max_connections=settings.PAYLINK_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.PAYLINK_MAX_KEEPALIVE_CONNECTIONS
+                ),
+                http2=settings.PAYLINK_HTTP2 and HTTP2_AVAILABLE,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, method: str, url: str, idempotent: bool = False, **kwargs) -> httpx.Response:
+        """
+        Выполняет запрос с повторами. Неидемпотентные запросы повторяются только
+        если соединение не было установлено; идемпотентные - также при таймаутах и 502/503/504.
+        При разомкнутом предохранителе сразу бросает CircuitBreakerOpen.
+        """
+        for attempt in range(settings.PAYLINK_RETRIES + 1):
+            try:
+                self.breaker.before_call()
+            except CircuitBreakerOpen:
+                self.rejected += 1
+                raise
+            start = time.perf_counter()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                self.latency.observe(time.perf_counter() - start)
+                self.failures += 1
+                self.breaker.record_failure()
+                retryable = isinstance(e, NOT_SENT_ERRORS) or (idempotent and isinstance(e, httpx.TimeoutException))
+                if not retryable or attempt == settings.PAYLINK_RETRIES:
+                    raise
+            else:
+                self.latency.observe(time.perf_counter() - start)
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                self.failures += 1
+                self.breaker.record_failure()
+                if not idempotent or response.status_code not in RETRYABLE_STATUSES or attempt == settings.PAYLINK_RETRIES:
+                    return response
+            finally:
+                # Иначе после CancelledError в полуоткрытом состоянии предохранитель не пропустил бы больше ни одного запроса
+                self.breaker.release_trial()
+            # Экспоненциальная задержка с джиттером, чтобы воркеры не повторяли запросы синхронно
+            await asyncio.sleep(settings.PAYLINK_RETRY_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def stats(self) -> dict:
+        return {
+            "circuit_state": self.breaker.state,
+            "failures": self.failures,
+            "rejected_by_breaker": self.rejected,
+            "latency": self.latency.snapshot(),
+        }
+
+paylink_client = PayLinkClient()
+
+
+def calculate_split_shares(order) -> tuple[Decimal, Decimal]:
+    """
+    Доли ресторана и платформы в сплит-платеже, округленные до копеек.
+    Принимает заказ или строку запроса с теми же полями (используется и в выгрузках).
+    """
+    items_total_price = order.items_total_price or Decimal(0)
+    commission_percent = Decimal(settings.RESTAURANT_COMMISSION_PERCENT)
+    platform_commission = items_total_price * (commission_percent / 100)
+
+    restaurant_share = items_total_price - platform_commission
+
+    # Доход платформы = сервисный сбор + комиссия ресторана - скидка по промокоду
+    platform_share = ((order.service_fee or 0) + platform_commission) - (order.discount or 0)
+
+    # Если доставка через приложение, доля курьера тоже идет на счет платформы
+    delivery_fee = order.delivery_fee or Decimal(0)
+    if order.delivery_type == models.DeliveryType.APP_COURIER and delivery_fee > 0:
+        platform_share += delivery_fee
+
+    return restaurant_share.quantize(Decimal("0.01")), platform_share.quantize(Decimal("0.01"))
+
+
+class PaymentRejected(Exception):
+    """PayLink не создаст этот платеж: повтор того же запроса даст тот же результат."""
+    pass
+
+class PaymentNotSent(Exception):
+    """Запрос гарантированно не дошел до PayLink; его можно повторить."""
+    pass
+
+class PaymentOutcomeUnknown(Exception):
+    """Запрос мог дойти до PayLink (таймаут, 5xx): повтор может создать второй платеж."""
+    pass
+
+# 4xx, которые означают "не обработан, повторите позже", а не отказ по существу
+NOT_PROCESSED_STATUSES = {408, 429}
 
 class PayLinkService:
     """
@@ -23,42 +204,34 @@ class PayLinkService:
         order: models.Order, 
         restaurant_account_id: str,
         platform_account_id: str # ID основного аккаунта платформы из .env
-    ) -> str | None:
+    ) -> str:
         """
-        Создает платеж с разделением (сплитованием) средств.
+        Создает платеж с разделением (сплитованием) средств и возвращает ссылку на оплату.
+
+        Raises:
+            PaymentRejected: платеж некорректен или отклонен PayLink, повторять бессмысленно.
+            PaymentNotSent: PayLink недоступен, запрос не был отправлен.
+            PaymentOutcomeUnknown: запрос мог быть принят, результат неизвестен.
         """
         # 1. Рассчитываем доли
-        commission_percent = Decimal(config.settings.RESTAURANT_COMMISSION_PERCENT)
-        platform_commission = order.items_total_price * (commission_percent / 100)
-        
-        restaurant_share = order.items_total_price - platform_commission
-        
-        # Доход платформы = сервисный сбор + комиссия ресторана - скидка по промокоду
-        platform_share = (order.service_fee + platform_commission) - order.discount
+        restaurant_share, platform_share = calculate_split_shares(order)
 
-        # 2. Формируем объект split
+        # 2. Формируем объект split (доля курьера уже входит в долю платформы)
         split_rules = [
             {
                 "accountId": restaurant_account_id,
-                "amount": float(restaurant_share.quantize(Decimal('0.01')))
+                "amount": float(restaurant_share)
             },
             {
                 "accountId": platform_account_id,
-                "amount": float(platform_share.quantize(Decimal('0.01')))
+                "amount": float(platform_share)
             }
         ]
         
-        # 3. Если доставка через приложение, добавляем долю курьера (которая идет на счет платформы)
-        if order.delivery_type == models.DeliveryType.APP_COURIER and order.delivery_fee > 0:
-            # Деньги за доставку также идут на основной счет платформы
-            split_rules[1]["amount"] += float(order.delivery_fee.quantize(Decimal('0.01')))
-        
         # Проверка, что сумма всех долей равна итоговой сумме заказа
         total_split_amount = sum(rule['amount'] for rule in split_rules)
         if abs(total_split_amount - float(order.total_price)) > 0.01:
-            print("!!! ОШИБКА: Сумма долей не сходится с итоговой суммой заказа!")
-            # В реальном приложении здесь нужна более серьезная обработка ошибки
-            return None
+            raise PaymentRejected("Сумма долей не сходится с итоговой суммой заказа.")
 
         payload = {
             "amount": float(order.total_price),
@@ -67,34 +240,111 @@ class PayLinkService:
             "split": split_rules
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(self.api_url, json=payload, headers=self.headers)
-                response.raise_for_status()
-                data = response.json()
-                return data.get("data", {}).get("paymentUrl")
-            except httpx.HTTPStatusError as e:
-                print(f"Ошибка при создании сплит-платежа: {e.response.text}")
-                return None
+        try:
+            response = await paylink_client.request("POST", self.api_url, json=payload, headers=self.headers)
+        except CircuitBreakerOpen:
+            raise PaymentNotSent("PayLink временно недоступен (предохранитель разомкнут).")
+        except NOT_SENT_ERRORS as e:
+            raise PaymentNotSent(f"Нет соединения с PayLink: {e!r}")
+        except httpx.HTTPError as e:
+            raise PaymentOutcomeUnknown(f"Ответ PayLink не получен: {e!r}")
+
+        if response.status_code >= 500 or response.status_code == 409:
+            raise PaymentOutcomeUnknown(f"PayLink ответил {response.status_code}: {response.text}")
+        if response.status_code in NOT_PROCESSED_STATUSES:
+            raise PaymentNotSent(f"PayLink не принял запрос ({response.status_code}).")
+        if response.status_code >= 400:
+            raise PaymentRejected(f"PayLink отклонил платеж ({response.status_code}): {response.text}")
+        try:
+            payment_url = response.json().get("data", {}).get("paymentUrl")
+        except (ValueError, AttributeError):
+            payment_url = None
+        if not payment_url:
+            raise PaymentOutcomeUnknown("PayLink не вернул ссылку на оплату.")
+        return payment_url
 
-def calculate_order_costs(db: Session, order_in: schemas.OrderCreate) -> dict:
+def price_cart(db: Session, order_in: schemas.OrderCreate) -> schemas.PricedCart:
+    """
+    Оценивает корзину одним запросом к БД, независимо от числа позиций.
+
+    Повторяющиеся позиции одного блюда объединяются. Все блюда должны быть
+    доступны и принадлежать ресторану из заказа, иначе ValueError.
+    """
+    quantities: dict[int, int] = {}
+    for item_data in order_in.items:
+        quantities[item_data.dish_id] = quantities.get(item_data.dish_id, 0) + item_data.quantity
+    if not quantities:
+        raise ValueError("Корзина пуста.")
+
+    dishes = {
+        dish.id: dish
+        for dish in db.query(models.Dish).filter(models.Dish.id.in_(list(quantities)))
+    }
+
+    lines = []
+    items_total_price = Decimal(0)
+    for dish_id, quantity in quantities.items():
+        dish = dishes.get(dish_id)
+        if not dish or not dish.is_available:
+            raise ValueError(f"Блюдо с ID {dish_id} недоступно.")
+        if dish.restaurant_id != order_in.restaurant_id:
+            raise ValueError(f"Блюдо с ID {dish_id} не относится к выбранному ресторану.")
+        lines.append(schemas.PricedCartLine(dish_id=dish_id, quantity=quantity, unit_price=dish.price))
+        items_total_price += dish.price * quantity
+
+    return schemas.PricedCart(
+        restaurant_id=order_in.restaurant_id,
+        lines=lines,
+        items_total_price=items_total_price
+    )
+
+def get_delivery_distance_km(restaurant: models.Restaurant, address: models.Address) -> float | None:
+    """Расстояние от ресторана до адреса доставки по прямой (None, если нет координат)."""
+    if None in (restaurant.latitude, restaurant.longitude, address.latitude, address.longitude):
+        return None
+    return geo.haversine_km(restaurant.latitude, restaurant.longitude, address.latitude, address.longitude)
+
+def is_night_tariff(tariffs: schemas.SystemSettingsSnapshot, current_hour: int) -> bool:
+    # Проверяем, переходит ли ночной тариф через полночь (например, с 22:00 до 06:00)
+    if tariffs.night_tariff_start_hour > tariffs.night_tariff_end_hour:
+        return current_hour >= tariffs.night_tariff_start_hour or current_hour < tariffs.night_tariff_end_hour
+    # Если ночь в пределах одного дня (например, с 00:00 до 06:00)
+    return tariffs.night_tariff_start_hour <= current_hour < tariffs.night_tariff_end_hour
+
+def calculate_delivery_fee(tariffs: schemas.SystemSettingsSnapshot, distance_km: float | None, current_hour: int) -> Decimal:
+    """Базовая ставка плюс ставка за километр по дневному или ночному тарифу."""
+    if is_night_tariff(tariffs, current_hour):
+        base_rate, rate_per_km = tariffs.night_base_rate, tariffs.night_rate_per_km
+    else:
+        base_rate, rate_per_km = tariffs.day_base_rate, tariffs.day_rate_per_km
+    delivery_fee = Decimal(base_rate)
+    if distance_km is not None:
+        delivery_fee += Decimal(str(round(distance_km, 2))) * Decimal(rate_per_km)
+    return delivery_fee
+
+def calculate_order_costs(
+    db: Session,
+    order_in: schemas.OrderCreate,
+    cart: schemas.PricedCart | None = None,
+    address: models.Address | None = None,
+    restaurant: models.Restaurant | None = None
+) -> dict:
     """
     Рассчитывает полную стоимость заказа, включая все сборы, скидки и доставку.
 
     Args:
         db: Сессия базы данных.
         order_in: Схема с данными для создания заказа.
+        cart: Уже оцененная корзина (services.price_cart); если не передана, оценивается здесь.
+        address, restaurant: Уже загруженные адрес и ресторан; если не переданы, загружаются здесь.
 
     Returns:
         Словарь с детализацией всех стоимостей.
     """
-    # 1. Рассчитываем базовую стоимость товаров
-    items_total_price = Decimal(0)
-    for item_data in order_in.items:
-        dish = db.query(models.Dish).filter(models.Dish.id == item_data.dish_id).first()
-        if not dish or not dish.is_available:
-            raise ValueError(f"Блюдо с ID {item_data.dish_id} недоступно.")
-        items_total_price += dish.price * item_data.quantity
+    # 1. Базовая стоимость товаров (одним запросом по всем блюдам)
+    if cart is None:
+        cart = price_cart(db, order_in)
+    items_total_price = cart.items_total_price
 
     # 2. Рассчитываем сервисный сбор
     service_fee = items_total_price * (Decimal(settings.CLIENT_SERVICE_FEE_PERCENT) / 100)
@@ -111,26 +361,20 @@ def calculate_order_costs(db: Session, order_in: schemas.OrderCreate) -> dict:
             elif promo.promo_type == models.PromoCodeType.FIXED_AMOUNT:
                 discount = promo.value
     
-    # 4. Рассчитываем стоимость доставки на основе динамических тарифов (день/ночь)
-    tariffs = crud.get_system_settings(db)
-    current_hour = datetime.now().hour
-    
-    is_night = False
-    # Проверяем, переходит ли ночной тариф через полночь (например, с 22:00 до 06:00)
-    if tariffs.night_tariff_start_hour > tariffs.night_tariff_end_hour:
-        if current_hour >= tariffs.night_tariff_start_hour or current_hour < tariffs.night_tariff_end_hour:
-            is_night = True
-    else: # Если ночь в пределах одного дня (например, с 00:00 до 06:00)
-        if tariffs.night_tariff_start_hour <= current_hour < tariffs.night_tariff_end_hour:
-            is_night = True
-
-    if is_night:
-        delivery_fee = Decimal(tariffs.night_base_rate)
-        # Здесь можно добавить логику расчета по километрам, если нужно
-        # delivery_fee += distance_km * tariffs.night_rate_per_km
-    else:
-        delivery_fee = Decimal(tariffs.day_base_rate)
-        # delivery_fee += distance_km * tariffs.day_rate_per_km
+    # 4. Рассчитываем стоимость доставки по тарифам (день/ночь, с учетом зоны) и расстоянию
+    tariffs = crud.get_system_settings_snapshot(db)
+    if restaurant is None:
+        restaurant = crud.get_restaurant_by_id(db, restaurant_id=order_in.restaurant_id)
+    if address is None:
+        address = crud.get_address_by_id(db, address_id=order_in.address_id)
+    distance_km = None
+    if restaurant and address:
+        distance_km = get_delivery_distance_km(restaurant, address)
+        if address.latitude is not None and address.longitude is not None:
+            _, zone = resolve_delivery_zone(db, address.latitude, address.longitude, restaurant.id)
+            if zone is not None:
+                tariffs = zone.tariffs(tariffs)
+    delivery_fee = calculate_delivery_fee(tariffs, distance_km, datetime.now().hour)
 
     # 5. Считаем итоговую сумму
     # Скидка применяется только к стоимости товаров
@@ -146,55 +390,97 @@ def calculate_order_costs(db: Session, order_in: schemas.OrderCreate) -> dict:
         "total_price": total_price.quantize(Decimal('0.01')),
     }
 
-def is_address_in_delivery_zone(db: Session, address: models.Address) -> bool:
+def resolve_delivery_zone(db: Session, lat: float, lon: float, restaurant_id: int | None = None) -> tuple[bool, PreparedZone | None]:
+    """
+    Входит ли точка в зону доставки и в какую. Если зоны-многоугольники для ресторана
+    не заданы, действует круг из SystemSettings (центр города и радиус).
+    """
+    zones = crud.get_delivery_zone_index(db)
+    if zones.applies(restaurant_id):
+        zone = zones.find(lat, lon, restaurant_id)
+        return zone is not None, zone
+    tariffs = crud.get_system_settings_snapshot(db)
+    distance = geo.haversine_km(tariffs.city_center_lat, tariffs.city_center_lon, lat, lon)
+    return distance <= tariffs.delivery_radius_km, None
+
+def is_address_in_delivery_zone(db: Session, address: models.Address, restaurant_id: int | None = None) -> bool:
     """
     Проверяет, находится ли адрес доставки в разрешенной зоне.
     """
     if not address.latitude or not address.longitude:
         # Если у адреса нет координат, считаем его невалидным для проверки
         return False
-        
-    settings = crud.get_system_settings(db)
-    
-    city_center = (settings.city_center_lat, settings.city_center_lon)
-    delivery_address = (address.latitude, address.longitude)
-    
-    # Рассчитываем расстояние в километрах
-    distance = geodesic(city_center, delivery_address).kilometers
-    
-    print(f"Расстояние до адреса: {distance:.2f} км. Разрешенный радиус: {settings.delivery_radius_km} км.")
-    
-    return distance <= settings.delivery_radius_km
+    in_zone, _ = resolve_delivery_zone(db, address.latitude, address.longitude, restaurant_id)
+    return in_zone
 
-def trigger_courier_search(order_id: int):
+def check_points_delivery(db: Session, points: list[tuple[float, float]], restaurant_id: int | None = None) -> list[tuple[bool, PreparedZone | None]]:
     """
-    Эта функция выполняется в фоне.
-    Она ждет нужное время и затем меняет статус заказа на 'Готов к выдаче',
-    что делает его видимым для курьеров.
+    Пакетная проверка точек: по индексу зон или, если зоны не заданы,
+    одним векторным расчетом расстояний до центра города.
     """
-    print(f"Фоновая задача для заказа #{order_id} запущена. Ожидаем...")
-    
-    # ВАЖНО: В продакшене time.sleep() - плохая практика.
-    # Здесь должен быть вызов надежного планировщика (Celery, APScheduler).
-    # Мы используем его для простоты демонстрации.
-    
-    db = SessionLocal()
-    try:
-        order = crud.get_order_by_id(db, order_id)
-        if not order or not order.ready_by_timestamp:
-            return
-
-        # Рассчитываем, сколько секунд ждать до момента "за 5 минут до готовности"
-        search_start_time = order.ready_by_timestamp - timedelta(minutes=5)
-        now = datetime.now(timezone.utc)
-        
-        wait_seconds = (search_start_time - now).total_seconds()
-        
-        if wait_seconds > 0:
-            time.sleep(wait_seconds)
-        
-        # Время пришло. Меняем статус.
-        crud.set_order_status_to_ready(db, order_id=order_id)
+    zones = crud.get_delivery_zone_index(db)
+    if zones.applies(restaurant_id):
+        result = []
+        for lat, lon in points:
+            zone = zones.find(lat, lon, restaurant_id)
+            result.append((zone is not None, zone))
+        return result
+    tariffs = crud.get_system_settings_snapshot(db)
+    distances = geo.haversine_km_many(
+        tariffs.city_center_lat, tariffs.city_center_lon,
+        [lat for lat, _ in points], [lon for _, lon in points]
+    )
+    return [(distance <= tariffs.delivery_radius_km, None) for distance in distances]
 
-    finally:
-        db.close()
\ No newline at end of file
+def check_addresses_delivery(db: Session, addresses: list[models.Address], restaurant: models.Restaurant | None = None) -> list[dict]:
+    """
+    Проверка зоны доставки сразу для многих адресов: зона и расстояние до ресторана
+    (если он передан) считаются пакетно.
+    """
+    tariffs = crud.get_system_settings_snapshot(db)
+    located = [address for address in addresses if address.latitude is not None and address.longitude is not None]
+    lats = [address.latitude for address in located]
+    lons = [address.longitude for address in located]
+    restaurant_id = restaurant.id if restaurant is not None else None
+    zone_checks = dict(zip(
+        (address.id for address in located),
+        check_points_delivery(db, list(zip(lats, lons)), restaurant_id)
+    ))
+    to_center = dict(zip(
+        (address.id for address in located),
+        geo.haversine_km_many(tariffs.city_center_lat, tariffs.city_center_lon, lats, lons)
+    ))
+    to_restaurant = {}
+    if restaurant is not None and restaurant.latitude is not None and restaurant.longitude is not None:
+        to_restaurant = dict(zip(
+            (address.id for address in located),
+            geo.haversine_km_many(restaurant.latitude, restaurant.longitude, lats, lons)
+        ))
+
+    current_hour = datetime.now().hour
+    result = []
+    for address in addresses:
+        in_zone, zone = zone_checks.get(address.id, (False, None))
+        center_distance = to_center.get(address.id)
+        distance_km = to_restaurant.get(address.id)
+        result.append({
+            "address_id": address.id,
+            "in_delivery_zone": in_zone,
+            "zone_id": zone.id if zone is not None else None,
+            "distance_to_center_km": round(center_distance, 2) if center_distance is not None else None,
+            "distance_km": round(distance_km, 2) if distance_km is not None else None,
+            "delivery_fee": (
+                calculate_delivery_fee(zone.tariffs(tariffs) if zone else tariffs, distance_km, current_hour).quantize(Decimal('0.01'))
+                if in_zone and distance_km is not None else None
+            ),
+        })
+    return result
+
+@scheduler.job_handler(scheduler.COURIER_SEARCH_JOB)
+def run_courier_search(db: Session, payload: dict):
+    """
+    Задача планировщика (ставится в crud.accept_order): за несколько минут до готовности
+    переводит заказ в статус 'Готов к выдаче', что делает его видимым для курьеров.
+    Идемпотентна: set_order_status_to_ready меняет только заказы в AWAITING_COURIER_SEARCH.
+    """
+    crud.set_order_status_to_ready(db, order_id=payload["order_id"])
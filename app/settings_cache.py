@@ -0,0 +1,43 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+
+class SystemSettingsCache:
+    """
+    Неизменяемый снимок SystemSettings (тарифы и зона доставки) в памяти воркера.
+
+    Строка настроек меняется только через PUT /admin/settings, который увеличивает
+    SystemSettings.version. Раз в refresh_seconds воркер сверяет версию одним
+    легким запросом и перечитывает строку, только если версия изменилась.
+    Остальные запросы обходятся без обращения к БД.
+    """
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[schemas.SystemSettingsSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, load: Callable[[Session], models.SystemSettings]) -> schemas.SystemSettingsSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+                return self._snapshot
+            version = db.query(models.SystemSettings.version).order_by(models.SystemSettings.id).limit(1).scalar()
+            if self._snapshot is None or version is None or version != self._snapshot.version:
+                # `load` создает строку настроек, если ее еще нет
+                self._snapshot = schemas.SystemSettingsSnapshot.model_validate(load(db), from_attributes=True)
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        """Сбрасывает снимок в текущем воркере (остальные заметят новую версию сами)."""
+        with self._lock:
+            self._snapshot = None
@@ -1,35 +1,204 @@
-import shutil
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import NamedTuple, Optional
 from fastapi import UploadFile
 import secrets
 import os
 
+from .config import settings
+
 # Директория для хранения всех загружаемых изображений
 UPLOAD_DIR = Path("static/images")
 
-def save_upload_file(upload_file: UploadFile) -> str:
+# Размер куска, которым принятый Starlette файл копируется в UPLOAD_DIR
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Допустимые форматы изображений: сигнатура начала файла -> расширение
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+
+class UploadTooLarge(Exception):
+    """Файл больше допустимого размера (413)."""
+    pass
+
+
+class InvalidUpload(Exception):
+    """Содержимое файла не является изображением допустимого формата (415)."""
+    pass
+
+
+class SavedUpload(NamedTuple):
+    url: str
+    size: int
+    sha256: str
+
+
+def detect_image_extension(head: bytes) -> Optional[str]:
+    """Расширение по сигнатуре файла. Имени и Content-Type от клиента не доверяем."""
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+async def store_upload(upload_file: UploadFile, max_bytes: Optional[int] = None) -> SavedUpload:
+    """
+    Сохраняет изображение в UPLOAD_DIR. К этому моменту Starlette уже принял файл
+    целиком (в памяти или во временном файле), здесь он копируется кусками
+    во временный файл в UPLOAD_DIR: запись на диск идет в пуле потоков, по ходу
+    проверяются сигнатура и размер и считается SHA-256. Готовый файл атомарно
+    переименовывается в итоговое имя, поэтому недописанный файл не виден по URL.
+    """
+    max_bytes = settings.UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    # Размер уже известен после разбора multipart: не читаем заведомо слишком большой файл
+    if upload_file.size is not None and upload_file.size > max_bytes:
+        raise UploadTooLarge(f"Файл больше допустимого размера ({max_bytes} байт).")
+
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    temp_path = UPLOAD_DIR / f".{secrets.token_hex(8)}.part"
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+    try:
+        with temp_path.open("wb") as buffer:
+            while True:
+                chunk = await upload_file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if extension is None:
+                    extension = detect_image_extension(chunk)
+                    if extension is None:
+                        raise InvalidUpload("Допустимы только изображения JPEG, PNG, GIF или WebP.")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Файл больше допустимого размера ({max_bytes} байт).")
+                digest.update(chunk)
+                await asyncio.to_thread(buffer.write, chunk)
+        if extension is None:
+            raise InvalidUpload("Файл пустой.")
+
+        sha256 = digest.hexdigest()
+        filename = f"{sha256[:16]}{secrets.token_hex(4)}{extension}"
+        await asyncio.to_thread(os.replace, temp_path, UPLOAD_DIR / filename)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return SavedUpload(url=f"/static/images/{filename}", size=size, sha256=sha256)
+
+
+async def save_upload_file(upload_file: UploadFile, max_bytes: Optional[int] = None) -> str:
     """
-    Сохраняет загруженный файл в директорию UPLOAD_DIR с уникальным именем
+    Сохраняет загруженное изображение в директорию UPLOAD_DIR с уникальным именем
     и возвращает относительный URL для доступа к нему.
 
     Args:
         upload_file: Файл, полученный от FastAPI.
+        max_bytes: Максимальный размер файла, по умолчанию UPLOAD_MAX_BYTES.
 
     Returns:
         Относительный URL сохраненного файла (например, /static/images/your_file.png).
+
+    Raises:
+        UploadTooLarge: файл больше max_bytes.
+        InvalidUpload: файл не является изображением допустимого формата.
     """
-    # Создаем директорию, если ее не существует
-    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-    
-    token_hex = secrets.token_hex(8)
-    file_extension = Path(upload_file.filename).suffix
-    filename = f"{token_hex}{file_extension}"
-    file_path = UPLOAD_DIR / filename
-    
-    with file_path.open("wb") as buffer:
-        shutil.copyfileobj(upload_file.file, buffer)
-        
-    return f"/static/images/{filename}"
+    return (await store_upload(upload_file, max_bytes=max_bytes)).url
+
+
+@asynccontextmanager
+async def delete_uploads_on_error():
+    """
+    Отдает функцию сохранения файлов (как save_upload_file). Если блок завершился
+    ошибкой (не прошла следующая загрузка или запись в БД), уже сохраненные
+    в нем файлы удаляются, чтобы на диске не оставалось файлов без ссылок.
+
+        async with utils.delete_uploads_on_error() as save:
+            logo_url = await save(logo)
+            banner_url = await save(banner)
+            return await db.run_sync(crud.update_restaurant_images, ...)
+    """
+    saved: list[str] = []
+
+    async def save(upload_file: UploadFile, max_bytes: Optional[int] = None) -> str:
+        url = await save_upload_file(upload_file, max_bytes=max_bytes)
+        saved.append(url)
+        return url
+
+    try:
+        yield save
+    except BaseException:
+        for url in saved:
+            delete_file(url)
+        raise
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI-middleware: отклоняет multipart-запросы больше max_body_bytes до чтения тела.
+    Запрос с Content-Length сверх лимита сразу получает 413; тело без Content-Length
+    (chunked) считается по мере чтения и обрывается, как только превысит лимит.
+    """
+    def __init__(self, app, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or ())
+        if not headers.get(b"content-type", b"").startswith(b"multipart/"):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # Отвечаем 413 сами, а приложению сообщаем об обрыве соединения
+                    rejected = True
+                    await self._reject(send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            # После нашего 413 ответ приложения (ошибка разбора тела) уже не нужен
+            if not rejected:
+                await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    @staticmethod
+    async def _reject(send):
+        body = '{"detail":"Тело запроса слишком большое."}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
 
 def delete_file(file_path: str | None):
     """
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .database import SessionLocal
+from .metrics import LatencyStats
+
+PAYMENT_SUCCESS_EVENT = "payment.success"
+
+
+def enqueue_event(db: Session, payload: dict) -> bool:
+    """
+    Сохраняет событие PayLink в очередь. Возвращает False, если событие
+    с этим ID уже было принято (повторная доставка).
+    Бросает ValueError, если тело - не объект события (ответ 400).
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Тело веб-хука должно быть JSON-объектом.")
+    data = payload.get("data") or {}
+    if not isinstance(data, dict):
+        raise ValueError("Поле data веб-хука должно быть JSON-объектом.")
+    order_id_str = str(data.get("orderId") or "")
+    event_id = payload.get("id")
+    db.add(models.PaymentEvent(
+        event_id=str(event_id) if event_id else None,
+        event_type=str(payload.get("type") or ""),
+        order_id=int(order_id_str) if order_id_str.isdigit() else None,
+        payload=json.dumps(payload)
+    ))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+class PaymentEventConsumer:
+    """
+    Применяет события PayLink из таблицы payment_events пачками.
+
+    Пачка захватывается и применяется в одной транзакции: UPDATE событий ... RETURNING,
+    затем один UPDATE orders ... WHERE id IN (...) на всю пачку. Если воркер упадет
+    посередине, транзакция откатится и события останутся в очереди. Переходы статусов
+    условные (только из PENDING), поэтому повторное применение безопасно.
+    """
+    def __init__(self, poll_seconds: float, batch_size: int):
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+
+        self.received = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.orders_paid = 0
+        self.batches = 0
+        self.batch_latency = LatencyStats()
+        self._busy_seconds = 0.0
+
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    # --- Публичный интерфейс ---
+
+    def notify(self, accepted: bool):
+        """Учитывает принятое веб-хуком событие и будит обработчик."""
+        if accepted:
+            self.received += 1
+        else:
+            self.duplicates += 1
+        if accepted and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self, pending: Optional[int] = None) -> dict:
+        return {
+            "pending": pending,
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "processed": self.processed,
+            "orders_paid": self.orders_paid,
+            "batches": self.batches,
+            # Пропускная способность во время обработки (без учета простоя)
+            "events_per_second": round(self.processed / self._busy_seconds, 1) if self._busy_seconds else 0.0,
+            "batch_latency": self.batch_latency.snapshot(),
+        }
+
+    # --- Основной цикл ---
+
+    async def _run(self):
+        while True:
+            try:
+                self._wakeup.clear()
+                applied = await asyncio.to_thread(self._apply_batch)
+                # Полная пачка - в очереди, скорее всего, есть еще
+                if applied == self.batch_size:
+                    continue
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ошибка обработчика веб-хуков PayLink: {e}")
+                await asyncio.sleep(self.poll_seconds)
+
+    def _apply_batch(self) -> int:
+        start = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        with SessionLocal() as db:
+            pending_ids = select(models.PaymentEvent.id).where(
+                models.PaymentEvent.status == models.JobStatus.PENDING
+            ).order_by(models.PaymentEvent.id).limit(self.batch_size)
+            events = db.execute(
+                update(models.PaymentEvent)
+                .where(
+                    models.PaymentEvent.id.in_(pending_ids),
+                    models.PaymentEvent.status == models.JobStatus.PENDING
+                )
+                .values(status=models.JobStatus.DONE, processed_at=now)
+                .returning(models.PaymentEvent.event_type, models.PaymentEvent.order_id)
+            ).all()
+            if not events:
+                db.rollback()
+                return 0
+
+            paid_order_ids = {
+                order_id for event_type, order_id in events
+                if event_type == PAYMENT_SUCCESS_EVENT and order_id is not None
+            }
+            orders_paid = 0
+            if paid_order_ids:
+                orders_paid = db.execute(
+                    update(models.Order)
+                    .where(
+                        models.Order.id.in_(paid_order_ids),
+                        models.Order.status == models.OrderStatus.PENDING
+                    )
+                    .values(status=models.OrderStatus.PAID)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                # Оплата подтверждает, что платеж создан: закрываем записи outbox с неизвестным результатом
+                db.execute(
+                    update(models.PaymentOutbox)
+                    .where(
+                        models.PaymentOutbox.order_id.in_(paid_order_ids),
+                        models.PaymentOutbox.status == models.JobStatus.UNKNOWN
+                    )
+                    .values(status=models.JobStatus.DONE, processed_at=now, last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+
+        elapsed = time.perf_counter() - start
+        self.batch_latency.observe(elapsed)
+        self._busy_seconds += elapsed
+        self.batches += 1
+        self.processed += len(events)
+        self.orders_paid += orders_paid
+        return len(events)
+
+
+def count_pending(db: Session) -> int:
+    return db.query(models.PaymentEvent).filter(models.PaymentEvent.status == models.JobStatus.PENDING).count()
+
+
+payment_event_consumer = PaymentEventConsumer(
+    poll_seconds=settings.WEBHOOK_QUEUE_POLL_SECONDS,
+    batch_size=settings.WEBHOOK_QUEUE_BATCH_SIZE,
+)
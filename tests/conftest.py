@@ -0,0 +1,66 @@
+"""
+Общие фикстуры тестов. Приложение работает с файловой SQLite во временной
+директории: ее видят и синхронный, и асинхронный (aiosqlite) движки, и потоки.
+"""
+import os
+import tempfile
+
+_TEST_DIR = tempfile.mkdtemp(prefix="jetfood-tests-")
+
+# Настройки должны быть заданы до первого импорта app.config
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_TEST_DIR}/test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("REFRESH_SECRET_KEY", "test-refresh-secret")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_DAYS", "7")
+os.environ.setdefault("PAYLINK_API_KEY", "test-key")
+os.environ.setdefault("PAYLINK_API_URL", "http://paylink.test/api/payments")
+os.environ.setdefault("PLATFORM_PAYLINK_ACCOUNT_ID", "platform-account")
+os.environ.setdefault("RESTAURANT_COMMISSION_PERCENT", "10")
+os.environ.setdefault("CLIENT_SERVICE_FEE_PERCENT", "5")
+os.environ.setdefault("MIN_CLIENT_SERVICE_FEE", "100")
+os.environ.setdefault("MAX_CLIENT_SERVICE_FEE", "500")
+os.environ.setdefault("DELIVERY_BASE_RATE", "500")
+os.environ.setdefault("DELIVERY_RATE_PER_KM", "100")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import crud, database, deps, idempotency, menu_cache, rollups, security
+from app.database import Base, SessionLocal
+from app.main import app
+
+
+@pytest.fixture(autouse=True)
+def _clean_state():
+    """Каждый тест начинается с пустой БД и пустых кешей воркера."""
+    yield
+    with database.engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+    deps.user_principal_cache.clear()
+    security.verified_token_cache.clear()
+    idempotency.completed_responses.clear()
+    rollups.dashboard_cache.clear()
+    database.replica_router._last_writes.clear()
+    menu_cache.clear()
+    crud.system_settings_cache.invalidate()
+    crud.delivery_zone_cache.invalidate()
+    crud.restaurant_locations.invalidate()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client():
+    """HTTP-клиент без lifespan: фоновые сервисы в тестах запускаются явно."""
+    return TestClient(app)
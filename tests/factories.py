@@ -0,0 +1,106 @@
+"""Создание тестовых данных напрямую через сессию."""
+import itertools
+from decimal import Decimal
+
+from app import models, security
+
+_counter = itertools.count(1)
+
+
+def make_user(db, role=models.UserRole.CLIENT, password="secret", **fields):
+    n = next(_counter)
+    user = models.User(
+        phone=fields.pop("phone", f"+7700{n:07d}"),
+        hashed_password=security.get_password_hash(password),
+        first_name=fields.pop("first_name", f"User {n}"),
+        role=role,
+        **fields,
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def make_restaurant(db, owner=None, **fields):
+    owner = owner or make_user(db, role=models.UserRole.RESTAURANT)
+    n = next(_counter)
+    restaurant = models.Restaurant(
+        owner_id=owner.id,
+        name=fields.pop("name", f"Restaurant {n}"),
+        latitude=fields.pop("latitude", 43.34),
+        longitude=fields.pop("longitude", 52.86),
+        is_approved=fields.pop("is_approved", True),
+        is_active=fields.pop("is_active", True),
+        paylink_account_id=fields.pop("paylink_account_id", f"acc-{n}"),
+        **fields,
+    )
+    db.add(restaurant)
+    db.commit()
+    db.refresh(restaurant)
+    return restaurant
+
+
+def make_order(db, restaurant, user=None, **fields):
+    user = user or make_user(db)
+    n = next(_counter)
+    values = dict(
+        code=f"T{n:06d}",
+        user_id=user.id,
+        restaurant_id=restaurant.id,
+        address_text="ул. Тестовая, 1",
+        items_total_price=Decimal("1000.00"),
+        delivery_fee=Decimal("500.00"),
+        service_fee=Decimal("100.00"),
+        discount=Decimal("0.00"),
+        total_price=Decimal("1600.00"),
+        status=models.OrderStatus.PENDING,
+        delivery_type=models.DeliveryType.APP_COURIER,
+    )
+    values.update(fields)
+    order = models.Order(**values)
+    db.add(order)
+    db.commit()
+    db.refresh(order)
+    return order
+
+
+def auth_headers(user) -> dict:
+    token = security.create_access_token(data={"sub": user.phone})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def make_dish(db, restaurant, price="500.00", **fields):
+    category = db.query(models.Category).first()
+    if category is None:
+        category = models.Category(name="Тестовая категория")
+        db.add(category)
+        db.commit()
+    n = next(_counter)
+    dish = models.Dish(
+        restaurant_id=restaurant.id,
+        category_id=category.id,
+        name=fields.pop("name", f"Dish {n}"),
+        price=Decimal(price),
+        is_available=fields.pop("is_available", True),
+        **fields,
+    )
+    db.add(dish)
+    db.commit()
+    db.refresh(dish)
+    return dish
+
+
+def make_address(db, user, latitude=43.335, longitude=52.865, **fields):
+    address = models.Address(
+        user_id=user.id,
+        street=fields.pop("street", "ул. Тестовая"),
+        house_number=fields.pop("house_number", "1"),
+        latitude=latitude,
+        longitude=longitude,
+        **fields,
+    )
+    db.add(address)
+    db.commit()
+    db.refresh(address)
+    return address
@@ -0,0 +1,68 @@
+"""Асинхронный слой БД (database.get_async_db) и сравнение с синхронными роутами."""
+import asyncio
+import time
+from typing import List
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy.orm import Session
+
+from app import crud, database, models, schemas
+from app.main import app
+
+REQUESTS = 400
+CONCURRENCY = 50
+
+
+def test_async_url_is_derived_from_sync_url():
+    assert database.to_async_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+    assert database.to_async_url("postgresql://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+
+
+def test_async_session_reads_committed_rows(db):
+    db.add(models.Banner(title="Весна", image_url="/static/images/spring.png", is_active=True))
+    db.commit()
+
+    async def scenario():
+        async for session in database.get_async_db():
+            return await session.run_sync(crud.get_active_banners)
+
+    assert [banner.title for banner in asyncio.run(scenario())] == ["Весна"]
+
+
+def _sync_app() -> FastAPI:
+    """Прежний вариант роута: обработчик def и сессия из get_db в пуле потоков."""
+    sync_app = FastAPI()
+
+    @sync_app.get("/api/v1/banners/", response_model=List[schemas.BannerPublic])
+    def get_active_banners(db: Session = Depends(database.get_db)):
+        return crud.get_active_banners(db)
+
+    return sync_app
+
+
+async def _requests_per_second(asgi_app) -> float:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        async def one():
+            async with semaphore:
+                response = await http.get("/api/v1/banners/")
+                assert response.status_code == 200 and len(response.json()) == 20
+
+        await one()  # прогрев пулов соединений
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(REQUESTS)))
+        return REQUESTS / (time.perf_counter() - started)
+
+
+def test_banners_benchmark_sync_vs_async(db):
+    db.add_all(models.Banner(title=f"Баннер {i}", image_url=f"/static/images/{i}.png", is_active=True) for i in range(20))
+    db.commit()
+    db.close()
+
+    sync_rps = asyncio.run(_requests_per_second(_sync_app()))
+    async_rps = asyncio.run(_requests_per_second(app))
+
+    print(f"\nGET /banners/, {REQUESTS} запросов по {CONCURRENCY} одновременно: "
+          f"sync {sync_rps:.0f} req/s, async {async_rps:.0f} req/s")
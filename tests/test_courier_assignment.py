@@ -0,0 +1,70 @@
+"""Назначение курьера (crud.assign_order_to_courier): при гонке заказ достается ровно одному."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from app import crud, models
+from app.database import SessionLocal
+from app.main import app
+
+from .factories import auth_headers, make_order, make_restaurant, make_user
+
+COURIERS = 8
+
+
+def _online_couriers(db, count):
+    couriers = []
+    for _ in range(count):
+        courier = make_user(db, role=models.UserRole.COURIER)
+        crud.get_or_create_courier_profile(db, user_id=courier.id).is_online = True
+        db.commit()
+        couriers.append(courier)
+    return couriers
+
+
+def test_concurrent_accepts_one_200_rest_409(db):
+    couriers = _online_couriers(db, COURIERS)
+    order = make_order(db, make_restaurant(db), status=models.OrderStatus.READY_FOR_PICKUP)
+    headers = [auth_headers(courier) for courier in couriers]
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post(f"/api/v1/courier/orders/{order.id}/accept", headers=h) for h in headers
+            ))
+
+    responses = asyncio.run(scenario())
+
+    codes = sorted(response.status_code for response in responses)
+    assert codes == [200] + [409] * (COURIERS - 1)
+    winner = couriers[[response.status_code for response in responses].index(200)]
+    db.refresh(order)
+    assert order.courier_id == winner.id
+    assert order.status == models.OrderStatus.ON_THE_WAY
+
+
+def test_concurrent_assign_from_threads_has_single_winner(db):
+    couriers = _online_couriers(db, COURIERS)
+    order = make_order(db, make_restaurant(db), status=models.OrderStatus.READY_FOR_PICKUP)
+    courier_ids = [courier.id for courier in couriers]
+
+    def assign(courier_id):
+        with SessionLocal() as session:
+            return crud.assign_order_to_courier(session, order.id, courier_id)
+
+    with ThreadPoolExecutor(max_workers=COURIERS) as pool:
+        results = list(pool.map(assign, courier_ids))
+
+    assert results.count(True) == 1
+    db.refresh(order)
+    assert order.courier_id == courier_ids[results.index(True)]
+
+
+def test_accept_of_taken_or_missing_order(client, db):
+    first, second = _online_couriers(db, 2)
+    order = make_order(db, make_restaurant(db), status=models.OrderStatus.READY_FOR_PICKUP)
+
+    assert client.post(f"/api/v1/courier/orders/{order.id}/accept", headers=auth_headers(first)).status_code == 200
+    assert client.post(f"/api/v1/courier/orders/{order.id}/accept", headers=auth_headers(second)).status_code == 409
+    assert client.post("/api/v1/courier/orders/999999/accept", headers=auth_headers(second)).status_code == 404
@@ -0,0 +1,113 @@
+"""Лента заказов курьеров (SSE): открытые потоки не держат соединения из пула."""
+import asyncio
+import time
+
+from starlette.requests import Request
+
+from app import courier_feed, crud, database, models
+from app.api.v1.endpoints import couriers
+
+from .factories import auth_headers, make_order, make_restaurant, make_user
+
+STREAMS = 20
+
+
+def _request():
+    async def receive():
+        await asyncio.sleep(3600)
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": []}, receive)
+
+
+def _online_courier(db):
+    courier = make_user(db, role=models.UserRole.COURIER)
+    profile = crud.get_or_create_courier_profile(db, user_id=courier.id)
+    profile.is_online = True
+    db.commit()
+    return crud.get_user_principal(db, phone=courier.phone)
+
+
+def test_open_streams_hold_no_db_connections(db):
+    principal = _online_courier(db)
+    make_order(db, make_restaurant(db), status=models.OrderStatus.READY_FOR_PICKUP)
+    db.close()
+
+    async def scenario():
+        responses = [await couriers.stream_available_orders(_request(), principal) for _ in range(STREAMS)]
+        streams = [response.body_iterator for response in responses]
+        snapshots = [await stream.__anext__() for stream in streams]
+        checked_out = (database.async_engine.pool.checkedout(), database.engine.pool.checkedout())
+        subscribers = courier_feed.hub.stats()["subscribers"]
+        for stream in streams:
+            await stream.aclose()
+        return snapshots, checked_out, subscribers
+
+    snapshots, checked_out, subscribers = asyncio.run(scenario())
+
+    print(f"\nSSE: {STREAMS} открытых потоков, соединений занято (async, sync): {checked_out}")
+    assert all(snapshot.startswith(f"event: {courier_feed.SNAPSHOT}") for snapshot in snapshots)
+    assert checked_out == (0, 0)
+    assert subscribers == STREAMS
+    assert courier_feed.hub.stats()["subscribers"] == 0
+
+
+def test_offline_courier_is_rejected_without_subscribing(client, db):
+    courier = make_user(db, role=models.UserRole.COURIER)
+
+    response = client.get("/api/v1/courier/orders/feed", headers=auth_headers(courier))
+
+    assert response.status_code == 403
+    assert courier_feed.hub.stats()["subscribers"] == 0
+    assert database.async_engine.pool.checkedout() == 0
+
+
+def test_fan_out_to_2000_couriers_benchmark():
+    """Нагрузочный сценарий: 2000 подключенных курьеров в одном воркере, поток событий о заказах."""
+    couriers_count, events = 2000, 200
+
+    async def scenario():
+        hub = courier_feed.CourierFeedHub(broker=courier_feed.LocalBroker(), queue_size=64)
+        await hub.start()
+        subscriptions = [hub.subscribe() for _ in range(couriers_count)]
+        received = [0] * couriers_count
+        done = asyncio.Event()
+        remaining = couriers_count
+
+        async def reader(index, subscription):
+            nonlocal remaining
+            for _ in range(events):
+                await subscription.queue.get()
+                received[index] += 1
+            remaining -= 1
+            if remaining == 0:
+                done.set()
+
+        readers = [asyncio.create_task(reader(i, s)) for i, s in enumerate(subscriptions)]
+        latencies = []
+        started = time.perf_counter()
+        for n in range(events):
+            published_at = time.perf_counter()
+            hub.publish(courier_feed.ORDER_ADDED, {"id": n, "restaurant_id": 1, "total_price": "1500.00"})
+            # Ждем, пока событие прочитают все курьеры
+            while not all(subscription.queue.empty() for subscription in subscriptions):
+                await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            latencies.append(time.perf_counter() - published_at)
+        await asyncio.wait_for(done.wait(), timeout=30)
+        total = time.perf_counter() - started
+        stats = hub.stats()
+        for task in readers:
+            task.cancel()
+        await hub.stop()
+        return received, latencies, total, stats
+
+    received, latencies, total, stats = asyncio.run(scenario())
+
+    latencies.sort()
+    print(
+        f"\nЛента: {couriers_count} курьеров, {events} событий, {stats['delivered']} доставок за {total:.2f} с "
+        f"({stats['delivered'] / total:.0f} доставок/с); событие до последнего курьера: "
+        f"p50 {latencies[len(latencies) // 2] * 1000:.1f} мс, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} мс"
+    )
+    assert received == [events] * couriers_count
+    assert stats["delivered"] == couriers_count * events
+    assert stats["dropped_subscribers"] == 0
@@ -0,0 +1,195 @@
+"""Дашборд администратора (rollups.dashboard_stats): агрегаты + текущий день одним запросом, кеш закрытых периодов."""
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import desc, event, func, insert
+
+from app import database, models, rollups
+
+from .factories import auth_headers, make_order, make_restaurant, make_user
+
+
+def _delivered(db, restaurant, days_ago, total, courier=None, client=None):
+    created_at = datetime.now(timezone.utc).replace(hour=12, minute=0) - timedelta(days=days_ago)
+    order = make_order(
+        db, restaurant, user=client, courier_id=courier.id if courier else None, created_at=created_at,
+        status=models.OrderStatus.ON_THE_WAY, total_price=Decimal(total), delivery_fee=Decimal("300.00"),
+    )
+    order.status = models.OrderStatus.DELIVERED
+    db.commit()
+    return order
+
+
+class _Queries:
+    def __init__(self):
+        self.selects = 0
+
+    def __call__(self, conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            self.selects += 1
+
+
+@pytest.fixture
+def queries():
+    counter = _Queries()
+    event.listen(database.engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(database.engine, "before_cursor_execute", counter)
+
+
+@pytest.fixture
+def history(db):
+    big, small = make_restaurant(db, name="Большой"), make_restaurant(db, name="Малый")
+    courier = make_user(db, role=models.UserRole.COURIER)
+    client = make_user(db)
+    _delivered(db, big, days_ago=3, total="2000.00", courier=courier, client=client)
+    _delivered(db, big, days_ago=1, total="1500.00", courier=courier)
+    _delivered(db, small, days_ago=1, total="500.00", client=client)
+    _delivered(db, small, days_ago=0, total="800.00", courier=courier, client=client)
+    # Не доставленный заказ в сводку не попадает
+    make_order(db, big, status=models.OrderStatus.PREPARING, total_price=Decimal("9999.00"))
+    return big, small, courier, client
+
+
+def test_period_with_today_combines_rollups_and_live_orders(db, history, queries):
+    big, small, courier, client = history
+    today = rollups.utc_today()
+    db.expire_all()
+
+    stats = rollups.dashboard_stats(db, today - timedelta(days=3), today)
+
+    assert queries.selects == 1
+    assert stats.general_stats.total_orders == 4
+    assert stats.general_stats.total_revenue == Decimal("4800.00")
+    assert [(r.name, r.order_count, r.total_revenue) for r in stats.top_restaurants] == [
+        ("Большой", 2, Decimal("3500.00")), ("Малый", 2, Decimal("1300.00")),
+    ]
+    assert [(c.id, c.deliveries_count) for c in stats.top_couriers] == [(courier.id, 3)]
+    assert {(c.id, c.orders_count) for c in stats.top_clients} >= {(client.id, 3)}
+
+
+def test_closed_period_is_cached_until_a_past_day_changes(db, history, queries):
+    big, *_ = history
+    yesterday = rollups.utc_today() - timedelta(days=1)
+
+    first = rollups.dashboard_stats(db, yesterday, yesterday)
+    selects = queries.selects
+    second = rollups.dashboard_stats(db, yesterday, yesterday)
+    assert queries.selects == selects
+    assert second == first
+    assert first.general_stats.total_orders == 2
+
+    # Доставка заказа прошлого дня сбрасывает кеш пересекающихся периодов
+    _delivered(db, big, days_ago=1, total="100.00")
+    third = rollups.dashboard_stats(db, yesterday, yesterday)
+    assert third.general_stats.total_orders == 3
+
+
+def test_period_with_today_is_not_cached(db, history):
+    big, *_ = history
+    today = rollups.utc_today()
+
+    before = rollups.dashboard_stats(db, today, today)
+    _delivered(db, big, days_ago=0, total="100.00")
+    after = rollups.dashboard_stats(db, today, today)
+
+    assert after.general_stats.total_orders == before.general_stats.total_orders + 1
+
+
+def test_dashboard_endpoint(client, db, history):
+    admin = make_user(db, role=models.UserRole.ADMIN, is_superuser=True)
+    today = rollups.utc_today()
+    headers = auth_headers(admin)
+
+    response = client.get("/api/v1/admin/dashboard", params={
+        "start_date": (today - timedelta(days=7)).isoformat(), "end_date": today.isoformat(),
+    }, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["general_stats"]["total_orders"] == 4
+
+    reversed_period = client.get("/api/v1/admin/dashboard", params={
+        "start_date": today.isoformat(), "end_date": (today - timedelta(days=1)).isoformat(),
+    }, headers=headers)
+    assert reversed_period.status_code == 400
+
+
+def _seed_year(db, orders: int, seed: int = 23):
+    """Массовая вставка без ORM (агрегаты не обновляются): заказы за последние 365 дней."""
+    rnd = random.Random(seed)
+    db.execute(insert(models.User), [
+        {"phone": f"+7702{i:07d}", "first_name": f"Клиент {i}", "hashed_password": "-", "role": models.UserRole.CLIENT} for i in range(5000)
+    ] + [
+        {"phone": f"+7703{i:07d}", "first_name": f"Курьер {i}", "hashed_password": "-", "role": models.UserRole.COURIER} for i in range(500)
+    ])
+    clients = [row.id for row in db.query(models.User.id).filter(models.User.phone.like("+7702%"))]
+    couriers = [row.id for row in db.query(models.User.id).filter(models.User.phone.like("+7703%"))]
+    restaurants = [make_restaurant(db).id for _ in range(200)]
+    now = datetime.now(timezone.utc)
+    statuses = [models.OrderStatus.DELIVERED] * 9 + [models.OrderStatus.CANCELLED]
+    for offset in range(0, orders, 50_000):
+        db.execute(insert(models.Order), [
+            {
+                "code": f"D{i:08d}", "user_id": rnd.choice(clients), "restaurant_id": rnd.choice(restaurants),
+                "courier_id": rnd.choice(couriers), "status": rnd.choice(statuses),
+                "total_price": Decimal(rnd.randint(1000, 20000)), "delivery_fee": Decimal("500"),
+                "created_at": now - timedelta(seconds=rnd.randint(0, 365 * 86400)),
+            }
+            for i in range(offset, min(offset + 50_000, orders))
+        ])
+    db.commit()
+
+
+def _scan_orders(db, start, end):
+    """Прежний способ: те же итоги прямыми агрегатами по таблице заказов."""
+    delivered = db.query(models.Order).filter(
+        models.Order.status == models.OrderStatus.DELIVERED,
+        models.Order.created_at >= start, models.Order.created_at < end,
+    ).subquery()
+    totals = db.query(func.count(delivered.c.id), func.sum(delivered.c.total_price)).one()
+    for column in (delivered.c.restaurant_id, delivered.c.courier_id, delivered.c.user_id):
+        db.query(column, func.count()).group_by(column).order_by(desc(func.count())).limit(5).all()
+    return totals
+
+
+@pytest.mark.parametrize("orders", [
+    100_000,
+    pytest.param(1_000_000, marks=pytest.mark.skipif(
+        not os.environ.get("RUN_SLOW_BENCHMARKS"), reason="долгая вставка; RUN_SLOW_BENCHMARKS=1",
+    )),
+])
+def test_dashboard_benchmark_year_of_orders(db, orders):
+    """Нагрузочный сценарий: сводка за год по агрегатам против прямого подсчета по заказам."""
+    _seed_year(db, orders)
+    today = rollups.utc_today()
+    start = today - timedelta(days=365)
+
+    started = time.perf_counter()
+    rollups.backfill(db, start, today)
+    backfill_seconds = time.perf_counter() - started
+
+    rollups.dashboard_cache.clear()
+    started = time.perf_counter()
+    stats = rollups.dashboard_stats(db, start, today)
+    dashboard_seconds = time.perf_counter() - started
+
+    yesterday = today - timedelta(days=1)
+    rollups.dashboard_stats(db, start, yesterday)
+    started = time.perf_counter()
+    rollups.dashboard_stats(db, start, yesterday)
+    cached_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    total_orders, total_revenue = _scan_orders(db, rollups.day_start(start), rollups.day_start(today + timedelta(days=1)))
+    scan_seconds = time.perf_counter() - started
+
+    assert stats.general_stats.total_orders == total_orders
+    assert stats.general_stats.total_revenue == Decimal(total_revenue)
+    print(
+        f"\nдашборд за год, {orders} заказов: по агрегатам {dashboard_seconds * 1000:.0f} мс, "
+        f"закрытый период из кеша {cached_seconds * 1000:.2f} мс, прямой подсчет по заказам "
+        f"{scan_seconds * 1000:.0f} мс (backfill {backfill_seconds:.1f} с)"
+    )
@@ -0,0 +1,100 @@
+"""Метрики пула соединений (metrics.py) и GET /admin/db/pool."""
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+from app import database, metrics, models
+
+from .factories import auth_headers, make_user
+
+
+@pytest.fixture
+def small_engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/pool.db",
+        poolclass=metrics.InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.3,
+    )
+    yield engine
+    engine.dispose()
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_waiting_counts_only_callers_blocked_on_the_pool(small_engine):
+    pool_metrics = small_engine.pool.metrics
+    # Свободное соединение выдается без ожидания
+    for _ in range(5):
+        with small_engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            assert pool_metrics.waiting == 0
+
+    holder = small_engine.connect()
+    done = threading.Event()
+
+    def blocked_checkout():
+        with small_engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        done.set()
+
+    thread = threading.Thread(target=blocked_checkout)
+    thread.start()
+    _wait_for(lambda: pool_metrics.waiting == 1)
+    holder.close()
+    thread.join()
+
+    assert done.is_set()
+    assert pool_metrics.waiting == 0
+    assert pool_metrics.checkout_latency.snapshot()["count"] == 7
+
+
+def test_new_connection_setup_is_not_counted_as_waiting(tmp_path):
+    import sqlite3
+
+    connecting, release = threading.Event(), threading.Event()
+
+    def slow_connect():
+        connecting.set()
+        release.wait(2)
+        return sqlite3.connect(str(tmp_path / "slow.db"), check_same_thread=False)
+
+    engine = create_engine("sqlite://", creator=slow_connect, poolclass=metrics.InstrumentedQueuePool, pool_size=2)
+    thread = threading.Thread(target=lambda: engine.connect().close())
+    thread.start()
+    connecting.wait(2)
+    assert engine.pool.metrics.waiting == 0
+    release.set()
+    thread.join()
+    engine.dispose()
+
+
+def test_exhausted_pool_counts_timeouts(small_engine):
+    with small_engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            small_engine.connect()
+    stats = metrics.pool_stats("small", small_engine.pool)
+    assert stats["timeouts"] == 1
+    assert stats["waiting"] == 0
+    assert (stats["checked_out"], stats["pool_size"]) == (0, 1)
+
+
+def test_in_memory_sqlite_keeps_default_pool():
+    assert "poolclass" not in database.get_pool_options("sqlite://", metrics.InstrumentedQueuePool)
+    assert database.get_pool_options("sqlite:///./app.db", metrics.InstrumentedQueuePool)["poolclass"] is metrics.InstrumentedQueuePool
+
+
+def test_pool_endpoint_reports_file_sqlite_pools(client, db):
+    admin = make_user(db, role=models.UserRole.ADMIN, is_superuser=True)
+    response = client.get("/api/v1/admin/db/pool", headers=auth_headers(admin))
+    assert response.status_code == 200
+    pools = {pool["engine"]: pool for pool in response.json()["pools"]}
+    assert pools["sync"]["pool_class"] == "InstrumentedQueuePool"
+    assert pools["async"]["pool_class"] == "InstrumentedAsyncAdaptedQueuePool"
+    for pool in pools.values():
+        assert None not in (pool["pool_size"], pool["idle"], pool["waiting"], pool["checkout_latency"])
@@ -0,0 +1,57 @@
+"""Стоимость доставки по расстоянию (services.calculate_delivery_fee) и пакетная проверка адресов."""
+from decimal import Decimal
+
+from app import crud, schemas, services
+
+from .factories import auth_headers, make_address, make_restaurant, make_user
+
+
+def test_fee_is_base_plus_rate_per_km(db):
+    tariffs = crud.get_system_settings_snapshot(db)
+    day = services.calculate_delivery_fee(tariffs, 3.456, current_hour=12)
+    night = services.calculate_delivery_fee(tariffs, 3.456, current_hour=23)
+
+    assert day == Decimal(tariffs.day_base_rate) + Decimal("3.46") * Decimal(tariffs.day_rate_per_km)
+    assert night == Decimal(tariffs.night_base_rate) + Decimal("3.46") * Decimal(tariffs.night_rate_per_km)
+    assert services.calculate_delivery_fee(tariffs, None, current_hour=12) == Decimal(tariffs.day_base_rate)
+
+
+def test_delivery_check_for_all_addresses(client, db):
+    user = make_user(db)
+    restaurant = make_restaurant(db, latitude=43.3333, longitude=52.8667)
+    near = make_address(db, user, latitude=43.34, longitude=52.87)
+    far = make_address(db, user, latitude=44.5, longitude=54.0)
+    unknown = make_address(db, user, latitude=None, longitude=None)
+
+    response = client.get(
+        "/api/v1/addresses/delivery-check", params={"restaurant_id": restaurant.id}, headers=auth_headers(user)
+    )
+
+    assert response.status_code == 200
+    checks = {item["address_id"]: item for item in response.json()}
+    assert checks[near.id]["in_delivery_zone"] and checks[near.id]["delivery_fee"] is not None
+    assert checks[near.id]["distance_km"] < 1.5
+    assert not checks[far.id]["in_delivery_zone"] and checks[far.id]["delivery_fee"] is None
+    assert checks[unknown.id]["distance_km"] is None
+
+
+def test_delivery_check_accepts_zero_coordinates(client, db):
+    """Нулевая широта или долгота - настоящая координата, а не "адрес без координат"."""
+    current = schemas.SystemSettingsUpdate.model_validate(crud.get_system_settings(db), from_attributes=True)
+    crud.update_system_settings(db, current.model_copy(update={"city_center_lat": 0.0, "city_center_lon": 0.0}))
+    user = make_user(db)
+    restaurant = make_restaurant(db, latitude=0.003, longitude=0.003)
+    on_equator = make_address(db, user, latitude=0.0, longitude=0.002)
+    on_meridian = make_address(db, user, latitude=0.002, longitude=0.0)
+
+    response = client.get(
+        "/api/v1/addresses/delivery-check", params={"restaurant_id": restaurant.id}, headers=auth_headers(user)
+    )
+
+    assert response.status_code == 200
+    checks = {item["address_id"]: item for item in response.json()}
+    for address in (on_equator, on_meridian):
+        assert checks[address.id]["in_delivery_zone"]
+        assert 0 < checks[address.id]["distance_km"] < 1
+        assert checks[address.id]["distance_to_center_km"] < 1
+        assert checks[address.id]["delivery_fee"] is not None
@@ -0,0 +1,152 @@
+"""Зоны доставки (delivery_zones.ZoneIndex): проверка точек, приоритет зон, тарифы и обновление индекса."""
+import json
+from decimal import Decimal
+
+from app import crud, models, schemas, services
+from app.delivery_zones import DeliveryZoneCache, PreparedZone, ZoneIndex
+
+from .factories import auth_headers, make_address, make_dish, make_restaurant, make_user
+
+BASE = (43.30, 52.80)
+STEP = 0.01
+
+# Буква "П" (вогнутый многоугольник): выемка сверху между двумя "ногами"
+U_SHAPE = [(0, 0), (0, 3), (3, 3), (3, 2), (1, 2), (1, 1), (3, 1), (3, 0)]
+
+
+def _point(lat_steps, lon_steps):
+    return BASE[0] + lat_steps * STEP, BASE[1] + lon_steps * STEP
+
+
+def _polygon(shape):
+    return [_point(lat, lon) for lat, lon in shape]
+
+
+def _zone_in(shape, restaurant_id=None, **fields):
+    return schemas.DeliveryZoneCreate(
+        name=fields.pop("name", "Зона"), restaurant_id=restaurant_id, polygon=_polygon(shape), **fields
+    )
+
+
+def _prepared(shape, zone_id=1, restaurant_id=None):
+    return PreparedZone(models.DeliveryZone(
+        id=zone_id, name=f"Зона {zone_id}", restaurant_id=restaurant_id,
+        polygon_json=json.dumps(_polygon(shape)),
+    ))
+
+
+def test_concave_polygon_inside_and_outside():
+    index = ZoneIndex([_prepared(U_SHAPE)], version=1)
+
+    assert index.find(*_point(0.5, 1.5)) is not None   # перемычка
+    assert index.find(*_point(2.0, 0.5)) is not None   # левая "нога"
+    assert index.find(*_point(2.0, 2.5)) is not None   # правая "нога"
+    assert index.find(*_point(2.0, 1.5)) is None       # выемка: внутри bounding box, но вне зоны
+    assert index.find(*_point(-0.5, 1.5)) is None
+
+
+def test_point_on_grid_cell_edge_and_outside_bounding_box():
+    square = [(0, 0), (0, 4), (4, 4), (4, 0)]
+    index = ZoneIndex([_prepared(square, zone_id=1), _prepared([(10, 10), (10, 12), (12, 12), (12, 10)], zone_id=2)], version=1)
+    # Точки на границах ячеек сетки индекса (округление может отнести их к соседней ячейке,
+    # зона все равно должна находиться)
+    for row, col in ((7, 3), (7, 7), (20, 1)):
+        edge_lat = index.min_lat + row * index.cell_size
+        edge_lon = index.min_lon + col * index.cell_size
+        assert index.find(edge_lat, edge_lon).id == 1
+    assert index.find(*_point(-5, -5)) is None
+    assert index.find(*_point(50, 50)) is None
+    assert index.find(*_point(11, 11)).id == 2
+
+
+def test_restaurant_zones_take_precedence_over_global(db):
+    own = make_restaurant(db)
+    other = make_restaurant(db)
+    crud.create_delivery_zone(db, _zone_in([(0, 0), (0, 3), (3, 3), (3, 0)], name="Общая"))
+    own_zone = crud.create_delivery_zone(db, _zone_in([(5, 5), (5, 6), (6, 6), (6, 5)], restaurant_id=own.id))
+
+    in_global_only = _point(1, 1)
+    in_own_only = _point(5.5, 5.5)
+
+    assert services.resolve_delivery_zone(db, *in_global_only, restaurant_id=own.id) == (False, None)
+    in_zone, zone = services.resolve_delivery_zone(db, *in_own_only, restaurant_id=own.id)
+    assert in_zone and zone.id == own_zone.id
+    assert services.resolve_delivery_zone(db, *in_global_only, restaurant_id=other.id)[0]
+    assert not services.resolve_delivery_zone(db, *in_own_only, restaurant_id=other.id)[0]
+
+
+def test_city_radius_applies_without_zones(db):
+    tariffs = crud.get_system_settings_snapshot(db)
+    with_zone = make_restaurant(db)
+    without_zone = make_restaurant(db)
+    crud.create_delivery_zone(db, _zone_in([(0, 0), (0, 1), (1, 1), (1, 0)], restaurant_id=with_zone.id))
+    near_center = (tariffs.city_center_lat + 0.01, tariffs.city_center_lon)
+    far_away = (tariffs.city_center_lat + 1.0, tariffs.city_center_lon)
+
+    # У ресторана нет своих зон, общих тоже нет - действует радиус от центра города
+    assert services.resolve_delivery_zone(db, *near_center, restaurant_id=without_zone.id) == (True, None)
+    assert services.resolve_delivery_zone(db, *far_away, restaurant_id=without_zone.id) == (False, None)
+    assert services.check_points_delivery(db, [near_center, far_away], restaurant_id=without_zone.id) == [
+        (True, None), (False, None)
+    ]
+    assert not services.resolve_delivery_zone(db, *near_center, restaurant_id=with_zone.id)[0]
+
+
+def test_zone_tariff_override_reaches_order_costs(db):
+    user = make_user(db)
+    restaurant = make_restaurant(db, latitude=_point(1, 1)[0], longitude=_point(1, 1)[1])
+    dish = make_dish(db, restaurant, price="1000.00")
+    address = make_address(db, user, *_point(2, 2))
+    crud.create_delivery_zone(db, _zone_in(
+        [(0, 0), (0, 3), (3, 3), (3, 0)], restaurant_id=restaurant.id,
+        day_base_rate=Decimal("999.00"), day_rate_per_km=Decimal("0"),
+        night_base_rate=Decimal("999.00"), night_rate_per_km=Decimal("0"),
+    ))
+    order_in = schemas.OrderCreate(
+        restaurant_id=restaurant.id, address_id=address.id,
+        items=[schemas.OrderItemCreate(dish_id=dish.id, quantity=1)],
+    )
+
+    costs = services.calculate_order_costs(db, order_in)
+
+    assert costs["delivery_fee"] == Decimal("999.00")
+
+
+def test_zone_edit_bumps_version_and_rebuilds_other_worker_index(db):
+    zone = crud.create_delivery_zone(db, _zone_in([(0, 0), (0, 1), (1, 1), (1, 0)]))
+    other_worker = DeliveryZoneCache()
+    version = crud.get_system_settings(db).version
+    before = other_worker.get(db, version=version)
+    assert other_worker.get(db, version=version) is before
+    assert before.find(*_point(0.5, 0.5)) is not None
+
+    crud.update_delivery_zone(db, zone, _zone_in([(5, 5), (5, 6), (6, 6), (6, 5)]))
+
+    db.expire_all()
+    new_version = crud.get_system_settings(db).version
+    assert new_version == version + 1
+    after = other_worker.get(db, version=new_version)
+    assert after is not before
+    assert after.find(*_point(0.5, 0.5)) is None
+    assert after.find(*_point(5.5, 5.5)).id == zone.id
+
+
+def test_check_endpoint_accepts_at_most_10000_points(client, db):
+    admin = make_user(db, role=models.UserRole.ADMIN, is_superuser=True)
+    crud.create_delivery_zone(db, _zone_in(U_SHAPE))
+    inside = dict(zip(("lat", "lon"), _point(0.5, 1.5)))
+    notch = dict(zip(("lat", "lon"), _point(2.0, 1.5)))
+    points = [inside, notch] * 5000
+
+    response = client.post("/api/v1/admin/delivery-zones/check", json={"points": points}, headers=auth_headers(admin))
+
+    assert response.status_code == 200
+    results = response.json()
+    assert len(results) == 10_000
+    assert results[0]["in_delivery_zone"] and results[0]["zone_id"] is not None
+    assert not results[1]["in_delivery_zone"]
+
+    too_many = client.post(
+        "/api/v1/admin/delivery-zones/check", json={"points": points + [inside]}, headers=auth_headers(admin)
+    )
+    assert too_many.status_code == 422
@@ -0,0 +1,188 @@
+"""Выгрузки для финансов (exports.py): форматы, пачки серверного курсора, маскировка карт."""
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert
+
+from app import exports, models, services
+from app.config import settings
+
+from .factories import auth_headers, make_dish, make_order, make_restaurant, make_user
+
+DAY = date(2026, 3, 10)
+
+
+def _at(day, hour=12):
+    return datetime(day.year, day.month, day.day, hour, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def orders(db):
+    restaurant = make_restaurant(db)
+    inside = [make_order(db, restaurant, created_at=_at(DAY, hour)) for hour in (9, 12, 15)]
+    make_order(db, restaurant, created_at=_at(DAY + timedelta(days=1)))
+    make_order(db, restaurant, created_at=_at(DAY - timedelta(days=1)))
+    return inside
+
+
+def _body(name, start=DAY, end=DAY, **options):
+    return b"".join(exports.stream(name, start, end, **options))
+
+
+def _csv_rows(data: bytes):
+    return list(csv.DictReader(io.StringIO(data.decode())))
+
+
+def test_orders_csv_contains_only_the_period(orders):
+    rows = _csv_rows(_body("orders"))
+    assert [int(row["id"]) for row in rows] == [order.id for order in orders]
+    assert rows[0]["status"] == models.OrderStatus.PENDING.value
+    assert Decimal(rows[0]["total_price"]) == Decimal("1600.00")
+
+
+def test_rows_are_read_in_batches(orders, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    batches = list(exports.iter_batches(exports.DATASETS["orders"], DAY, DAY))
+    assert [len(batch) for batch in batches] == [2, 1]
+
+
+def test_ndjson_and_gzip_carry_the_same_rows(orders):
+    lines = _body("orders", fmt=exports.NDJSON).decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [order.id for order in orders]
+
+    compressed = _body("orders", gzip=True)
+    assert gzip.decompress(compressed) == _body("orders")
+
+
+def test_order_items_include_dish_name(db, orders):
+    dish = make_dish(db, make_restaurant(db), name="Плов")
+    db.add(models.OrderItem(order_id=orders[0].id, dish_id=dish.id, quantity=2, price_at_time_of_order=Decimal("450.00")))
+    db.commit()
+
+    [row] = _csv_rows(_body("order-items"))
+    assert (row["order_id"], row["dish_name"], row["quantity"]) == (str(orders[0].id), "Плов", "2")
+
+
+def test_payouts_mask_card_number(db):
+    courier = make_user(db, role=models.UserRole.COURIER)
+    profile = models.CourierProfile(user_id=courier.id, card_number="4400123412341234")
+    db.add(profile)
+    db.flush()
+    db.add(models.PayoutRequest(
+        courier_profile_id=profile.id, amount=Decimal("5000.00"), card_number="4400123412341234", created_at=_at(DAY),
+    ))
+    db.commit()
+
+    data = _body("payouts")
+    [row] = _csv_rows(data)
+    assert row["card_last4"] == "*1234"
+    assert row["courier_user_id"] == str(courier.id)
+    assert b"4400123412341234" not in data
+
+
+def test_splits_match_payment_shares(orders):
+    rows = _csv_rows(_body("splits"))
+    restaurant_share, platform_share = services.calculate_split_shares(orders[0])
+    assert (Decimal(rows[0]["restaurant_share"]), Decimal(rows[0]["platform_share"])) == (restaurant_share, platform_share)
+    assert restaurant_share + platform_share == orders[0].total_price
+
+
+@pytest.mark.skipif(not exports.PARQUET_AVAILABLE, reason="pyarrow не установлен")
+def test_parquet_round_trip(orders):
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(io.BytesIO(_body("orders", fmt=exports.PARQUET)))
+    assert table.column("id").to_pylist() == [order.id for order in orders]
+    assert table.column("total_price").to_pylist()[0] == Decimal("1600.00")
+
+
+def test_export_endpoint(client, db, orders):
+    admin = make_user(db, role=models.UserRole.ADMIN, is_superuser=True)
+    params = {"start_date": DAY.isoformat(), "end_date": DAY.isoformat(), "gzip": "true"}
+
+    response = client.get("/api/v1/admin/exports/orders", params=params, headers=auth_headers(admin))
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    assert 'filename="orders_2026-03-10_2026-03-10.csv.gz"' in response.headers["content-disposition"]
+    assert len(_csv_rows(gzip.decompress(response.content))) == 3
+
+    reversed_period = dict(params, start_date=(DAY + timedelta(days=1)).isoformat())
+    assert client.get("/api/v1/admin/exports/orders", params=reversed_period, headers=auth_headers(admin)).status_code == 400
+    client_user = make_user(db)
+    assert client.get("/api/v1/admin/exports/orders", params=params, headers=auth_headers(client_user)).status_code == 403
+
+
+def test_period_bounds_are_utc_midnight(db, monkeypatch):
+    restaurant = make_restaurant(db)
+    before = make_order(db, restaurant, created_at=datetime(2026, 3, 9, 23, 59, 59, tzinfo=timezone.utc))
+    first = make_order(db, restaurant, created_at=datetime(2026, 3, 10, 0, 0, 0, tzinfo=timezone.utc))
+    last = make_order(db, restaurant, created_at=datetime(2026, 3, 10, 23, 59, 59, tzinfo=timezone.utc))
+    after = make_order(db, restaurant, created_at=datetime(2026, 3, 11, 0, 0, 0, tzinfo=timezone.utc))
+    bounds = []
+    dataset = exports.DATASETS["orders"]
+    monkeypatch.setitem(exports.DATASETS, "orders", dataset._replace(
+        query=lambda start, end: bounds.append((start, end)) or dataset.query(start, end)
+    ))
+
+    ids = [int(row["id"]) for row in _csv_rows(_body("orders"))]
+
+    assert ids == [first.id, last.id]
+    assert before.id not in ids and after.id not in ids
+    assert bounds == [(
+        datetime(2026, 3, 10, tzinfo=timezone.utc), datetime(2026, 3, 11, tzinfo=timezone.utc)
+    )]
+    assert all(bound.utcoffset() == timedelta(0) for bound in bounds[0])
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="нужен /proc (Linux)")
+@pytest.mark.parametrize("rows", [
+    100_000,
+    pytest.param(1_000_000, marks=pytest.mark.skipif(
+        not os.environ.get("RUN_SLOW_BENCHMARKS"), reason="долгая вставка; RUN_SLOW_BENCHMARKS=1",
+    )),
+])
+def test_export_memory_stays_flat(db, rows):
+    """Нагрузочный сценарий: память воркера при выгрузке не растет с числом строк."""
+    user, restaurant = make_user(db), make_restaurant(db)
+    for offset in range(0, rows, 50_000):
+        db.execute(insert(models.Order), [
+            {
+                "code": f"E{i:08d}", "user_id": user.id, "restaurant_id": restaurant.id,
+                "status": models.OrderStatus.DELIVERED, "total_price": Decimal("1600.00"),
+                "items_total_price": Decimal("1000.00"), "delivery_fee": Decimal("500.00"),
+                "service_fee": Decimal("100.00"), "discount": Decimal("0.00"),
+                "created_at": _at(DAY, hour=i % 24),
+            }
+            for i in range(offset, min(offset + 50_000, rows))
+        ])
+    db.commit()
+
+    baseline = peak = _rss_bytes()
+    exported, size = 0, 0
+    started = time.perf_counter()
+    for chunk in exports.stream("orders", DAY, DAY):
+        size += len(chunk)
+        exported += chunk.count(b"\n")
+        peak = max(peak, _rss_bytes())
+    elapsed = time.perf_counter() - started
+
+    growth_mb = (peak - baseline) / 2**20
+    print(
+        f"\nвыгрузка {rows} строк CSV: {size / 2**20:.0f} МБ за {elapsed:.1f} с "
+        f"({rows / elapsed:.0f} строк/с), рост RSS {growth_mb:.1f} МБ"
+    )
+    assert exported == rows + 1  # заголовок
+    # Потолок памяти - несколько пачек EXPORT_BATCH_SIZE, а не весь файл
+    assert growth_mb < 64
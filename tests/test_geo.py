@@ -0,0 +1,197 @@
+"""Геопоиск: заказы рядом с курьером (crud.get_available_orders_near) и расчет расстояний."""
+import random
+import time
+
+import pytest
+from sqlalchemy import event, insert
+
+from app import crud, database, geo, models
+
+from .factories import make_order, make_restaurant, make_user
+
+CENTER = (43.3333, 52.8667)
+
+
+def _brute_force(points, lat, lon, radius_km, limit):
+    distances = sorted(
+        (geo.haversine_km(lat, lon, point_lat, point_lon), order_id)
+        for order_id, point_lat, point_lon in points
+    )
+    return [order_id for distance, order_id in distances if distance <= radius_km][:limit]
+
+
+def _seed(db, restaurants: int, orders: int, spread_deg: float = 0.2, seed: int = 18):
+    """Массовая вставка без ORM: рестораны вокруг CENTER и заказы, ожидающие курьера."""
+    rnd = random.Random(seed)
+    client = make_user(db)
+    db.execute(insert(models.User), [
+        {"phone": f"+7701{i:07d}", "hashed_password": "-", "role": models.UserRole.RESTAURANT}
+        for i in range(restaurants)
+    ])
+    owner_ids = [row.id for row in db.query(models.User.id).filter(models.User.phone.like("+7701%")).order_by(models.User.id)]
+    places = []
+    for i, owner_id in enumerate(owner_ids):
+        lat = CENTER[0] + rnd.uniform(-spread_deg, spread_deg)
+        lon = CENTER[1] + rnd.uniform(-spread_deg, spread_deg)
+        places.append({
+            "owner_id": owner_id, "name": f"R{i}", "latitude": lat, "longitude": lon,
+            "geohash": geo.encode_geohash(lat, lon), "is_approved": True, "is_active": True,
+        })
+    db.execute(insert(models.Restaurant), places)
+    coords = {row.id: (row.latitude, row.longitude) for row in db.query(
+        models.Restaurant.id, models.Restaurant.latitude, models.Restaurant.longitude
+    )}
+    restaurant_ids = list(coords)
+    db.execute(insert(models.Order), [
+        {
+            "code": f"G{i:07d}", "user_id": client.id, "restaurant_id": rnd.choice(restaurant_ids),
+            "status": models.OrderStatus.READY_FOR_PICKUP, "total_price": 1000,
+        }
+        for i in range(orders)
+    ])
+    db.commit()
+    return [
+        (order_id, *coords[restaurant_id])
+        for order_id, restaurant_id in db.query(models.Order.id, models.Order.restaurant_id)
+    ]
+
+
+def test_near_matches_brute_force_and_skips_taken_orders(db):
+    points = _seed(db, restaurants=50, orders=400, spread_deg=0.05)
+    taken = make_order(db, make_restaurant(db, latitude=CENTER[0], longitude=CENTER[1]),
+                       status=models.OrderStatus.ON_THE_WAY)
+
+    page = crud.get_available_orders_near(db, CENTER[0], CENTER[1], radius_km=2.0, limit=15)
+
+    assert [order.id for order in page["items"]] == _brute_force(points, *CENTER, 2.0, 15)
+    assert taken.id not in {order.id for order in page["items"]}
+    distances = [order.distance_km for order in page["items"]]
+    assert distances == sorted(distances)
+
+
+def test_near_loads_only_page_orders(db):
+    _seed(db, restaurants=30, orders=600, spread_deg=0.02)
+    selected = []
+
+    def count_rows(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM orders" in statement:
+            selected.append(statement)
+
+    event.listen(database.engine, "after_cursor_execute", count_rows)
+    try:
+        page = crud.get_available_orders_near(db, CENTER[0], CENTER[1], radius_km=5.0, limit=10)
+    finally:
+        event.remove(database.engine, "after_cursor_execute", count_rows)
+
+    assert len(page["items"]) == 10 and page["has_more"]
+    # Кандидаты - с LIMIT, полная загрузка - только 10 заказов страницы
+    assert any("LIMIT" in statement for statement in selected)
+
+
+def _walk(fetch):
+    """Проходит все страницы по next_cursor; возвращает id по порядку."""
+    ids, cursor = [], None
+    while True:
+        page = fetch(cursor)
+        ids.extend(item.id if hasattr(item, "id") else item["id"] for item in page["items"])
+        assert page["has_more"] == (page["next_cursor"] is not None)
+        if not page["has_more"]:
+            return ids
+        cursor = page["next_cursor"]
+
+
+def test_near_pages_follow_distance_then_id(db):
+    # Мало ресторанов и много заказов: у заказов одного ресторана одинаковое расстояние
+    points = _seed(db, restaurants=6, orders=300, spread_deg=0.03)
+
+    ids = _walk(lambda cursor: crud.get_available_orders_near(
+        db, CENTER[0], CENTER[1], radius_km=10.0, limit=7, cursor=cursor
+    ))
+
+    assert ids == _brute_force(points, *CENTER, 10.0, None)
+
+
+def test_nearby_restaurants_endpoint_pages_with_cursor(client, db):
+    near = [
+        make_restaurant(db, latitude=CENTER[0] + 0.001 * i, longitude=CENTER[1]).id
+        for i in range(1, 6)
+    ]
+    make_restaurant(db, latitude=CENTER[0], longitude=CENTER[1] + 1.0)  # вне радиуса
+    params = {"lat": CENTER[0], "lon": CENTER[1], "radius_km": 5, "limit": 2}
+
+    def fetch(cursor):
+        response = client.get("/api/v1/restaurants/", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        return response.json()
+
+    assert _walk(fetch) == near
+
+
+def test_distance_cursor_from_another_point_is_rejected(client, db):
+    for i in range(3):
+        make_restaurant(db, latitude=CENTER[0] + 0.001 * i, longitude=CENTER[1])
+    first = client.get("/api/v1/restaurants/", params={"lat": CENTER[0], "lon": CENTER[1], "limit": 1}).json()
+
+    moved = client.get("/api/v1/restaurants/", params={
+        "lat": CENTER[0] + 0.01, "lon": CENTER[1], "limit": 1, "cursor": first["next_cursor"],
+    })
+
+    assert moved.status_code == 400
+
+
+def test_near_benchmark_100k_orders(db):
+    """Нагрузочный сценарий: 100 000 заказов в 2 000 ресторанах по городу."""
+    started = time.perf_counter()
+    points = _seed(db, restaurants=2000, orders=100_000)
+    seeded = time.perf_counter() - started
+
+    timings = []
+    for radius_km in (1.0, 3.0, 10.0):
+        started = time.perf_counter()
+        page = crud.get_available_orders_near(db, CENTER[0], CENTER[1], radius_km=radius_km, limit=20)
+        timings.append((radius_km, time.perf_counter() - started))
+        assert [order.id for order in page["items"]] == _brute_force(points, *CENTER, radius_km, 20)
+
+    print(f"\nгеопоиск: 100k заказов (вставка {seeded:.1f} с), " + ", ".join(
+        f"радиус {radius:g} км - {elapsed * 1000:.0f} мс" for radius, elapsed in timings
+    ))
+
+
+def test_vectorized_distances_match_scalar(monkeypatch):
+    rnd = random.Random(19)
+    lats = [CENTER[0] + rnd.uniform(-1, 1) for _ in range(500)]
+    lons = [CENTER[1] + rnd.uniform(-1, 1) for _ in range(500)]
+
+    vectorized = geo.haversine_km_many(*CENTER, lats, lons)
+    monkeypatch.setattr(geo, "NUMPY_AVAILABLE", False)
+    scalar = geo.haversine_km_many(*CENTER, lats, lons)
+
+    assert len(vectorized) == len(scalar) == 500
+    assert max(abs(a - b) for a, b in zip(vectorized, scalar)) < 1e-9
+
+
+def test_haversine_close_to_geodesic_at_city_scale():
+    distance = pytest.importorskip("geopy.distance")
+    rnd = random.Random(7)
+    for _ in range(200):
+        lat, lon = CENTER[0] + rnd.uniform(-0.3, 0.3), CENTER[1] + rnd.uniform(-0.3, 0.3)
+        expected = distance.geodesic(CENTER, (lat, lon)).km
+        # Погрешность сферической модели - доли процента, много меньше шага тарифа за километр
+        assert abs(geo.haversine_km(*CENTER, lat, lon) - expected) <= expected * 0.005 + 1e-6
+
+
+def test_distance_benchmark_100k_points(monkeypatch):
+    rnd = random.Random(1)
+    lats = [CENTER[0] + rnd.uniform(-0.5, 0.5) for _ in range(100_000)]
+    lons = [CENTER[1] + rnd.uniform(-0.5, 0.5) for _ in range(100_000)]
+
+    started = time.perf_counter()
+    geo.haversine_km_many(*CENTER, lats, lons)
+    vectorized = time.perf_counter() - started
+
+    monkeypatch.setattr(geo, "NUMPY_AVAILABLE", False)
+    started = time.perf_counter()
+    geo.haversine_km_many(*CENTER, lats, lons)
+    scalar = time.perf_counter() - started
+
+    print(f"\nрасстояния до 100k точек: NumPy {vectorized * 1000:.0f} мс, цикл {scalar * 1000:.0f} мс")
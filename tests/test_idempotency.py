@@ -0,0 +1,90 @@
+"""Ключи идемпотентности для создания заказа и веб-хуков PayLink."""
+import pytest
+
+from app import idempotency, models, outbox
+
+from .factories import auth_headers, make_address, make_dish, make_restaurant, make_user
+
+
+@pytest.fixture(autouse=True)
+def _quiet_dispatcher(monkeypatch):
+    monkeypatch.setattr(outbox.payment_dispatcher, "notify", lambda: None)
+
+
+@pytest.fixture
+def checkout(db):
+    user = make_user(db)
+    restaurant = make_restaurant(db)
+    dish = make_dish(db, restaurant, price="1200.00")
+    address = make_address(db, user)
+    body = {"restaurant_id": restaurant.id, "address_id": address.id, "items": [{"dish_id": dish.id, "quantity": 2}]}
+    return user, body
+
+
+def _order_count(db):
+    db.expire_all()
+    return db.query(models.Order).count()
+
+
+def test_replay_returns_first_response_without_new_order(client, db, checkout):
+    user, body = checkout
+    headers = {**auth_headers(user), "Idempotency-Key": "checkout-1"}
+
+    first = client.post("/api/v1/orders/", json=body, headers=headers)
+    assert first.status_code == 202, first.text
+    # Повтор из другого воркера: кеш ответов этого воркера пуст
+    idempotency.completed_responses.clear()
+    second = client.post("/api/v1/orders/", json=body, headers=headers)
+    third = client.post("/api/v1/orders/", json=body, headers=headers)
+
+    assert second.status_code == third.status_code == 202
+    assert second.json() == third.json() == first.json()
+    assert _order_count(db) == 1
+
+
+def test_same_key_with_different_body_is_409(client, db, checkout):
+    user, body = checkout
+    headers = {**auth_headers(user), "Idempotency-Key": "checkout-2"}
+
+    assert client.post("/api/v1/orders/", json=body, headers=headers).status_code == 202
+    changed = {**body, "items": [{**body["items"][0], "quantity": 3}]}
+    conflict = client.post("/api/v1/orders/", json=changed, headers=headers)
+
+    assert conflict.status_code == 409
+    assert _order_count(db) == 1
+
+
+def test_keys_of_different_users_do_not_collide(client, db, checkout):
+    user, body = checkout
+    other = make_user(db)
+    other_body = {**body, "address_id": make_address(db, other).id}
+
+    assert client.post("/api/v1/orders/", json=body, headers={**auth_headers(user), "Idempotency-Key": "k"}).status_code == 202
+    assert client.post("/api/v1/orders/", json=other_body, headers={**auth_headers(other), "Idempotency-Key": "k"}).status_code == 202
+    assert _order_count(db) == 2
+
+
+def test_failed_request_releases_key(client, db, checkout):
+    user, body = checkout
+    headers = {**auth_headers(user), "Idempotency-Key": "checkout-3"}
+    dish = db.get(models.Dish, body["items"][0]["dish_id"])
+    dish.is_available = False
+    db.commit()
+
+    assert client.post("/api/v1/orders/", json=body, headers=headers).status_code == 400
+
+    # Ошибка не сохраняется как ответ: тот же запрос после исправления проходит
+    dish.is_available = True
+    db.commit()
+    retry = client.post("/api/v1/orders/", json=body, headers=headers)
+    assert retry.status_code == 202
+    assert _order_count(db) == 1
+
+
+def test_webhook_redelivery_is_stored_once(client, db):
+    payload = {"id": "evt-100", "type": "payment.success", "data": {"orderId": "1"}}
+
+    assert client.post("/api/v1/payments/webhook/paylink", json=payload).status_code == 200
+    assert client.post("/api/v1/payments/webhook/paylink", json=payload).status_code == 200
+
+    assert db.query(models.PaymentEvent).count() == 1
@@ -0,0 +1,129 @@
+"""Кеш меню (menu_cache.py): ETag/304, сброс по версии меню из БД, гонка чтения и изменения."""
+import time
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event, update
+
+from app import crud, database, menu_cache, models, schemas
+from app.config import settings
+
+from .factories import make_dish, make_restaurant
+
+
+@pytest.fixture
+def restaurant(db):
+    restaurant = make_restaurant(db, description="Кафе", address="ул. Тестовая, 2")
+    make_dish(db, restaurant, name="Плов", price="1500.00")
+    return restaurant
+
+
+@pytest.fixture
+def selects():
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(database.async_engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(database.async_engine.sync_engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def later(monkeypatch):
+    """Сдвигает часы воркера вперед: наступает срок сверки версии меню."""
+    real_monotonic = time.monotonic
+    offset = 0.0
+
+    def shift():
+        nonlocal offset
+        offset += settings.MENU_VERSION_CHECK_SECONDS + 0.1
+        monkeypatch.setattr(time, "monotonic", lambda: real_monotonic() + offset)
+    return shift
+
+
+def _menu(client, restaurant_id, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get(f"/api/v1/restaurants/{restaurant_id}", headers=headers)
+
+
+def _dish_names(response):
+    return [dish["name"] for category in response.json()["menu_categories"] for dish in category["dishes"]]
+
+
+def test_etag_returns_304_and_cached_menu_skips_the_db(client, restaurant, selects):
+    first = _menu(client, restaurant.id)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    selects.clear()
+    cached = _menu(client, restaurant.id, etag=etag)
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert _menu(client, restaurant.id).content == first.content
+    assert selects == []
+
+
+def test_local_change_invalidates_and_changes_etag(client, db, restaurant):
+    first = _menu(client, restaurant.id)
+    dish = db.query(models.Dish).filter_by(restaurant_id=restaurant.id).one()
+
+    crud.update_dish(db, db_dish=dish, dish_in=schemas.DishUpdate(
+        name="Плов праздничный", price=Decimal("1800.00"), description=None, is_available=True,
+    ))
+
+    second = _menu(client, restaurant.id, etag=first.headers["etag"])
+    assert second.status_code == 200
+    assert second.headers["etag"] != first.headers["etag"]
+    assert _dish_names(second) == ["Плов праздничный"]
+
+
+def test_change_in_another_worker_is_seen_after_version_check(client, db, restaurant, selects, later):
+    etag = _menu(client, restaurant.id).headers["etag"]
+
+    # Другой воркер: изменение и новая версия меню мимо сессий и кеша этого процесса
+    with database.engine.begin() as connection:
+        connection.execute(update(models.Dish).values(name="Лагман"))
+        connection.execute(update(models.Restaurant).values(menu_version=models.Restaurant.menu_version + 1))
+
+    assert _dish_names(_menu(client, restaurant.id)) == ["Плов"]
+
+    later()
+    selects.clear()
+    fresh = _menu(client, restaurant.id, etag=etag)
+    assert fresh.status_code == 200
+    assert _dish_names(fresh) == ["Лагман"]
+    # Сверка версии - отдельный короткий запрос, затем одна загрузка меню
+    assert len(selects) == 2
+
+    selects.clear()
+    later()
+    assert _menu(client, restaurant.id, etag=fresh.headers["etag"]).status_code == 304
+    assert len(selects) == 1
+
+
+def test_restaurant_hidden_in_another_worker_returns_404_after_check(client, restaurant, later):
+    assert _menu(client, restaurant.id).status_code == 200
+    with database.engine.begin() as connection:
+        connection.execute(update(models.Restaurant).values(is_active=False, menu_version=models.Restaurant.menu_version + 1))
+
+    later()
+    assert _menu(client, restaurant.id).status_code == 404
+
+
+def test_snapshot_read_before_a_change_is_not_cached(client, db, restaurant):
+    # Читатель загрузил ресторан до изменения, а сохраняет снимок уже после commit
+    reader = database.SessionLocal()
+    stale = crud.get_restaurant_details(reader, restaurant_id=restaurant.id)
+    dish = db.query(models.Dish).filter_by(restaurant_id=restaurant.id).one()
+    crud.update_dish(db, db_dish=dish, dish_in=schemas.DishUpdate(
+        name="Манты", price=Decimal("1200.00"), description=None, is_available=True,
+    ))
+
+    menu_cache.store_menu(stale)
+    reader.close()
+
+    assert menu_cache.get_menu(restaurant.id) is None
+    assert _dish_names(_menu(client, restaurant.id)) == ["Манты"]
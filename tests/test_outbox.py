@@ -0,0 +1,249 @@
+"""Диспетчер платежей (outbox.PaymentOutboxDispatcher) против mock-сервера PayLink."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import httpx
+import pytest
+
+from app import models, outbox, services, webhook_queue
+from app.config import settings
+
+from .factories import auth_headers, make_order, make_restaurant, make_user
+
+
+@pytest.fixture
+def paylink(monkeypatch):
+    """Подменяет PayLink: handler задается тестом, запросы складываются в calls."""
+    monkeypatch.setattr(settings, "PAYLINK_RETRIES", 0)
+    state = {"handler": None, "calls": []}
+
+    def handler(request):
+        state["calls"].append(request)
+        return state["handler"](request)
+
+    client = services.PayLinkClient()
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(services, "paylink_client", client)
+    return state
+
+
+def _dispatcher(**overrides):
+    options = dict(
+        poll_seconds=1, batch_size=50, concurrency=5,
+        max_attempts=3, retry_seconds=0, stale_seconds=120,
+    )
+    options.update(overrides)
+    return outbox.PaymentOutboxDispatcher(**options)
+
+
+def _dispatch_once(dispatcher) -> int:
+    async def scenario():
+        dispatcher._semaphore = asyncio.Semaphore(dispatcher.concurrency)
+        entries = dispatcher._claim_batch()
+        await asyncio.gather(*(dispatcher._dispatch(entry) for entry in entries))
+        return len(entries)
+    return asyncio.run(scenario())
+
+
+def _order_with_outbox(db, **fields):
+    order = make_order(db, make_restaurant(db), **fields)
+    entry = models.PaymentOutbox(order_id=order.id, next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    db.add(entry)
+    db.commit()
+    return order, entry
+
+
+def _created(request):
+    return httpx.Response(200, json={"data": {"paymentUrl": "https://pay.test/inv-42"}})
+
+
+def test_payment_created(db, paylink):
+    order, entry = _order_with_outbox(db)
+    paylink["handler"] = _created
+
+    assert _dispatch_once(_dispatcher()) == 1
+
+    db.refresh(entry)
+    db.refresh(order)
+    assert entry.status == models.JobStatus.DONE
+    assert order.payment_url == "https://pay.test/inv-42"
+    assert order.payment_invoice_id == "inv-42"
+
+
+def test_not_sent_is_retried_then_order_cancelled(db, paylink):
+    order, entry = _order_with_outbox(db)
+
+    def refused(request):
+        raise httpx.ConnectError("refused", request=request)
+    paylink["handler"] = refused
+    dispatcher = _dispatcher(max_attempts=2)
+
+    _dispatch_once(dispatcher)
+    db.refresh(entry)
+    assert entry.status == models.JobStatus.PENDING
+    assert entry.attempts == 1
+
+    _dispatch_once(dispatcher)
+    db.refresh(entry)
+    db.refresh(order)
+    assert entry.status == models.JobStatus.FAILED
+    assert order.status == models.OrderStatus.CANCELLED
+    assert len(paylink["calls"]) == 2
+
+
+def test_timeout_after_send_is_not_retried(db, paylink):
+    order, entry = _order_with_outbox(db)
+
+    def slow(request):
+        raise httpx.ReadTimeout("slow", request=request)
+    paylink["handler"] = slow
+    dispatcher = _dispatcher()
+
+    _dispatch_once(dispatcher)
+    assert _dispatch_once(dispatcher) == 0
+
+    db.refresh(entry)
+    db.refresh(order)
+    assert entry.status == models.JobStatus.UNKNOWN
+    assert order.status == models.OrderStatus.PENDING
+    assert len(paylink["calls"]) == 1
+
+
+def test_server_error_after_send_is_not_retried(db, paylink):
+    _, entry = _order_with_outbox(db)
+    paylink["handler"] = lambda request: httpx.Response(500)
+
+    _dispatch_once(_dispatcher())
+
+    db.refresh(entry)
+    assert entry.status == models.JobStatus.UNKNOWN
+
+
+def test_split_mismatch_fails_without_retry(db, paylink):
+    order, entry = _order_with_outbox(db, total_price=Decimal("9999.00"))
+    paylink["handler"] = _created
+
+    _dispatch_once(_dispatcher(max_attempts=5))
+
+    db.refresh(entry)
+    db.refresh(order)
+    assert entry.status == models.JobStatus.FAILED
+    assert entry.attempts == 1
+    assert "Сумма долей" in entry.last_error
+    assert order.status == models.OrderStatus.CANCELLED
+    assert paylink["calls"] == []
+
+
+def test_rejected_by_paylink_fails_without_retry(db, paylink):
+    _, entry = _order_with_outbox(db)
+    paylink["handler"] = lambda request: httpx.Response(422, json={"error": "invalid account"})
+
+    _dispatch_once(_dispatcher(max_attempts=5))
+
+    db.refresh(entry)
+    assert entry.status == models.JobStatus.FAILED
+    assert entry.attempts == 1
+
+
+def test_stale_entry_becomes_unknown_instead_of_resend(db, paylink):
+    _, entry = _order_with_outbox(db)
+    entry.status = models.JobStatus.RUNNING
+    entry.attempts = 1
+    entry.locked_by = "dead-host:1"
+    entry.locked_at = datetime.now(timezone.utc) - timedelta(minutes=10)
+    db.commit()
+    paylink["handler"] = _created
+    dispatcher = _dispatcher()
+
+    dispatcher._release_stale()
+    assert _dispatch_once(dispatcher) == 0
+
+    db.refresh(entry)
+    assert entry.status == models.JobStatus.UNKNOWN
+    assert entry.locked_by is None
+    assert paylink["calls"] == []
+
+
+def test_result_not_recorded_without_lease(db):
+    order, entry = _order_with_outbox(db)
+    entry.status = models.JobStatus.RUNNING
+    entry.locked_by = "other-host:2"
+    db.commit()
+
+    _dispatcher()._record_result({"id": entry.id}, models.JobStatus.FAILED, error="boom")
+
+    db.refresh(entry)
+    db.refresh(order)
+    assert entry.status == models.JobStatus.RUNNING
+    assert order.status == models.OrderStatus.PENDING
+
+
+def test_late_payment_url_closes_unknown_entry(db):
+    order, entry = _order_with_outbox(db)
+    entry.status = models.JobStatus.UNKNOWN
+    db.commit()
+
+    _dispatcher()._record_result({"id": entry.id}, models.JobStatus.DONE, payment_url="https://pay.test/late")
+
+    db.refresh(entry)
+    db.refresh(order)
+    assert entry.status == models.JobStatus.DONE
+    assert order.payment_url == "https://pay.test/late"
+
+
+def test_payment_webhook_reconciles_unknown_entry(db):
+    order, entry = _order_with_outbox(db)
+    entry.status = models.JobStatus.UNKNOWN
+    db.commit()
+    webhook_queue.enqueue_event(db, {"id": "evt-1", "type": "payment.success", "data": {"orderId": str(order.id)}})
+
+    webhook_queue.PaymentEventConsumer(poll_seconds=1, batch_size=10)._apply_batch()
+
+    db.refresh(entry)
+    db.refresh(order)
+    assert entry.status == models.JobStatus.DONE
+    assert order.status == models.OrderStatus.PAID
+
+
+def test_admin_resolves_unknown_entry(client, db, monkeypatch):
+    monkeypatch.setattr(outbox.payment_dispatcher, "notify", lambda: None)
+    admin = make_user(db, role=models.UserRole.ADMIN, is_superuser=True)
+    _, entry = _order_with_outbox(db)
+    entry.status = models.JobStatus.UNKNOWN
+    db.commit()
+    headers = auth_headers(admin)
+
+    listed = client.get("/api/v1/admin/integrations/paylink/outbox/unknown", headers=headers)
+    assert [item["id"] for item in listed.json()["items"]] == [entry.id]
+
+    done_without_url = client.patch(
+        f"/api/v1/admin/integrations/paylink/outbox/{entry.id}", json={"status": "done"}, headers=headers
+    )
+    assert done_without_url.status_code == 400
+
+    retried = client.patch(
+        f"/api/v1/admin/integrations/paylink/outbox/{entry.id}", json={"status": "pending"}, headers=headers
+    )
+    assert retried.status_code == 200
+    assert retried.json()["status"] == "pending"
+
+    again = client.patch(
+        f"/api/v1/admin/integrations/paylink/outbox/{entry.id}", json={"status": "failed"}, headers=headers
+    )
+    assert again.status_code == 400
+
+
+def test_failed_payment_does_not_cancel_paid_order(db, capsys):
+    order, entry = _order_with_outbox(db, status=models.OrderStatus.PAID)
+    entry.status = models.JobStatus.RUNNING
+    entry.locked_by = _dispatcher().worker_id
+    db.commit()
+
+    _dispatcher()._record_result({"id": entry.id}, models.JobStatus.FAILED, error="boom")
+
+    db.refresh(order)
+    assert order.status == models.OrderStatus.PAID
+    output = capsys.readouterr().out
+    assert "заказ отменен" not in output
+    assert "Заказ не отменен" in output
@@ -0,0 +1,118 @@
+"""Keyset-пагинация (pagination.paginate) на списках с одинаковыми created_at."""
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import crud, pagination
+
+from .factories import make_order, make_restaurant
+
+
+def _collect(fetch_page):
+    seen, cursor = [], None
+    while True:
+        page = fetch_page(cursor)
+        seen.extend(order.id for order in page["items"])
+        if not page["has_more"]:
+            assert page["next_cursor"] is None
+            return seen
+        cursor = page["next_cursor"]
+
+
+def test_duplicate_created_at_pages_are_complete_and_disjoint(db):
+    restaurant = make_restaurant(db)
+    moment = datetime(2026, 3, 1, 12, 0, 0)
+    # Две группы по 7 заказов с одинаковым временем: границы страниц попадают внутрь групп
+    orders = [make_order(db, restaurant, created_at=moment) for _ in range(7)]
+    orders += [make_order(db, restaurant, created_at=moment + timedelta(minutes=1)) for _ in range(7)]
+
+    seen = _collect(lambda cursor: crud.get_orders_by_restaurant(db, restaurant.id, limit=3, cursor=cursor))
+
+    expected = [o.id for o in sorted(orders, key=lambda o: (o.created_at, o.id), reverse=True)]
+    assert seen == expected
+
+
+def test_cursor_from_another_list_is_rejected():
+    cursor = pagination.encode_cursor([1])
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor(cursor, [object(), object()])
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor("not-base64!!", [object()])
+
+
+def test_invalid_cursor_returns_400(client):
+    response = client.get("/api/v1/restaurants/", params={"cursor": "garbage"})
+    assert response.status_code == 400
+
+
+def _seed_orders(db, restaurant, count):
+    """Массовая вставка заказов одного ресторана без ORM: по 10 заказов на каждую секунду."""
+    from sqlalchemy import insert
+
+    from app import models
+    from .factories import make_user
+
+    client = make_user(db)
+    start = datetime(2025, 1, 1)
+    for offset in range(0, count, 50_000):
+        db.execute(insert(models.Order), [
+            {
+                "code": f"P{i:08d}", "user_id": client.id, "restaurant_id": restaurant.id,
+                "status": models.OrderStatus.DELIVERED, "total_price": 1000,
+                "created_at": start + timedelta(seconds=i // 10),
+            }
+            for i in range(offset, min(offset + 50_000, count))
+        ])
+    db.commit()
+
+
+@pytest.mark.parametrize("rows", [
+    10_000,
+    pytest.param(1_000_000, marks=pytest.mark.skipif(
+        not os.environ.get("RUN_SLOW_BENCHMARKS"), reason="долгая вставка; RUN_SLOW_BENCHMARKS=1",
+    )),
+])
+def test_orders_page_benchmark_keyset_vs_offset(db, rows):
+    """Нагрузочный сценарий: страница истории заказов ресторана в начале, середине и конце списка."""
+    from sqlalchemy.orm import joinedload, selectinload
+
+    from app import models
+
+    restaurant = make_restaurant(db)
+    started = time.perf_counter()
+    _seed_orders(db, restaurant, rows)
+    seeded = time.perf_counter() - started
+
+    ordered = db.query(models.Order.created_at, models.Order.id).filter(
+        models.Order.restaurant_id == restaurant.id
+    ).order_by(models.Order.created_at.desc(), models.Order.id.desc())
+    # Те же опции загрузки, что и в crud.get_orders_by_restaurant: отличается только способ перехода к странице
+    base = db.query(models.Order).options(
+        selectinload(models.Order.items), joinedload(models.Order.user)
+    ).filter(models.Order.restaurant_id == restaurant.id).order_by(
+        models.Order.created_at.desc(), models.Order.id.desc()
+    )
+
+    report = []
+    for position in (0, rows // 10, rows // 2, rows - 40):
+        cursor = None
+        if position:
+            created_at, order_id = ordered.offset(position - 1).limit(1).one()
+            cursor = pagination.encode_cursor([created_at, order_id])
+
+        db.expire_all()
+        started = time.perf_counter()
+        page = crud.get_orders_by_restaurant(db, restaurant.id, limit=20, cursor=cursor)
+        keyset_ms = (time.perf_counter() - started) * 1000
+
+        db.expire_all()
+        started = time.perf_counter()
+        offset_page = base.offset(position).limit(20).all()
+        offset_ms = (time.perf_counter() - started) * 1000
+
+        assert [order.id for order in page["items"]] == [order.id for order in offset_page]
+        report.append(f"позиция {position}: курсор {keyset_ms:.1f} мс, OFFSET {offset_ms:.1f} мс")
+
+    print(f"\nистория заказов, {rows} строк (вставка {seeded:.1f} с): " + "; ".join(report))
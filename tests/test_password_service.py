@@ -0,0 +1,205 @@
+"""Ограничение очереди bcrypt (security.PasswordService)."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import security
+
+
+def test_cancelled_request_keeps_slot_until_job_finishes():
+    service = security.PasswordService(workers=1, max_pending=2)
+    release = threading.Event()
+
+    def slow_job():
+        release.wait(5)
+        return "done"
+
+    async def scenario():
+        running = asyncio.ensure_future(service._run(slow_job))
+        queued = asyncio.ensure_future(service._run(slow_job))
+        await asyncio.sleep(0.05)
+
+        # Клиент отключился: ожидание отменено, но bcrypt в потоке продолжает работу
+        running.cancel()
+        await asyncio.sleep(0.05)
+        assert service._pending == 2
+        with pytest.raises(security.PasswordServiceBusy):
+            await service._run(slow_job)
+
+        release.set()
+        assert await queued == "done"
+        for _ in range(100):
+            if service._pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert service._pending == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        service.shutdown()
+
+
+def test_cancelled_queued_job_frees_slot():
+    service = security.PasswordService(workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(service._run(release.wait, 5))
+        queued = asyncio.ensure_future(service._run(release.wait, 5))
+        await asyncio.sleep(0.05)
+
+        # Задача еще в очереди пула: отмена снимает ее, слот освобождается сразу
+        queued.cancel()
+        await asyncio.sleep(0.05)
+        assert service._pending == 1
+
+        release.set()
+        await running
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        service.shutdown()
+
+
+def test_contention_rejects_overflow_and_drains():
+    """Нагрузочный сценарий: 50 одновременных входов при очереди на 8 задач."""
+    service = security.PasswordService(workers=2, max_pending=8)
+    hashed = security.get_password_hash("secret")
+    peak = 0
+
+    def verify(password, hashed_password):
+        nonlocal peak
+        peak = max(peak, service._pending)
+        return security.pwd_context.verify_and_update(password, hashed_password)
+
+    async def attempt():
+        try:
+            ok, _ = await service._run(verify, "secret", hashed)
+            return ok
+        except security.PasswordServiceBusy:
+            return None
+
+    async def scenario():
+        started = time.perf_counter()
+        results = await asyncio.gather(*(attempt() for _ in range(50)))
+        return results, time.perf_counter() - started
+
+    try:
+        results, elapsed = asyncio.run(scenario())
+    finally:
+        service.shutdown()
+    accepted = [r for r in results if r is not None]
+    print(f"\nbcrypt: принято {len(accepted)}/50, отклонено {results.count(None)}, {elapsed * 1000:.0f} мс")
+    assert accepted and all(accepted)
+    assert results.count(None) > 0
+    assert peak <= 8
+    assert service._pending == 0
+
+
+def test_login_burst_benchmark(db, monkeypatch):
+    """Нагрузочный сценарий: 500 одновременных POST /auth/token при bcrypt cost 10 и очереди на 32 задачи."""
+    import httpx
+    from passlib.context import CryptContext
+
+    from app import models
+    from app.main import app
+
+    from .factories import make_user
+
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=10)
+    monkeypatch.setattr(security, "pwd_context", context)
+    service = security.PasswordService(workers=2, max_pending=32)
+    monkeypatch.setattr(security, "password_service", service)
+    phones = [make_user(db, password="secret").phone for _ in range(20)]
+    db.add(models.Banner(title="Баннер", image_url="/static/images/1.png", is_active=True))
+    db.commit()
+    db.close()
+
+    async def timed(request):
+        started = time.perf_counter()
+        response = await request
+        return response.status_code, time.perf_counter() - started
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            logins = [
+                timed(http.post("/api/v1/auth/token", data={"username": phones[i % 20], "password": "secret"}))
+                for i in range(500)
+            ]
+            # Во время всплеска входов остальные роуты воркера должны отвечать
+            others = [timed(http.get("/api/v1/banners/")) for _ in range(50)]
+            results = await asyncio.gather(*logins, *others)
+        return results[:500], results[500:]
+
+    # Очередь асинхронного пула привязана к event loop предыдущих тестов: берем новый пул
+    from app import database
+
+    database.async_engine.sync_engine.dispose(close=False)
+    try:
+        logins, others = asyncio.run(scenario())
+    finally:
+        service.shutdown()
+        database.async_engine.sync_engine.dispose(close=False)
+
+    def p99(samples):
+        samples = sorted(samples)
+        return samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+
+    accepted = [elapsed for status, elapsed in logins if status == 200]
+    rejected = [elapsed for status, elapsed in logins if status == 503]
+    print(f"\n500 входов: 200 - {len(accepted)}, 503 - {len(rejected)}; "
+          f"p99 входа {p99(accepted):.0f} мс, p99 отказа {p99(rejected):.0f} мс, "
+          f"p99 GET /banners/ во время всплеска {p99([elapsed for _, elapsed in others]):.0f} мс")
+    assert len(accepted) + len(rejected) == 500
+    assert accepted and rejected
+    assert all(status == 200 for status, _ in others)
+    assert service._pending == 0
+
+
+def test_login_rehashes_password_with_changed_cost(client, db):
+    from passlib.context import CryptContext
+
+    from app import models
+
+    from .factories import make_user
+
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=5).hash("secret")
+    user = make_user(db)
+    user.hashed_password = old_hash
+    db.commit()
+
+    response = client.post("/api/v1/auth/token", data={"username": user.phone, "password": "secret"})
+
+    assert response.status_code == 200
+    db.expire_all()
+    new_hash = db.get(models.User, user.id).hashed_password
+    assert new_hash != old_hash and new_hash.startswith(f"$2b${security.settings.BCRYPT_ROUNDS:02d}$")
+    assert client.post("/api/v1/auth/token", data={"username": user.phone, "password": "secret"}).status_code == 200
+
+
+def test_register_and_admin_create_user(client, db):
+    from app import models
+
+    from .factories import auth_headers, make_user
+
+    response = client.post("/api/v1/auth/register", json={
+        "phone": "+77005550001", "password": "secret-pass", "first_name": "Айгерим", "role": "client",
+    })
+    assert response.status_code == 201
+    assert client.post("/api/v1/auth/register", json={
+        "phone": "+77005550001", "password": "secret-pass", "first_name": "Айгерим", "role": "client",
+    }).status_code == 400
+
+    admin = make_user(db, role=models.UserRole.ADMIN, is_superuser=True)
+    created = client.post("/api/v1/admin/users", json={
+        "phone": "+77005550002", "password": "secret-pass", "first_name": "Кафе", "role": "restaurant",
+    }, headers=auth_headers(admin))
+    assert created.status_code == 201
+    assert client.post("/api/v1/auth/token", data={"username": "+77005550002", "password": "secret-pass"}).status_code == 200
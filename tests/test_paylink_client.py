@@ -0,0 +1,157 @@
+"""HTTP-клиент PayLink (services.PayLinkClient) против mock-сервера httpx.MockTransport."""
+import asyncio
+
+import httpx
+import pytest
+
+from app import services
+from app.config import settings
+
+URL = "http://paylink.test/api/payments"
+
+
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "PAYLINK_RETRY_BACKOFF_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "PAYLINK_RETRIES", 2)
+
+
+def _client(handler, failures=5, reset_seconds=30.0):
+    client = services.PayLinkClient()
+    client.breaker = services.CircuitBreaker(failure_threshold=failures, reset_seconds=reset_seconds)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def _run(client, coro):
+    async def scenario():
+        try:
+            return await coro
+        finally:
+            await client.close()
+    return asyncio.run(scenario())
+
+
+def _open_breaker(client):
+    client.breaker._failures = client.breaker.failure_threshold
+    client.breaker._opened_at = 0.0  # давно: предохранитель полуоткрыт
+
+
+def test_post_retried_when_connection_not_established():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"ok": True})
+
+    client = _client(handler)
+    response = _run(client, client.request("POST", URL, json={}))
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+def test_post_not_retried_after_read_timeout():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ReadTimeout("slow", request=request)
+
+    client = _client(handler)
+    with pytest.raises(httpx.ReadTimeout):
+        _run(client, client.request("POST", URL, json={}))
+    assert len(calls) == 1
+
+
+def test_post_not_retried_on_503():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    client = _client(handler)
+    response = _run(client, client.request("POST", URL, json={}))
+    assert response.status_code == 503
+    assert len(calls) == 1
+
+
+def test_idempotent_request_retried_on_503():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503) if len(calls) < 3 else httpx.Response(200)
+
+    client = _client(handler)
+    response = _run(client, client.request("GET", URL, idempotent=True))
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+def test_breaker_opens_and_rejects_without_calling_server():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(500)
+
+    client = _client(handler, failures=2)
+
+    async def scenario():
+        await client.request("POST", URL)
+        await client.request("POST", URL)
+        with pytest.raises(services.CircuitBreakerOpen):
+            await client.request("POST", URL)
+
+    _run(client, scenario())
+    assert len(calls) == 2
+    assert client.breaker.state == "open"
+    assert client.rejected == 1
+
+
+def test_half_open_trial_success_closes_breaker():
+    client = _client(lambda request: httpx.Response(200))
+    _open_breaker(client)
+    assert client.breaker.state == "half_open"
+    _run(client, client.request("POST", URL))
+    assert client.breaker.state == "closed"
+
+
+def test_cancelled_half_open_trial_releases_breaker():
+    async def handler(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200)
+
+    client = _client(handler)
+    _open_breaker(client)
+
+    async def scenario():
+        trial = asyncio.ensure_future(client.request("POST", URL))
+        await asyncio.sleep(0.05)
+        assert client.breaker._trial_in_flight
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        assert not client.breaker._trial_in_flight
+        # Следующий запрос снова становится пробным, а не отклоняется навсегда
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+        response = await client.request("POST", URL)
+        assert response.status_code == 200
+
+    _run(client, scenario())
+    assert client.breaker.state == "closed"
+
+
+def test_non_transport_error_in_half_open_trial_releases_breaker():
+    def handler(request):
+        raise ValueError("broken response")
+
+    client = _client(handler)
+    _open_breaker(client)
+    with pytest.raises(ValueError):
+        _run(client, client.request("POST", URL))
+    assert not client.breaker._trial_in_flight
+    assert client.breaker.state == "half_open"
@@ -0,0 +1,67 @@
+"""Оценка корзины (services.price_cart) одним запросом к БД."""
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from app import database, schemas, services
+
+from .factories import make_dish, make_restaurant
+
+
+def _order_in(restaurant, items):
+    return schemas.OrderCreate(
+        restaurant_id=restaurant.id,
+        address_id=1,
+        items=[schemas.OrderItemCreate(dish_id=dish_id, quantity=quantity) for dish_id, quantity in items],
+    )
+
+
+def test_price_cart_merges_duplicate_lines(db):
+    restaurant = make_restaurant(db)
+    soup = make_dish(db, restaurant, price="450.00")
+    tea = make_dish(db, restaurant, price="150.50")
+
+    cart = services.price_cart(db, _order_in(restaurant, [(soup.id, 1), (tea.id, 2), (soup.id, 2)]))
+
+    assert {(line.dish_id, line.quantity, line.unit_price) for line in cart.lines} == {
+        (soup.id, 3, Decimal("450.00")),
+        (tea.id, 2, Decimal("150.50")),
+    }
+    assert cart.items_total_price == Decimal("1651.00")
+
+
+def test_price_cart_runs_one_query_for_any_cart_size(db):
+    restaurant = make_restaurant(db)
+    order_in = _order_in(restaurant, [(make_dish(db, restaurant).id, 1) for _ in range(30)])
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    db.expire_all()
+    event.listen(database.engine, "before_cursor_execute", count)
+    try:
+        services.price_cart(db, order_in)
+    finally:
+        event.remove(database.engine, "before_cursor_execute", count)
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+
+
+@pytest.mark.parametrize("case", ["unavailable", "foreign", "missing"])
+def test_price_cart_rejects_invalid_dishes(db, case):
+    restaurant = make_restaurant(db)
+    if case == "unavailable":
+        dish_id = make_dish(db, restaurant, is_available=False).id
+    elif case == "foreign":
+        dish_id = make_dish(db, make_restaurant(db)).id
+    else:
+        dish_id = 999999
+    with pytest.raises(ValueError):
+        services.price_cart(db, _order_in(restaurant, [(dish_id, 1)]))
+
+
+def test_empty_cart_is_rejected(db):
+    restaurant = make_restaurant(db)
+    with pytest.raises(ValueError):
+        services.price_cart(db, _order_in(restaurant, []))
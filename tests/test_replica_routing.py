@@ -0,0 +1,65 @@
+"""Чтение после записи (database.get_read_db_for) на двух базах: основной и "реплике"."""
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, models
+from app.database import Base
+
+from .factories import make_order, make_restaurant, make_user
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    replica_engine = create_engine(f"sqlite:///{tmp_path}/replica.db")
+    Base.metadata.create_all(bind=replica_engine)
+    monkeypatch.setattr(database, "replica_engine", replica_engine)
+    monkeypatch.setattr(database, "ReplicaSessionLocal", sessionmaker(bind=replica_engine))
+    monkeypatch.setattr(database.replica_router, "_lag_checked_at", 0.0)
+    yield replica_engine
+    replica_engine.dispose()
+
+
+def _read_bind(*tables):
+    dependency = database.get_read_db_for(*tables)
+    generator = dependency()
+    session = next(generator)
+    try:
+        return session.get_bind()
+    finally:
+        generator.close()
+
+
+def test_reads_go_to_replica_without_recent_writes(replica):
+    assert _read_bind("orders") is replica
+
+
+def test_orm_flush_routes_reads_to_primary(db, replica):
+    make_user(db)
+    assert _read_bind("users") is database.engine
+    assert _read_bind("orders") is replica
+
+
+def test_cas_assign_routes_reads_to_primary(db, replica):
+    restaurant = make_restaurant(db)
+    courier = make_user(db, role=models.UserRole.COURIER)
+    order = make_order(db, restaurant, status=models.OrderStatus.READY_FOR_PICKUP)
+    database.replica_router._last_writes.clear()
+
+    assert crud.assign_order_to_courier(db, order.id, courier.id)
+    assert _read_bind("orders") is database.engine
+    assert _read_bind("restaurants") is replica
+
+
+def test_bulk_update_routes_reads_to_primary(db, replica):
+    restaurant = make_restaurant(db)
+    database.replica_router._last_writes.clear()
+
+    db.execute(
+        update(models.Restaurant)
+        .where(models.Restaurant.id == restaurant.id)
+        .values(review_count=1)
+        .execution_options(synchronize_session="fetch")
+    )
+    db.commit()
+    assert _read_bind("restaurants") is database.engine
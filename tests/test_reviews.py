@@ -0,0 +1,79 @@
+"""Агрегаты отзывов ресторана: инкрементальное обновление (crud.create_review) и полный пересчет."""
+from decimal import Decimal
+
+from app import crud, models
+
+from .factories import auth_headers, make_order, make_restaurant, make_user
+
+
+def _review(client, db, restaurant, rating):
+    user = make_user(db)
+    order = make_order(db, restaurant, user=user, status=models.OrderStatus.DELIVERED)
+    response = client.post(f"/api/v1/reviews/order/{order.id}", json={"rating": rating}, headers=auth_headers(user))
+    assert response.status_code == 201
+    return response.json()
+
+
+def test_review_updates_aggregates_and_histogram(client, db):
+    restaurant = make_restaurant(db, description="Описание", address="ул. Ресторанная, 1")
+    first = client.get(f"/api/v1/restaurants/{restaurant.id}").json()
+
+    for rating in (5, 4, 5):
+        _review(client, db, restaurant, rating)
+
+    detail = client.get(f"/api/v1/restaurants/{restaurant.id}").json()
+    assert first["review_count"] == 0
+    assert detail["review_count"] == 3
+    assert Decimal(str(detail["average_rating"])) == Decimal("4.67")
+    assert detail["rating_histogram"] == {"1": 0, "2": 0, "3": 0, "4": 1, "5": 2}
+
+
+def test_review_count_comes_from_histogram_not_legacy_counter(client, db):
+    # Данные до появления гистограммы: review_count заполнен, rating_sum и rating_N_count - нули
+    restaurant = make_restaurant(db, review_count=10, average_rating=Decimal("3.00"))
+
+    _review(client, db, restaurant, 4)
+
+    db.refresh(restaurant)
+    assert restaurant.review_count == 1
+    assert restaurant.average_rating == Decimal("4.00")
+    assert restaurant.rating_histogram == {1: 0, 2: 0, 3: 0, 4: 1, 5: 0}
+
+
+def test_rebuild_recomputes_every_restaurant(db):
+    reviewed = make_restaurant(db, review_count=10, average_rating=Decimal("1.00"))
+    no_reviews = make_restaurant(db, review_count=5, rating_sum=20, rating_4_count=5, average_rating=Decimal("4.00"))
+    # Отзывы, записанные в обход create_review (например, ручная правка в БД)
+    for rating in (1, 3, 3, 5):
+        order = make_order(db, reviewed, status=models.OrderStatus.DELIVERED)
+        db.add(models.Review(order_id=order.id, user_id=order.user_id, restaurant_id=reviewed.id, rating=rating))
+    db.commit()
+    versions = {restaurant.id: restaurant.menu_version for restaurant in (reviewed, no_reviews)}
+
+    updated = crud.rebuild_rating_aggregates(db)
+
+    db.refresh(reviewed)
+    db.refresh(no_reviews)
+    assert updated == 2
+    assert (reviewed.review_count, reviewed.rating_sum, reviewed.average_rating) == (4, 12, Decimal("3.00"))
+    assert reviewed.rating_histogram == {1: 1, 2: 0, 3: 2, 4: 0, 5: 1}
+    assert (no_reviews.review_count, no_reviews.rating_sum, no_reviews.average_rating) == (0, 0, Decimal("0"))
+    assert no_reviews.rating_histogram == {stars: 0 for stars in range(1, 6)}
+    # Снимки меню (с рейтингом) устаревают у всех ресторанов
+    assert reviewed.menu_version == versions[reviewed.id] + 1
+    assert no_reviews.menu_version == versions[no_reviews.id] + 1
+
+
+def test_review_after_rebuild_adds_to_rebuilt_aggregates(client, db):
+    restaurant = make_restaurant(db)
+    order = make_order(db, restaurant, status=models.OrderStatus.DELIVERED)
+    db.add(models.Review(order_id=order.id, user_id=order.user_id, restaurant_id=restaurant.id, rating=2))
+    db.commit()
+    crud.rebuild_rating_aggregates(db)
+
+    _review(client, db, restaurant, 5)
+
+    db.refresh(restaurant)
+    assert (restaurant.review_count, restaurant.rating_sum) == (2, 7)
+    assert restaurant.average_rating == Decimal("3.50")
+    assert restaurant.rating_histogram == {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}
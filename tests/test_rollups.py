@@ -0,0 +1,101 @@
+"""Дневные агрегаты дашборда (rollups.py): дни считаются по UTC независимо от часового пояса сервера."""
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from app import models, rollups
+
+from .factories import make_order, make_restaurant, make_user
+
+
+@pytest.fixture(params=["Etc/GMT-14", "Etc/GMT+12"])
+def server_timezone(request, monkeypatch):
+    """В любой момент хотя бы в одном из этих поясов (UTC+14, UTC-12) локальная дата отличается от UTC."""
+    monkeypatch.setenv("TZ", request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _daily(db, day):
+    db.expire_all()
+    return db.query(models.DailyStats).filter(models.DailyStats.day == day).one_or_none()
+
+
+def test_utc_day_of_aware_datetime():
+    local = datetime(2026, 3, 2, 2, 30, tzinfo=timezone(timedelta(hours=5)))
+    assert rollups.utc_day(local) == date(2026, 3, 1)
+    assert rollups.utc_day(datetime(2026, 3, 1, 23, 59)) == date(2026, 3, 1)
+
+
+def test_new_delivered_order_counts_on_utc_day(db, server_timezone):
+    restaurant = make_restaurant(db)
+    make_order(db, restaurant, status=models.OrderStatus.DELIVERED, total_price=Decimal("700.00"))
+
+    today = datetime.now(timezone.utc).date()
+    stats = _daily(db, today)
+    assert stats is not None and stats.orders_count == 1 and stats.revenue == Decimal("700.00")
+    assert rollups.utc_today() == today
+
+
+def test_incremental_and_rebuild_agree_across_midnight(db, server_timezone):
+    restaurant = make_restaurant(db)
+    late = datetime(2026, 3, 1, 23, 30, tzinfo=timezone.utc)
+    early = datetime(2026, 3, 2, 0, 30, tzinfo=timezone.utc)
+    for created_at in (late, early):
+        order = make_order(db, restaurant, created_at=created_at, status=models.OrderStatus.ON_THE_WAY)
+        order.status = models.OrderStatus.DELIVERED
+        db.commit()
+
+    incremental = {day: _daily(db, day).orders_count for day in (date(2026, 3, 1), date(2026, 3, 2))}
+    rollups.rebuild_range(db, date(2026, 3, 1), date(2026, 3, 2))
+    db.commit()
+    rebuilt = {day: _daily(db, day).orders_count for day in (date(2026, 3, 1), date(2026, 3, 2))}
+
+    assert incremental == rebuilt == {date(2026, 3, 1): 1, date(2026, 3, 2): 1}
+
+
+def test_dashboard_today_boundary_is_utc(db, server_timezone):
+    restaurant = make_restaurant(db)
+    make_order(db, restaurant, status=models.OrderStatus.DELIVERED, total_price=Decimal("900.00"))
+    today = datetime.now(timezone.utc).date()
+
+    stats = rollups.dashboard_stats(db, today, today)
+
+    assert stats.general_stats.total_orders == 1
+    assert stats.general_stats.total_revenue == Decimal("900.00")
+
+
+def test_order_with_unloaded_created_at_counts_on_its_own_day(db):
+    restaurant = make_restaurant(db)
+    created_at = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    order = make_order(db, restaurant, created_at=created_at, status=models.OrderStatus.ON_THE_WAY)
+    # Например, заказ загружен без created_at или атрибут сброшен после commit
+    db.expire(order, ["created_at"])
+
+    order.status = models.OrderStatus.DELIVERED
+    db.commit()
+
+    assert _daily(db, date(2026, 3, 1)).orders_count == 1
+    # Строка за сегодня есть (новые пользователи), но заказ в нее не попал
+    assert _daily(db, rollups.utc_today()).orders_count == 0
+
+
+def test_deleting_delivered_order_with_unloaded_created_at(db):
+    restaurant = make_restaurant(db)
+    created_at = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    order = make_order(db, restaurant, created_at=created_at, status=models.OrderStatus.DELIVERED)
+    assert _daily(db, date(2026, 3, 1)).orders_count == 1
+    order = db.get(models.Order, order.id)
+    db.expire(order, ["created_at"])
+
+    db.delete(order)
+    db.commit()
+
+    assert _daily(db, date(2026, 3, 1)).orders_count == 0
+    # Строка за сегодня есть (новые пользователи), но заказ в нее не попал
+    assert _daily(db, rollups.utc_today()).orders_count == 0
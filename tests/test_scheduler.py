@@ -0,0 +1,203 @@
+"""Планировщик задач (scheduler.JobScheduler): восстановление после падения воркера."""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert, update
+
+from app import models, scheduler
+
+TEST_JOB = "test_job"
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    monkeypatch.setitem(scheduler.JOB_HANDLERS, TEST_JOB, lambda db, payload: calls.append(payload))
+    return calls
+
+
+def _scheduler(**overrides):
+    options = dict(
+        poll_seconds=0.05, lookahead_seconds=60, batch_size=100,
+        max_attempts=3, retry_seconds=30, stale_seconds=300,
+    )
+    options.update(overrides)
+    return scheduler.JobScheduler(**options)
+
+
+def _run_once(job_scheduler):
+    job_scheduler._poll()
+    job_scheduler._run_due(job_scheduler._pop_due(time.time()))
+
+
+def test_job_abandoned_by_crashed_worker_is_rerun(db, calls):
+    now = datetime.now(timezone.utc)
+    job = models.ScheduledJob(
+        kind=TEST_JOB, payload='{"order_id": 7}', run_at=now - timedelta(minutes=10),
+        status=models.JobStatus.RUNNING, attempts=1,
+        locked_by="dead-host:1", locked_at=now - timedelta(minutes=6),
+    )
+    db.add(job)
+    db.commit()
+
+    _run_once(_scheduler())
+
+    db.refresh(job)
+    assert calls == [{"order_id": 7}]
+    assert job.status == models.JobStatus.DONE
+    assert job.attempts == 2
+    assert job.locked_by is None
+
+
+def test_running_job_within_lease_is_not_stolen(db, calls):
+    now = datetime.now(timezone.utc)
+    job = models.ScheduledJob(
+        kind=TEST_JOB, payload="{}", run_at=now - timedelta(minutes=1),
+        status=models.JobStatus.RUNNING, attempts=1, locked_by="alive-host:1", locked_at=now,
+    )
+    db.add(job)
+    db.commit()
+
+    _run_once(_scheduler())
+
+    db.refresh(job)
+    assert calls == []
+    assert job.status == models.JobStatus.RUNNING
+    assert job.locked_by == "alive-host:1"
+
+
+def test_job_is_claimed_by_exactly_one_worker(db, calls):
+    job = scheduler.add_job(db, TEST_JOB, datetime.now(timezone.utc) - timedelta(seconds=1), {"n": 1})
+    db.commit()
+    first, second = _scheduler(), _scheduler()
+    first._poll()
+    second._poll()
+
+    first._run_due(first._pop_due(time.time()))
+    second._run_due(second._pop_due(time.time()))
+
+    db.refresh(job)
+    assert calls == [{"n": 1}]
+    assert job.status == models.JobStatus.DONE
+
+
+def test_failing_job_is_retried_then_failed(db, monkeypatch):
+    def boom(db, payload):
+        raise RuntimeError("boom")
+    monkeypatch.setitem(scheduler.JOB_HANDLERS, TEST_JOB, boom)
+    job = scheduler.add_job(db, TEST_JOB, datetime.now(timezone.utc) - timedelta(seconds=1), {})
+    db.commit()
+    job_scheduler = _scheduler(max_attempts=2, retry_seconds=0)
+
+    _run_once(job_scheduler)
+    db.refresh(job)
+    assert job.status == models.JobStatus.PENDING
+    assert job.last_error == "boom"
+
+    _run_once(job_scheduler)
+    db.refresh(job)
+    assert job.status == models.JobStatus.FAILED
+    assert job.attempts == 2
+
+
+def test_overdue_job_runs_after_restart(db, calls):
+    # Задача, срок которой прошел, пока воркеры были остановлены
+    scheduler.add_job(db, TEST_JOB, datetime.now(timezone.utc) - timedelta(hours=1), {"late": True})
+    db.commit()
+
+    async def scenario():
+        job_scheduler = _scheduler()
+        await job_scheduler.start()
+        try:
+            for _ in range(100):
+                if calls:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            await job_scheduler.stop()
+
+    asyncio.run(scenario())
+    assert calls == [{"late": True}]
+
+
+def test_job_crashing_its_worker_fails_after_max_attempts(db, calls):
+    """Задача, каждый раз роняющая воркер, не должна возвращаться в очередь бесконечно."""
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(minutes=6)
+    retried = models.ScheduledJob(
+        kind=TEST_JOB, payload="{}", run_at=now - timedelta(minutes=10),
+        status=models.JobStatus.RUNNING, attempts=2, locked_by="dead-host:1", locked_at=stale,
+    )
+    exhausted = models.ScheduledJob(
+        kind=TEST_JOB, payload="{}", run_at=now - timedelta(minutes=10),
+        status=models.JobStatus.RUNNING, attempts=3, locked_by="dead-host:1", locked_at=stale,
+    )
+    db.add_all([retried, exhausted])
+    db.commit()
+
+    _scheduler(max_attempts=3)._poll()
+
+    db.refresh(retried)
+    db.refresh(exhausted)
+    assert retried.status == models.JobStatus.PENDING
+    assert retried.attempts == 2
+    assert exhausted.status == models.JobStatus.FAILED
+    assert exhausted.attempts == 3
+    assert exhausted.locked_by is None and exhausted.last_error
+
+
+@pytest.mark.parametrize("total", [
+    1_000,
+    pytest.param(10_000, marks=pytest.mark.skipif(
+        not os.environ.get("RUN_SLOW_BENCHMARKS"), reason="~15 с на SQLite; RUN_SLOW_BENCHMARKS=1",
+    )),
+])
+def test_accepted_orders_load(db, calls, total):
+    """
+    Принятые заказы (до 10 000): поиск курьера назначен на ближайшие 30 минут.
+    В памяти воркера лежат только задачи из окна lookahead, остальные ждут в БД;
+    когда срок наступает, все задачи выполняются ровно по одному разу.
+    """
+    now = datetime.now(timezone.utc)
+    db.execute(insert(models.ScheduledJob), [
+        {
+            "kind": TEST_JOB, "payload": f'{{"order_id": {n}}}',
+            "run_at": now + timedelta(seconds=n * 1800 / total),
+            "status": models.JobStatus.PENDING, "attempts": 0,
+        }
+        for n in range(total)
+    ])
+    db.commit()
+    job_scheduler = _scheduler(lookahead_seconds=60, batch_size=500)
+
+    started = time.perf_counter()
+    job_scheduler._poll()
+    poll_seconds = time.perf_counter() - started
+    in_memory = len(job_scheduler._heap)
+    assert 0 < in_memory <= total * 61 // 1800 + 1
+
+    # Все сроки наступили, пока воркеры были остановлены; после перезапуска задачи
+    # подхватываются опросом
+    db.execute(update(models.ScheduledJob).values(run_at=now - timedelta(seconds=1)))
+    db.commit()
+    job_scheduler = _scheduler(lookahead_seconds=60, batch_size=500)
+    started = time.perf_counter()
+    job_scheduler._poll()
+    while True:
+        due = job_scheduler._pop_due(time.time())
+        if not due:
+            break
+        job_scheduler._run_due(due)
+    drain_seconds = time.perf_counter() - started
+
+    assert len(calls) == total
+    assert len({payload["order_id"] for payload in calls}) == total
+    assert db.query(models.ScheduledJob).filter(models.ScheduledJob.status != models.JobStatus.DONE).count() == 0
+    print(
+        f"\n{total} задач: опрос с окном 60 с {poll_seconds * 1000:.1f} мс "
+        f"({in_memory} в памяти), "
+        f"выполнение всех {drain_seconds:.2f} с ({total / drain_seconds:.0f} задач/с)"
+    )
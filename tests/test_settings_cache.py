@@ -0,0 +1,87 @@
+"""Кеш SystemSettings (settings_cache.SystemSettingsCache): обновление по версии из другого воркера."""
+import time
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event, update
+
+from app import crud, database, models, schemas
+from app.settings_cache import SystemSettingsCache
+
+REFRESH_SECONDS = 5.0
+
+
+@pytest.fixture
+def selects():
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(database.engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    real_monotonic = time.monotonic
+    offset = 0.0
+
+    def advance(seconds):
+        nonlocal offset
+        offset += seconds
+        monkeypatch.setattr(time, "monotonic", lambda: real_monotonic() + offset)
+    return advance
+
+
+def test_snapshot_is_served_without_queries_within_interval(db, selects):
+    worker = SystemSettingsCache(refresh_seconds=REFRESH_SECONDS)
+    first = worker.get(db, load=crud.get_system_settings)
+
+    selects.clear()
+    assert worker.get(db, load=crud.get_system_settings) is first
+    assert selects == []
+
+
+def test_version_bump_from_another_worker_is_picked_up_after_interval(db, selects, clock):
+    other_worker = SystemSettingsCache(refresh_seconds=REFRESH_SECONDS)
+    before = other_worker.get(db, load=crud.get_system_settings)
+
+    # Этот воркер меняет тарифы: его кеш сброшен сразу, у другого - нет
+    writer = database.SessionLocal()
+    current = schemas.SystemSettingsUpdate.model_validate(crud.get_system_settings(writer), from_attributes=True)
+    crud.update_system_settings(writer, current.model_copy(update={"day_base_rate": Decimal("700.00")}))
+    writer.close()
+    assert crud.get_system_settings_snapshot(db).day_base_rate == Decimal("700.00")
+
+    db.expire_all()
+    clock(REFRESH_SECONDS - 1)
+    assert other_worker.get(db, load=crud.get_system_settings) is before
+
+    clock(2)
+    after = other_worker.get(db, load=crud.get_system_settings)
+    assert after.version == before.version + 1
+    assert after.day_base_rate == Decimal("700.00")
+
+
+def test_unchanged_version_costs_one_light_query(db, selects, clock):
+    worker = SystemSettingsCache(refresh_seconds=REFRESH_SECONDS)
+    first = worker.get(db, load=crud.get_system_settings)
+
+    clock(REFRESH_SECONDS + 1)
+    selects.clear()
+    assert worker.get(db, load=crud.get_system_settings) is first
+    assert len(selects) == 1 and "version" in selects[0]
+
+
+def test_edit_without_version_bump_is_not_seen(db, clock):
+    """Версия - единственный сигнал: прямое изменение строки без нее кеш не замечает."""
+    worker = SystemSettingsCache(refresh_seconds=REFRESH_SECONDS)
+    first = worker.get(db, load=crud.get_system_settings)
+    with database.engine.begin() as connection:
+        connection.execute(update(models.SystemSettings).values(delivery_radius_km=3.0))
+
+    clock(REFRESH_SECONDS + 1)
+    assert worker.get(db, load=crud.get_system_settings).delivery_radius_km == first.delivery_radius_km
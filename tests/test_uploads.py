@@ -0,0 +1,130 @@
+"""Загрузка изображений: проверка формата и размера, удаление уже сохраненных файлов при ошибке."""
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pytest
+from fastapi import UploadFile
+
+from app import crud, models, utils
+from app.config import settings
+
+from .factories import auth_headers, make_restaurant, make_user
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 64
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    # UPLOAD_DIR и URL файлов относительные: работаем во временном каталоге
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / utils.UPLOAD_DIR
+
+
+def _stored(upload_dir):
+    return sorted(path.name for path in upload_dir.iterdir()) if upload_dir.exists() else []
+
+
+@pytest.fixture
+def owner(db):
+    user = make_user(db, role=models.UserRole.RESTAURANT)
+    make_restaurant(db, owner=user, description="Кафе", address="ул. Тестовая, 2")
+    return user
+
+
+def _upload_images(client, owner, **files):
+    return client.patch("/api/v1/my-restaurant/me/images", files=files, headers=auth_headers(owner))
+
+
+def test_images_are_saved_and_replace_previous(client, db, owner, upload_dir):
+    first = _upload_images(client, owner, logo=("logo.png", PNG, "image/png"), banner=("b.jpg", JPEG, "image/jpeg"))
+    assert first.status_code == 200
+    old_logo = first.json()["logo"]
+    assert old_logo.endswith(".png") and first.json()["banner"].endswith(".jpg")
+    assert len(_stored(upload_dir)) == 2
+
+    second = _upload_images(client, owner, logo=("logo.png", PNG + b"\x01", "image/png"))
+    assert second.status_code == 200
+    assert second.json()["logo"] != old_logo
+    assert old_logo.rsplit("/", 1)[1] not in _stored(upload_dir)
+    assert len(_stored(upload_dir)) == 2
+
+
+def test_invalid_second_file_removes_the_first(client, owner, upload_dir):
+    response = _upload_images(
+        client, owner, logo=("logo.png", PNG, "image/png"), banner=("banner.png", b"<svg/>", "image/png"),
+    )
+    assert response.status_code == 415
+    assert _stored(upload_dir) == []
+
+
+def test_too_large_file_is_rejected(client, owner, upload_dir, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", 32)
+    response = _upload_images(client, owner, logo=("logo.png", PNG, "image/png"))
+    assert response.status_code == 413
+    assert _stored(upload_dir) == []
+
+
+def test_saved_file_is_removed_when_db_write_fails(client, db, upload_dir, monkeypatch):
+    courier = make_user(db, role=models.UserRole.COURIER)
+
+    def failing_update(*args, **kwargs):
+        raise RuntimeError("БД недоступна")
+
+    monkeypatch.setattr(crud, "update_courier_id_card", failing_update)
+    with pytest.raises(RuntimeError):
+        client.post("/api/v1/courier/me/id_card", files={"id_card": ("id.jpg", JPEG, "image/jpeg")},
+                    headers=auth_headers(courier))
+    assert _stored(upload_dir) == []
+
+
+def test_20mb_upload_benchmark(upload_dir):
+    """Нагрузочный сценарий: 4 одновременных файла по 20 МБ - скорость, память и задержка event loop."""
+    size, uploads = 20 * 1024 * 1024, 4
+    content = PNG + os.urandom(size - len(PNG))
+    expected_sha256 = hashlib.sha256(content).hexdigest()
+
+    def received_file():
+        # Так Starlette хранит принятый файл: в памяти до 1 МБ, дальше - на диске
+        spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        spooled.write(content)
+        spooled.seek(0)
+        return UploadFile(file=spooled, size=size, filename="big.png")
+
+    async def scenario():
+        files = [received_file() for _ in range(uploads)]
+        lags = []
+        stop = asyncio.Event()
+
+        async def ticker():
+            while not stop.is_set():
+                tick = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lags.append(time.perf_counter() - tick - 0.005)
+
+        ticking = asyncio.create_task(ticker())
+        tracemalloc.start()
+        started = time.perf_counter()
+        saved = await asyncio.gather(*(utils.store_upload(file, max_bytes=size) for file in files))
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stop.set()
+        await ticking
+        return saved, elapsed, peak, max(lags)
+
+    saved, elapsed, peak, max_lag = asyncio.run(scenario())
+
+    print(
+        f"\nзагрузка {uploads} x 20 МБ: {uploads * size / 2**20 / elapsed:.0f} МБ/с, "
+        f"пик памяти Python {peak / 2**20:.1f} МБ, макс. задержка event loop {max_lag * 1000:.1f} мс"
+    )
+    assert all(item.size == size and item.sha256 == expected_sha256 for item in saved)
+    assert len(_stored(upload_dir)) == uploads
+    # Файл копируется кусками по UPLOAD_CHUNK_SIZE, а не читается в память целиком
+    assert peak < uploads * 2 * utils.UPLOAD_CHUNK_SIZE + 2 * 1024 * 1024
+    assert max_lag < 0.25
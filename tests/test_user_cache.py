@@ -0,0 +1,68 @@
+"""Кеш авторизованного пользователя (deps.user_principal_cache) и его сброс."""
+import time
+
+from sqlalchemy import update
+
+from app import crud, database, deps, models
+from app.config import settings
+
+from .factories import auth_headers, make_user
+
+
+def _me(client, user):
+    return client.get("/api/v1/users/me", headers=auth_headers(user))
+
+
+def test_block_invalidates_cached_principal(client, db):
+    user = make_user(db)
+    assert _me(client, user).status_code == 200
+    assert deps.user_principal_cache.get(user.phone) is not None
+
+    crud.update_user_status(db, db_user=user, is_active=False)
+
+    assert deps.user_principal_cache.get(user.phone) is None
+    assert _me(client, user).status_code == 400
+
+
+def test_role_change_invalidates_cached_principal(client, db):
+    user = make_user(db)
+    assert _me(client, user).status_code == 200
+
+    user.role = models.UserRole.COURIER
+    db.commit()
+
+    assert deps.user_principal_cache.get(user.phone) is None
+    assert _me(client, user).status_code == 200
+    assert deps.user_principal_cache.get(user.phone).role == models.UserRole.COURIER
+
+
+def test_cache_is_dropped_on_commit_not_on_flush(client, db):
+    user = make_user(db)
+    _me(client, user)
+
+    user.is_active = False
+    db.flush()
+    # До commit другие запросы видят старую строку: сброс сейчас дал бы закешировать ее снова
+    assert deps.user_principal_cache.get(user.phone) is not None
+    db.rollback()
+    assert deps.user_principal_cache.get(user.phone) is not None
+    assert _me(client, user).status_code == 200
+
+    user.is_active = False
+    db.flush()
+    db.commit()
+    assert deps.user_principal_cache.get(user.phone) is None
+
+
+def test_block_in_another_worker_applies_within_ttl(client, db, monkeypatch):
+    user = make_user(db)
+    assert _me(client, user).status_code == 200
+
+    # Другой воркер: запись мимо сессий этого процесса, локальный кеш не сбрасывается
+    with database.engine.begin() as connection:
+        connection.execute(update(models.User).where(models.User.id == user.id).values(is_active=False))
+    assert _me(client, user).status_code == 200
+
+    real_monotonic = time.monotonic
+    monkeypatch.setattr(time, "monotonic", lambda: real_monotonic() + settings.USER_CACHE_TTL_SECONDS + 0.1)
+    assert _me(client, user).status_code == 400
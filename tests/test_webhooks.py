@@ -0,0 +1,26 @@
+"""Прием веб-хуков PayLink (POST /payments/webhook/paylink)."""
+import pytest
+
+from app import models
+
+URL = "/api/v1/payments/webhook/paylink"
+
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b"[1, 2, 3]",
+    b'"payment.success"',
+    b'{"id": "evt-1", "type": "payment.success", "data": [1]}',
+    b'{"id": "evt-1", "type": "payment.success", "data": "42"}',
+])
+def test_malformed_payload_is_400(client, db, body):
+    response = client.post(URL, content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert db.query(models.PaymentEvent).count() == 0
+
+
+def test_event_without_data_is_accepted(client, db):
+    response = client.post(URL, json={"id": "evt-2", "type": "payment.refund"})
+    assert response.status_code == 200
+    event = db.query(models.PaymentEvent).one()
+    assert event.order_id is None